@@ -0,0 +1,159 @@
+# benchmarks/alert_rules.py
+"""
+بنچمارک موتور قواعد هشدار با صدها قاعده
+
+اجرا از ریشه پروژه:
+    python -m benchmarks.alert_rules [--rules 400] [--funds 60] [--repeat 200]
+
+قواعد مصنوعی ترکیبی از قواعد بازار (when و states) و قواعد صندوق با ۱ تا ۴ شرط
+روی ستون‌های اسنپ‌شات هستند؛ زمان یک پاس evaluate_rules و یک پاس کامل
+fired_alerts (با cooldown و به‌روزرسانی وضعیت) گزارش می‌شود. هدف: زیر 10ms.
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+# cooldownها در state_store نوشته می‌شوند - بنچمارک نباید data/ را دست بزند
+os.environ["TRACKER_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_alert_rules_")
+
+import numpy as np
+from datetime import datetime
+
+from config import CHANGE_THRESHOLDS, CHANGE_WINDOWS
+from benchmarks.fund_memory import make_payload
+from utils.data_processor import process_market_data
+from utils.alert_rules import ALERT_RULES, compile_rules, evaluate_rules, fired_alerts
+
+FUND_COLUMNS = [
+    "nominal_bubble",
+    "close_price_change_percent",
+    "sarane_kharid",
+    "sarane_forosh",
+    "ekhtelaf_sarane",
+    "pol_hagigi",
+    "pol_to_value_ratio",
+    "value",
+    "value_to_avg_ratio",
+]
+MARKET_EXPRESSIONS = [f"{metric}_{window}" for metric in CHANGE_THRESHOLDS for window in CHANGE_WINDOWS] + [
+    "ekhtelaf - prev_ekhtelaf",
+]
+OPERATORS = [">", ">=", "<", "<=", "abs>="]
+
+
+def make_rules(n_rules, rng):
+    """قواعد پیش‌فرض + قواعد مصنوعی تا n_rules"""
+    rules = list(ALERT_RULES)
+    i = 0
+    while len(rules) < n_rules:
+        kind = i % 4
+        if kind == 0:
+            rules.append({
+                "name": f"market_{i}",
+                "scope": "market",
+                "when": [(rng.choice(MARKET_EXPRESSIONS), "abs>=", rng.uniform(0.1, 5))],
+                "cooldown": 300,
+                "message": "price_change",
+            })
+        elif kind == 1:
+            level = rng.uniform(165_000, 175_000)
+            rules.append({
+                "name": f"band_{i}",
+                "scope": "market",
+                "states": {"above": [("dollar", ">", level)], "below": [("dollar", "<", level - 1000)]},
+                "status_key": f"band_{i}",
+                "message": "price_threshold",
+            })
+        else:
+            conditions = [
+                (
+                    rng.choice(FUND_COLUMNS)
+                    if rng.random() < 0.7
+                    else f"{rng.choice(FUND_COLUMNS)} - {rng.choice(FUND_COLUMNS)}",
+                    rng.choice(OPERATORS),
+                    rng.uniform(-50, 200),
+                )
+                for _ in range(rng.randint(1, 4))
+            ]
+            rules.append({
+                "name": f"fund_{i}",
+                "scope": "fund",
+                "when": conditions,
+                "cooldown": "day",
+                "alert_type": f"fund_{i}",
+                "message": "active_funds",
+            })
+        i += 1
+    return rules
+
+
+def measure(fn, repeat):
+    """میانه و p95 زمان اجرا (میلی‌ثانیه)"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples)), float(np.percentile(samples, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rules", type=int, default=400, help="تعداد قواعد")
+    parser.add_argument("--funds", type=int, default=60, help="تعداد صندوق‌ها")
+    parser.add_argument("--repeat", type=int, default=200, help="تعداد تکرار")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(42)
+    snapshot = process_market_data(
+        make_payload(args.funds, 1, rng),
+        gold_price=4050,
+        last_trade=171_000,
+        yesterday_close=169_000,
+        gold_yesterday=3990,
+    )
+    if snapshot is None:
+        sys.exit("❌ پردازش تیک ناموفق بود")
+
+    market = {
+        "dollar": 171_000, "shams": 22_300_000, "gold": 4050, "ekhtelaf": 12,
+        "bubble": 0.4, "pol": 150, "sarane_kol": 40, "prev_ekhtelaf": 3,
+    }
+    # حرکت پنجره‌ها: هر پنجره بلندتر کمی بیشتر (مثل یک رشد آرام)
+    for metric, thresholds in CHANGE_THRESHOLDS.items():
+        for i, window in enumerate(CHANGE_WINDOWS):
+            market[f"{metric}_{window}"] = thresholds[window] * (0.5 + 0.3 * i)
+            market[f"{metric}_{window}_ref"] = (market[metric], 0)
+
+    start = time.perf_counter()
+    compiled = compile_rules(make_rules(args.rules, rng))
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    n_conditions = len(compiled["market"]["cond_expr"]) + len(compiled["fund"]["cond_expr"])
+    eval_median, eval_p95 = measure(lambda: evaluate_rules(compiled, market, snapshot), args.repeat)
+
+    now = datetime.now()
+    status = {}
+    fired, _ = fired_alerts(compiled, market, snapshot, status, now)
+    full_median, full_p95 = measure(
+        lambda: fired_alerts(compiled, market, snapshot, status, now), args.repeat
+    )
+
+    print(
+        f"📊 {len(compiled['rules'])} قاعده / {n_conditions} شرط × {args.funds} صندوق"
+        f" (کامپایل {compile_ms:.1f}ms، {len(fired)} قاعده در تیک اول فعال شد)"
+    )
+    print(f"{'':24}{'median (ms)':>14}{'p95 (ms)':>14}")
+    print(f"{'evaluate_rules':24}{eval_median:>14.3f}{eval_p95:>14.3f}")
+    print(f"{'fired_alerts':24}{full_median:>14.3f}{full_p95:>14.3f}")
+    print("✅ زیر 10ms" if full_p95 < 10 else "❌ بیش از 10ms")
+
+
+if __name__ == "__main__":
+    main()
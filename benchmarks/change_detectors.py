@@ -0,0 +1,70 @@
+# benchmarks/change_detectors.py
+"""
+بنچمارک آشکارسازهای تغییر چندافقی
+
+اجرا از ریشه پروژه:
+    python -m benchmarks.change_detectors [--ticks 2000] [--interval 5]
+
+یک جلسه مصنوعی (گام تصادفی) با فاصله interval ثانیه بین تیک‌ها شبیه‌سازی و زمان
+update_change_detectors (با افزودن خط تیک به فایل) در هر چارک جلسه گزارش می‌شود؛
+با پر شدن پنجره‌ها هزینه هر تیک نباید رشد کند (O(1) سرشکن). زمان بازسازی پنجره‌ها
+از فایل (شروع اجرای بعدی) هم جداگانه گزارش می‌شود.
+"""
+
+import os
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+# وضعیت آشکارسازها روی دیسک نوشته می‌شود - بنچمارک نباید data/ را دست بزند
+os.environ["TRACKER_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_change_detectors_")
+
+import numpy as np
+import pytz
+from datetime import datetime, timedelta
+
+from utils import change_detectors
+from utils.change_detectors import update_change_detectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=2000, help="تعداد تیک‌ها")
+    parser.add_argument("--interval", type=int, default=5, help="فاصله تیک‌ها (ثانیه)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(42)
+    start = pytz.timezone("Asia/Tehran").localize(datetime(2025, 1, 1, 9, 0))
+    values = {"dollar": 171_000.0, "shams": 22_300_000.0, "gold": 4050.0, "bubble": 0.4, "pol": 150.0}
+
+    samples = []
+    for i in range(args.ticks):
+        for name in ("dollar", "shams", "gold"):
+            values[name] *= 1 + rng.gauss(0, 0.001)
+        values["bubble"] += rng.gauss(0, 0.05)
+        values["pol"] += rng.gauss(0, 20)
+        now = start + timedelta(seconds=i * args.interval)
+        t0 = time.perf_counter()
+        update_change_detectors(now, values)
+        samples.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    change_detectors._replay(change_detectors.DETECTOR_STATE["date"])
+    replay_ms = (time.perf_counter() - t0) * 1000
+
+    points = {
+        window: len(state["points"])
+        for window, state in change_detectors.DETECTOR_STATE["metrics"]["dollar"].items()
+    }
+    print(f"📊 {args.ticks} تیک × {args.interval}s - نقاط پنجره‌های دلار: {points}")
+    print(f"{'':24}{'median (ms)':>14}{'p95 (ms)':>14}")
+    for q, chunk in enumerate(np.array_split(np.array(samples), 4), start=1):
+        print(f"{f'update (چارک {q})':24}{np.median(chunk):>14.4f}{np.percentile(chunk, 95):>14.4f}")
+    print(f"⏪ بازسازی از {args.ticks} خط: {replay_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
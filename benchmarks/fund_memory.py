@@ -0,0 +1,167 @@
+# benchmarks/fund_memory.py
+"""
+بنچمارک حافظه Fund_df و dfp برای یک روز معاملاتی کامل
+
+اجرا از ریشه پروژه:
+    python -m benchmarks.fund_memory [--funds 60] [--interval 1]
+
+حالت «قبل» همان نوع‌های قدیمی است (float64، رشته برای زمان/تاریخ، index رشته‌ای)
+و حالت «بعد» خروجی فعلی process_market_data با اسکیمای کم‌حجم.
+"""
+
+import os
+import sys
+import random
+import logging
+import argparse
+import tempfile
+
+# پردازشگر وضعیت تیک قبل را روی دیسک نگه می‌دارد - بنچمارک نباید data/ را دست بزند
+os.environ["TRACKER_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_fund_memory_")
+
+import pandas as pd
+
+from config import ASSET_ORDER, TRADING_HOURS
+from utils.data_processor import process_market_data
+
+
+def make_payload(n_funds, tick, rng):
+    """ساخت پاسخ مصنوعی rahavard365 و tradersarena برای یک تیک"""
+
+    def entity(slug, price):
+        return {
+            "slug": slug,
+            "close_price": price,
+            "close_price_change_percent": rng.uniform(-0.03, 0.03),
+            "last_trade_time": f"2025-01-01 12:{tick % 60:02d}:00",
+        }
+
+    assets = [
+        {"related_entities": [entity(slug, 10_000_000 + i * 1_000 + tick)]}
+        for i, slug in enumerate(ASSET_ORDER)
+    ]
+    warehouse = [{"related_entities": [entity("شمش-طلا", 22_000_000 + tick)]}]
+    funds = [
+        {"related_entities": [dict(entity(f"fund{i}", 10_000), nav=9_900, value=1e10,
+                                   close_price_change=1)]}
+        for i in range(3)
+    ]
+
+    traders = []
+    for i in range(n_funds):
+        row = [None] * 51
+        row[0], row[1] = i, f"صندوق{i}"
+        row[2], row[3] = 1000 + tick, rng.uniform(1e10, 1e13)
+        row[10], row[11], row[13] = rng.uniform(1e4, 6e4), rng.uniform(-5, 5), rng.uniform(-5, 5)
+        row[16], row[17], row[19] = rng.uniform(1e7, 1e9), rng.uniform(1e7, 1e9), rng.uniform(-1e12, 1e12)
+        row[31], row[32] = rng.uniform(1e11, 1e13), rng.uniform(10, 300)
+        row[35], row[36], row[37] = 1.2, 2.3, 3.4
+        row[38], row[40], row[41] = rng.uniform(1e12, 1e14), rng.uniform(1e4, 6e4), rng.uniform(-3, 3)
+        row[42], row[43] = rng.uniform(-2, 2), rng.uniform(-3, 3)
+        row[49], row[50] = "gold", f"IR{i:04d}"
+        traders.append(row)
+
+    return {
+        "rahavard_data": {
+            "data": {
+                "assets": assets,
+                "warehouse_receipt_systems": warehouse,
+                "funds": {"values": funds},
+            }
+        },
+        "traders_data": traders,
+    }
+
+
+def legacy_frames(Fund_df, dfp):
+    """بازسازی نوع‌های قدیمی: float64، index رشته‌ای و زمان/تاریخ رشته‌ای"""
+    old_funds = Fund_df.astype("float64")
+    old_funds.index = old_funds.index.astype(object)
+
+    old_assets = dfp.copy()
+    for col in old_assets.columns:
+        if col == "trade_date":
+            old_assets[col] = old_assets[col].dt.strftime("%Y-%m-%d")
+        elif col == "last_trade_time":
+            old_assets[col] = (pd.Timestamp(0) + old_assets[col]).dt.strftime("%H:%M:%S")
+        elif old_assets[col].dtype.kind == "f":
+            old_assets[col] = old_assets[col].astype("float64")
+    old_assets.index = old_assets.index.astype(object)
+
+    return old_funds, old_assets
+
+
+def frame_bytes(df, shared):
+    """
+    حجم دیتافریم؛ دسته‌های CategoricalIndex که بین تیک‌ها مشترک‌اند
+    فقط یک بار شمرده می‌شوند
+    """
+    if isinstance(df.index, pd.CategoricalIndex):
+        total = int(df.memory_usage(index=False, deep=True).sum())
+        total += df.index.codes.nbytes
+        categories = df.index.categories
+        if id(categories) not in shared:
+            shared.add(id(categories))
+            total += int(categories.memory_usage(deep=True))
+        return total
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--funds", type=int, default=60, help="تعداد صندوق‌ها")
+    parser.add_argument("--interval", type=int, default=1, help="فاصله تیک‌ها (دقیقه)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    ticks = (TRADING_HOURS["end"] - TRADING_HOURS["start"]) * 60 // args.interval
+    rng = random.Random(42)
+
+    totals = {"before_funds": 0, "before_assets": 0, "after_funds": 0, "after_assets": 0}
+    day = []
+    shared = set()
+
+    for tick in range(ticks):
+        snapshot = process_market_data(
+            make_payload(args.funds, tick, rng),
+            gold_price=4000 + tick * 0.1,
+            last_trade=170_000 + tick,
+            yesterday_close=169_000,
+            gold_yesterday=3990,
+        )
+        if snapshot is None:
+            sys.exit("❌ پردازش تیک ناموفق بود")
+
+        Fund_df, dfp = snapshot.funds_frame(), snapshot.assets_frame()
+        old_funds, old_assets = legacy_frames(Fund_df, dfp)
+
+        totals["before_funds"] += frame_bytes(old_funds, shared)
+        totals["before_assets"] += frame_bytes(old_assets, shared)
+        totals["after_funds"] += frame_bytes(Fund_df, shared)
+        totals["after_assets"] += frame_bytes(dfp, shared)
+        day.append(snapshot)
+
+    per_fund_before = totals["before_funds"] / ticks / args.funds
+    per_fund_after = totals["after_funds"] / ticks / args.funds
+    day_before = totals["before_funds"] + totals["before_assets"]
+    day_after = totals["after_funds"] + totals["after_assets"]
+
+    print(f"📊 {ticks} تیک × {args.funds} صندوق ({len(day)} اسنپ‌شات در حافظه)")
+    print(f"{'':24}{'قبل':>14}{'بعد':>14}{'نسبت':>10}")
+    print(
+        f"{'bytes/fund/tick':24}{per_fund_before:>14,.0f}{per_fund_after:>14,.0f}"
+        f"{per_fund_after / per_fund_before:>10.2f}"
+    )
+    print(
+        f"{'dfp bytes/tick':24}{totals['before_assets'] / ticks:>14,.0f}"
+        f"{totals['after_assets'] / ticks:>14,.0f}"
+        f"{totals['after_assets'] / totals['before_assets']:>10.2f}"
+    )
+    print(
+        f"{'full day (bytes)':24}{day_before:>14,}{day_after:>14,}"
+        f"{day_after / day_before:>10.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
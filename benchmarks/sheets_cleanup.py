@@ -0,0 +1,90 @@
+# benchmarks/sheets_cleanup.py
+"""
+بنچمارک و بررسی ایمنی clear_invalid_rows روی Sheet مصنوعی بزرگ
+
+اجرا از ریشه پروژه:
+    python -m benchmarks.sheets_cleanup [--rows 100000] [--invalid 0.01]
+
+روی جایگزین محلی Google Sheets اجرا می‌شود. حالت «قبل» همان پاک کردن کل Sheet
+و بازنویسی همه ردیف‌های معتبر است و حالت
+«بعد» clear_invalid_rows فعلی (خواندن تکه‌ای + یک batchUpdate با deleteDimension).
+در هر دو حالت بررسی می‌شود که ردیف‌های معتبر با همان ترتیب باقی مانده باشند.
+"""
+
+import os
+import sys
+import random
+import logging
+import argparse
+
+os.environ["SHEETS_BACKEND"] = "local"
+
+import utils.sheets_storage as sheets_storage
+from benchmarks.sheets_tail_read import make_sheet as make_base_sheet, measure
+
+
+def make_sheet(n_rows, invalid_ratio, seed=1):
+    """Sheet مصنوعی با ردیف‌های نامعتبر پراکنده و چند بازه متوالی"""
+    rng = random.Random(seed)
+    service = make_base_sheet(n_rows)
+    rows = service.rows()
+    for i in range(1, len(rows)):
+        if rng.random() < invalid_ratio:
+            rows[i] = rows[i][:rng.randrange(0, 13)]
+    # یک بازه متوالی برای بررسی ادغام
+    for i in range(n_rows // 2, n_rows // 2 + 50):
+        rows[i] = rows[i][:5]
+    service.load_rows(rows, trailing_empty=900)
+    sheets_storage.reset_last_row()
+    expected = [row for row in rows if len(row) == 13]
+    return service, expected
+
+
+def legacy_cleanup(service):
+    """روش قبلی: خواندن کل Sheet، پاک کردن و بازنویسی"""
+    values = service.spreadsheets().values()
+    rows = values.get(spreadsheetId="x", range="Sheet1!A:M").execute()["values"]
+    valid_rows = [rows[0]] + [row for row in rows[1:] if len(row) == 13]
+    values.clear(spreadsheetId="x", range="Sheet1!A:M").execute()
+    values.update(
+        spreadsheetId="x", range="Sheet1!A:M", valueInputOption="RAW", body={"values": valid_rows}
+    ).execute()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--invalid", type=float, default=0.01)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    service, expected = make_sheet(args.rows, args.invalid)
+    legacy = measure(service, lambda: legacy_cleanup(service))
+    assert service.rows() == expected, "legacy cleanup lost rows"
+
+    service, expected = make_sheet(args.rows, args.invalid)
+    invalid = args.rows + 1 - len(expected)
+    chunked = measure(service, sheets_storage.clear_invalid_rows)
+    assert service.rows() == expected, "chunked cleanup removed or reordered valid rows"
+    assert sheets_storage.get_last_row() == len(expected)
+
+    # قطعی وسط کار (بعد از چند تکه خواندن یا روی خود batchUpdate): Sheet نباید تغییر کند
+    logging.disable(logging.CRITICAL)
+    for after in (3, chunked[0] - 1):
+        service, expected = make_sheet(args.rows, args.invalid)
+        before = service.rows()
+        service.fail_next(1, after=after)
+        sheets_storage.clear_invalid_rows()
+        assert service.rows() == before, "failed cleanup modified the sheet"
+
+    print(f"rows={args.rows:,} invalid={invalid:,}")
+    print(f"{'':>10} | {'requests':>8} | {'cells moved':>12} | {'ms':>8}")
+    for name, (req, cells, ms) in (("rewrite", legacy), ("chunked", chunked)):
+        print(f"{name:>10} | {req:>8} | {cells:>12,} | {ms:>8.1f}")
+    print("✓ valid rows preserved in order, failed run left the sheet untouched")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# benchmarks/sheets_tail_read.py
+"""
+بنچمارک خواندن انتهای Sheet در برابر دانلود کامل ستون‌ها
+
+اجرا از ریشه پروژه:
+    python -m benchmarks.sheets_tail_read [--sizes 1000 10000 100000] [--limit 3]
+
+جایگزین محلی Google Sheets (utils/sheets_stub.py) با Sheet مصنوعی پر می‌شود و
+تعداد خانه‌های منتقل‌شده و درخواست‌ها شمرده می‌شود. حالت «قبل» همان خواندن Sheet1!A:M است و
+حالت «بعد» read_from_sheets فعلی (یک بار کشف انتهای Sheet در هر پروسه و بعد
+فقط محدوده A{start}:M{end}).
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+os.environ["SHEETS_BACKEND"] = "local"
+
+from config import STANDARD_HEADER
+import utils.sheets_storage as sheets_storage
+
+
+def make_sheet(n_rows, trailing_empty=900):
+    """پر کردن جایگزین محلی Sheets با n_rows ردیف + ردیف‌های خالی grid (مثل INSERT_ROWS)"""
+    service = sheets_storage.get_sheets_service()
+    service.load_rows(
+        [list(STANDARD_HEADER)]
+        + [[f"2025-01-01 12:00:{i % 60:02d}"] + [str(i)] * 12 for i in range(n_rows)],
+        trailing_empty=trailing_empty,
+    )
+    sheets_storage.reset_last_row()
+    return service
+
+
+def measure(service, fn):
+    service.reset_stats()
+    started = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - started) * 1000
+    return service.requests, service.cells_read + service.cells_written, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000, 100_000])
+    parser.add_argument("--limit", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    print(f"limit={args.limit}")
+    print(f"{'rows':>8} | {'full A:M (req/cells/ms)':>26} | "
+          f"{'tail first (req/cells/ms)':>26} | {'tail next (req/cells/ms)':>26}")
+
+    for size in args.sizes:
+        service = make_sheet(size)
+
+        full = measure(
+            service,
+            lambda: service.spreadsheets().values().get(
+                spreadsheetId="x", range="Sheet1!A:M"
+            ).execute(),
+        )
+
+        sheets_storage.reset_last_row()
+        first = measure(service, lambda: sheets_storage.read_from_sheets(limit=args.limit))
+        steady = measure(service, lambda: sheets_storage.read_from_sheets(limit=args.limit))
+
+        print(f"{size:>8} | " + " | ".join(
+            f"{req:>4} {cells:>12,} {ms:>7.1f}" for req, cells, ms in (full, first, steady)
+        ))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
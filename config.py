@@ -26,6 +26,27 @@ BUBBLE_SHARP_CHANGE_THRESHOLD = 0.5  # درصد
 # ✅ آستانه‌های هشدار پول حقیقی
 POL_SHARP_CHANGE_THRESHOLD = 100
 
+# 📈 آشکارسازهای تغییر چندافقی (پنجره لغزان زمانی؛ None = از ابتدای جلسه)
+CHANGE_WINDOWS = {"1m": 1, "5m": 5, "15m": 15, "60m": 60, "session": None}  # دقیقه
+CHANGE_WINDOW_LABELS = {
+    "1m": "1 دقیقه",
+    "5m": "5 دقیقه",
+    "15m": "15 دقیقه",
+    "60m": "1 ساعت",
+    "session": "جلسه امروز",
+}
+CHANGE_WINDOW_COOLDOWNS = {"1m": 0, "5m": 300, "15m": 900, "60m": 3600, "session": 7200}  # ثانیه
+CHANGE_MAX_GAP = 600  # نقطه مرجع قدیمی‌تر از پنجره + این مقدار (ثانیه) کنار گذاشته می‌شود
+
+# آستانه هر متریک در هر پنجره (قیمت‌ها: درصد، حباب: واحد درصد، پول حقیقی: میلیارد تومان)
+CHANGE_THRESHOLDS = {
+    "dollar": {"1m": ALERT_THRESHOLD_PERCENT, "5m": 0.8, "15m": 1.2, "60m": 1.8, "session": 3.0},
+    "shams": {"1m": ALERT_THRESHOLD_PERCENT, "5m": 0.8, "15m": 1.2, "60m": 1.8, "session": 3.0},
+    "gold": {"1m": ALERT_THRESHOLD_PERCENT, "5m": 0.6, "15m": 0.9, "60m": 1.3, "session": 2.0},
+    "bubble": {"1m": BUBBLE_SHARP_CHANGE_THRESHOLD, "5m": 0.8, "15m": 1.2, "60m": 2.0, "session": 3.0},
+    "pol": {"1m": POL_SHARP_CHANGE_THRESHOLD, "5m": 150, "15m": 250, "60m": 400, "session": 800},
+}
+
 # 📌 هندل کانال تلگرام
 CHANNEL_HANDLE = "@Gold_Iran_Market"
 ALERT_CHANNEL_HANDLE = "@ALERT_GOLD"
@@ -44,12 +65,19 @@ HIGH_VALUE = 564
 GIST_ID = os.getenv("GIST_ID")
 GIST_TOKEN = os.getenv("GIST_TOKEN")
 ALERT_STATUS_FILE = "alert_status.json"
+FUND_ALERTS_FILE = "fund_alerts.json"
 MESSAGE_ID_FILE = "message_id.json"
+STATE_BACKUP_FILE = "state_backup.json"  # پشتیبان ذخیره‌ساز محلی وضعیت (utils/state_store.py)
 
 # Google Sheets
 SHEET_ID = os.getenv("SHEET_ID")
 SERVICE_ACCOUNT_JSON = os.getenv("SHEETS_SERVICE_ACCOUNT")
 
+# "google" = Google Sheets واقعی، "local" = جایگزین درون‌پروسه‌ای (utils/sheets_stub.py)
+SHEETS_BACKEND = os.getenv("SHEETS_BACKEND", "google")
+SHEETS_STUB_LATENCY = float(os.getenv("SHEETS_STUB_LATENCY", 0))        # ثانیه
+SHEETS_STUB_ERROR_RATE = float(os.getenv("SHEETS_STUB_ERROR_RATE", 0))  # 0 تا 1
+
 # Telegram
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
@@ -160,6 +188,14 @@ MAX_RETRIES = 3
 RETRY_DELAY = 5  # ثانیه
 REQUEST_TIMEOUT = 90  # ثانیه
 
+# صف ارسال هشدارهای تلگرام (Telegram: حدود 1 پیام در ثانیه و 20 پیام در دقیقه برای هر چت)
+ALERT_CHAT_MIN_INTERVAL = 1.0   # حداقل فاصله دو پیام در یک چت (ثانیه)
+ALERT_CHAT_PER_MINUTE = 20      # سقف پیام در دقیقه برای هر چت
+ALERT_MAX_RETRIES = 3           # سقف تلاش مجدد هر پیام
+ALERT_MAX_RETRY_AFTER = 60      # سقف retry_after قابل قبول (ثانیه)؛ بیشتر از آن پیام کنار گذاشته می‌شود
+ALERT_MESSAGE_LIMIT = 4096      # سقف طول متن پیام تلگرام (کاراکتر)
+ALERT_QUEUE_WAIT = 90           # حداکثر صبر برای خالی شدن صف در پایان اجرا (ثانیه)
+
 # Headers برای درخواست‌های HTTP
 HTTP_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
@@ -189,6 +225,75 @@ STANDARD_HEADER = [
 # تعداد روزهای نگهداری داده
 KEEP_DAYS = 30
 
+# ════════════════════════════════════════════════════════════════
+# 💾 تنظیمات ذخیره‌سازی محلی
+# ════════════════════════════════════════════════════════════════
+
+# پوشه داده‌های محلی (در GitHub Actions با cache بین اجراها حفظ می‌شود)
+DATA_DIR = os.getenv("TRACKER_DATA_DIR", "data")
+
+# پایگاه داده محلی (منبع اصلی خواندن؛ Google Sheets فقط آینه است)
+LOCAL_DB_FILE = os.path.join(DATA_DIR, "market.db")
+
+# ظرفیت بافر حلقوی ردیف‌های اخیر در حافظه (مقایسه‌های هشدار؛ نمودار از market_history می‌خواند)
+RECENT_ROWS_CAPACITY = 100
+
+# صف نوشتن پس‌زمینه در Google Sheets
+SHEETS_BATCH_SIZE = 500       # حداکثر ردیف در هر append
+SHEETS_RETRY_BASE = 2         # تأخیر اولین تلاش مجدد (ثانیه)
+SHEETS_RETRY_MAX = 60         # سقف تأخیر تلاش مجدد (ثانیه)
+
+# فایل ستونی append-only تاریخچه بازار (یک آرایه برای زمان و یک آرایه برای هر متریک)
+MARKET_HISTORY_DIR = os.path.join(DATA_DIR, "market_history")
+
+# آرشیو ماهانه Parquet ردیف‌هایی که از Sheet حذف می‌شوند
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+ARCHIVE_MANIFEST_FILE = os.path.join(ARCHIVE_DIR, "manifest.json")
+
+# آخرین نسخه فایل‌های Gist + ETag (برای GET شرطی در اجرای بعدی)
+GIST_CACHE_FILE = os.path.join(DATA_DIR, "gist_cache.json")
+
+# عمر هشدارهای ثبت‌شده صندوق‌ها در ذخیره‌ساز وضعیت (روز)
+FUND_ALERT_TTL_DAYS = 7
+
+# تب خلاصه روزانه (OHLC هر متریک) در Google Sheets
+ROLLUP_SHEET_NAME = "Rollup"
+
+# پارتیشن ماهانه (شمسی) ردیف‌ها در Google Sheets: تب Data-1404-07 و فهرست آن‌ها در تب Index
+SHEET_PARTITION_PREFIX = "Data"
+SHEET_INDEX_NAME = "Index"
+
+# وضعیت تیک قبلی صندوق‌ها برای پردازش افزایشی
+FUND_STATE_FILE = os.path.join(DATA_DIR, "fund_state.pkl")
+
+# سری زمانی درون‌روزی هر صندوق (یک پوشه برای هر روز)
+FUND_HISTORY_DIR = os.path.join(DATA_DIR, "fund_history")
+
+# وضعیت آمار غلتان (EWMA، میانگین/انحراف معیار، کمینه/بیشینه، VWAP)
+ROLLING_STATS_FILE = os.path.join(DATA_DIR, "rolling_stats.json")
+ROLLING_WINDOW = 30      # تعداد تیک‌های پنجره غلتان
+EWMA_ALPHA = 0.2         # ضریب هموارسازی EWMA
+ZSCORE_THRESHOLD = 3.0   # هشدار فاصله غیرعادی قیمت از میانگین پنجره غلتان (|z|)
+ZSCORE_COOLDOWN = 1800   # فاصله دو هشدار z-score یک دارایی (ثانیه)
+
+# تیک‌های امروز آشکارسازهای تغییر (فقط-افزودنی؛ با شروع روز جدید از نو نوشته می‌شود)
+CHANGE_DETECTORS_FILE = os.path.join(DATA_DIR, "change_detectors.jsonl")
+
+# ستون‌هایی از Fund_df که در هر تیک برای هر صندوق ذخیره می‌شوند
+FUND_HISTORY_COLUMNS = [
+    "close_price",
+    "close_price_change_percent",
+    "final_price_change",
+    "nominal_bubble",
+    "pol_hagigi",
+    "pol_to_value_ratio",
+    "sarane_kharid",
+    "sarane_forosh",
+    "ekhtelaf_sarane",
+    "value",
+    "value_to_avg_ratio",
+]
+
 # ════════════════════════════════════════════════════════════════
 # 📝 تنظیمات Logging
 # ════════════════════════════════════════════════════════════════
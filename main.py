@@ -21,10 +21,20 @@ from utils.data_fetcher import (
     fetch_market_data, fetch_dirham_price
 )
 from utils.data_processor import process_market_data
+from utils.fund_history import append_fund_tick, prune_fund_history
+from utils.market_history import prune_market_history
+from utils.daily_rollup import build_daily_rollups
+from utils.rolling_stats import update_rolling_stats
 from utils.telegram_sender import send_to_telegram
 from utils.holidays import is_iranian_holiday
-from utils.sheets_storage import save_to_sheets, read_from_sheets
+from utils.local_store import (
+    save_row, wait_for_mirror, mirror_stats, last_close_before, checkpoint_local_store
+)
+from utils.sheets_storage import get_api_call_stats
 from utils.alerts import check_and_send_alerts
+from utils.alert_queue import wait_for_alerts, alert_queue_stats
+from utils.gist_state import flush_gist_state
+from utils.state_store import backup_state_to_gist
 
 # ════════════════════════════════════════════════════════════════
 # تنظیمات Logging
@@ -51,38 +61,22 @@ def get_gold_yesterday_from_sheet(today_date):
         tuple: (قیمت طلا، تاریخ پیدا شده، موفقیت)
     """
     try:
-        from datetime import datetime, timedelta
-
-        today = datetime.strptime(today_date, "%Y-%m-%d")
+        from datetime import datetime
 
         logger.info(f"🔍 جستجوی آخرین قیمت طلای قبل از {today_date}")
 
-        # خواندن 80 رکورد آخر (برای احتمال تعطیلات طولانی)
-        rows = read_from_sheets(limit=800)
+        # ✅ ایندکس روزها: بدون خواندن و پیمایش ردیف‌ها
+        gold_price, row_date_str = last_close_before(today_date, "gold_price_usd")
 
-        if not rows:
-            logger.warning("⚠️ هیچ رکوردی در شیت پیدا نشد")
+        if gold_price is None:
+            logger.warning(f"⚠️ هیچ رکورد معتبری قبل از {today_date} پیدا نشد")
             return None, None, False
 
-        # جستجو از آخرین رکورد به قبل تا پیدا کردن اولین روز قبل از امروز
-        for row in reversed(rows):
-            if len(row) > 1 and row[0]:
-                row_date_str = row[0][:10]  # اگر datetime باشه فقط تاریخ رو میگیریم
-                row_date = datetime.strptime(row_date_str, "%Y-%m-%d")
-
-                # باید قبل از امروز باشه
-                if row_date < today:
-                    if row[1]:  # ستون دوم قیمت اونس طلا
-                        gold_price = float(row[1])
-                        days_ago = (today - row_date).days
-                        logger.info(f"✅ آخرین قیمت طلا: ${gold_price:.2f} (تاریخ {row_date_str} - {days_ago} روز پیش)")
-                        return gold_price, row_date_str, True
-                    else:
-                        logger.warning(f"⚠️ تاریخ {row_date_str} پیدا شد ولی قیمت خالی است")
-                        continue  # به دنبال رکورد قبلی میگردیم
-
-        logger.warning(f"⚠️ هیچ رکورد معتبری قبل از {today_date} پیدا نشد")
-        return None, None, False
+        days_ago = (
+            datetime.strptime(today_date, "%Y-%m-%d") - datetime.strptime(row_date_str, "%Y-%m-%d")
+        ).days
+        logger.info(f"✅ آخرین قیمت طلا: ${gold_price:.2f} (تاریخ {row_date_str} - {days_ago} روز پیش)")
+        return float(gold_price), row_date_str, True
 
     except Exception as e:
         logger.error(f"❌ خطا در خواندن قیمت طلای دیروز: {e}")
@@ -100,38 +94,22 @@ def get_dollar_yesterday_from_sheet(today_date):
         tuple: (قیمت دلار، تاریخ پیدا شده، موفقیت)
     """
     try:
-        from datetime import datetime, timedelta
-
-        today = datetime.strptime(today_date, "%Y-%m-%d")
+        from datetime import datetime
 
         logger.info(f"🔍 جستجوی آخرین قیمت دلار قبل از {today_date}")
 
-        # خواندن 80 رکورد آخر
-        rows = read_from_sheets(limit=800)
+        # ✅ ایندکس روزها: بدون خواندن و پیمایش ردیف‌ها
+        dollar_price, row_date_str = last_close_before(today_date, "dollar_price")
 
-        if not rows:
-            logger.warning("⚠️ هیچ رکوردی در شیت پیدا نشد")
+        if dollar_price is None:
+            logger.warning(f"⚠️ هیچ رکورد معتبری قبل از {today_date} پیدا نشد")
             return None, None, False
 
-        # جستجو از آخرین رکورد به قبل
-        for row in reversed(rows):
-            if len(row) > 2 and row[0]:
-                row_date_str = row[0][:10]  # تاریخ
-                row_date = datetime.strptime(row_date_str, "%Y-%m-%d")
-
-                # باید قبل از امروز باشه
-                if row_date < today:
-                    if row[2]:  # ستون سوم قیمت دلار
-                        dollar_price = float(row[2])
-                        days_ago = (today - row_date).days
-                        logger.info(f"✅ آخرین قیمت دلار: {dollar_price:,.0f} تومان (تاریخ {row_date_str} - {days_ago} روز پیش)")
-                        return dollar_price, row_date_str, True
-                    else:
-                        logger.warning(f"⚠️ تاریخ {row_date_str} پیدا شد ولی قیمت دلار خالی است")
-                        continue
-
-        logger.warning(f"⚠️ هیچ رکورد معتبری قبل از {today_date} پیدا نشد")
-        return None, None, False
+        days_ago = (
+            datetime.strptime(today_date, "%Y-%m-%d") - datetime.strptime(row_date_str, "%Y-%m-%d")
+        ).days
+        logger.info(f"✅ آخرین قیمت دلار: {dollar_price:,.0f} تومان (تاریخ {row_date_str} - {days_ago} روز پیش)")
+        return float(dollar_price), row_date_str, True
 
     except Exception as e:
         logger.error(f"❌ خطا در خواندن قیمت دلار دیروز: {e}")
@@ -279,39 +257,32 @@ async def main():
                 logger.error("❌ پردازش داده ناموفق")
                 return
 
-            Fund_df = processed['Fund_df']
-            dfp = processed['dfp']
+            logger.info(f"✅ پردازش کامل شد - {len(processed.fund_symbols)} صندوق")
 
-            logger.info(f"✅ پردازش کامل شد - {len(Fund_df)} صندوق")
+            # ✅ سری زمانی درون‌روزی هر صندوق (محلی)
+            append_fund_tick(processed, now)
+            prune_fund_history()
+            prune_market_history()
 
             # ───────────────────────────────────────────────────
             # 7️⃣ محاسبه میانگین‌های وزنی و ساده + پول حقیقی
             # ───────────────────────────────────────────────────
-            total_value = Fund_df["value"].sum() or 1
+            # ✅ جمع‌های وزنی به‌صورت افزایشی در پردازشگر نگه داشته می‌شوند
+            fund_metrics = processed.fund_metrics
 
             # میانگین وزنی (برای آخرین قیمت)
-            fund_change_weighted = (
-                (Fund_df["close_price_change_percent"] * Fund_df["value"]).sum() / total_value
-            )
-            fund_bubble_weighted = (
-                (Fund_df["nominal_bubble"] * Fund_df["value"]).sum() / total_value
-            )
+            fund_change_weighted = fund_metrics["fund_change_weighted"]
+            fund_bubble_weighted = fund_metrics["fund_bubble_weighted"]
 
             # ✅ میانگین ساده قیمت پایانی
-            fund_final_price_avg = Fund_df["final_price_change"].mean()
+            fund_final_price_avg = fund_metrics["fund_final_price_avg"]
 
-            sarane_kharid_w = (
-                (Fund_df["sarane_kharid"] * Fund_df["value"]).sum() / total_value
-            )
-            sarane_forosh_w = (
-                (Fund_df["sarane_forosh"] * Fund_df["value"]).sum() / total_value
-            )
-            ekhtelaf_sarane_w = sarane_kharid_w - sarane_forosh_w
+            sarane_kharid_w = fund_metrics["sarane_kharid_w"]
+            sarane_forosh_w = fund_metrics["sarane_forosh_w"]
+            ekhtelaf_sarane_w = fund_metrics["ekhtelaf_sarane_w"]
 
             # ✅ محاسبه پول حقیقی (میانگین وزنی)
-            pol_hagigi_weighted = (
-                Fund_df["pol_hagigi"].sum()
-            )
+            pol_hagigi_weighted = fund_metrics["pol_hagigi"]
 
             dollar_change = (
                 ((last_trade - yesterday_close) / yesterday_close) * 100 
@@ -327,14 +298,9 @@ async def main():
                 logger.info("📈 تغییر اونس طلا: 0% (قیمت دیروز نبود)")
 
             # گرفتن اطلاعات شمش
-            if "شمش-طلا" in dfp.index:
-                shams_change = dfp.loc["شمش-طلا", "close_price_change_percent"]
-                shams_price = dfp.loc["شمش-طلا", "close_price"]
-                shams_date = dfp.loc["شمش-طلا", "trade_date"]
-            else:
-                shams_change = 0
-                shams_price = 0
-                shams_date = None
+            shams_change = processed.asset("شمش-طلا", "close_price_change_percent", 0)
+            shams_price = processed.asset("شمش-طلا", "close_price", 0)
+            shams_date = processed.asset("شمش-طلا", "trade_date")
 
             logger.info(f"📈 تغییر دلار: {dollar_change:+.2f}%")
             logger.info(f"📈 تغییر اونس طلا: {gold_change:+.2f}%")
@@ -344,11 +310,24 @@ async def main():
             logger.info(f"🎈 میانگین حباب: {fund_bubble_weighted:+.2f}%")
             logger.info(f"💸 پول حقیقی (وزنی): {pol_hagigi_weighted:+.2f} م.ت")
 
+            # ✅ آمار غلتان درون‌روزی (O(پنجره) برای هر متریک؛ z-score در هشدارها هم استفاده می‌شود)
+            rolling = update_rolling_stats(now, {
+                'dollar': last_trade,
+                'shams': shams_price,
+                'gold': gold_today,
+                'bubble': fund_bubble_weighted,
+                'pol_hagigi': pol_hagigi_weighted,
+            }, processed)
+            for name in ('dollar', 'shams', 'gold', 'bubble', 'pol_hagigi'):
+                stats = rolling.get(name)
+                if stats and stats['z'] is not None:
+                    logger.info(f"📐 {name}: z={stats['z']:+.2f} | EWMA={stats['ewma']:,.2f}")
+
             # ───────────────────────────────────────────────────
-            # 8️⃣ ذخیره در Google Sheets
+            # 8️⃣ ذخیره در پایگاه داده محلی (+ کپی پس‌زمینه در Google Sheets)
             # ───────────────────────────────────────────────────
-            logger.info("💾 ذخیره داده‌ها در Google Sheets...")
-            save_to_sheets({
+            logger.info("💾 ذخیره داده‌ها...")
+            save_row({
                 'gold_price': gold_today,
                 'dollar_price': last_trade,
                 'shams_price': shams_price,
@@ -404,6 +383,43 @@ async def main():
                 logger.error(f"⚠️ خطا در سیستم هشدارها (ادامه می‌دهیم): {e}")
 
             # ───────────────────────────────────────────────────
+            # 💾 پشتیبان وضعیت محلی در Gist (یک PATCH برای کل تیک، فقط اگر تغییری باشد)
+            # ───────────────────────────────────────────────────
+            backup_state_to_gist()
+            flush_gist_state()
+
+            # ───────────────────────────────────────────────────
+            # 📅 خلاصه روزانه روزهای کامل‌شده (فقط اولین اجرای هر روز کاری انجام می‌دهد)
+            # ───────────────────────────────────────────────────
+            build_daily_rollups(today_str)
+
+            # ───────────────────────────────────────────────────
+            # ⏳ صبر برای کپی ردیف‌ها در Google Sheets
+            # ───────────────────────────────────────────────────
+            wait_for_mirror()
+            wait_for_alerts()
+            checkpoint_local_store()
+
+            alert_stats = alert_queue_stats()
+            logger.info(
+                f"🚨 صف هشدارها: {alert_stats['sent']} ارسال، {alert_stats['merged']} ادغام، "
+                f"{alert_stats['retries']} تلاش مجدد، {alert_stats['dropped']} ناموفق"
+                + (f"، {alert_stats['depth']} منتظر" if alert_stats['depth'] else "")
+            )
+
+            queue_stats = mirror_stats()
+            logger.info(
+                f"📤 صف Sheet: {queue_stats['depth']} ردیف منتظر"
+                + (f" (قدیمی‌ترین {queue_stats['oldest_age']:.0f} ثانیه)" if queue_stats['oldest_age'] else "")
+                + f"، {queue_stats['flushed']} ردیف در {queue_stats['batches']} دسته ارسال شد"
+            )
+
+            api_calls = get_api_call_stats(reset=True)
+            logger.info(
+                f"📊 فراخوانی‌های Sheets API در این تیک: {api_calls.pop('total')} "
+                f"{api_calls}"
+            )
+
             logger.info("=" * 60)
             logger.info("✅ اجرای کامل به پایان رسید")
             logger.info("=" * 60)
@@ -0,0 +1,311 @@
+# utils/alert_queue.py
+"""
+صف پس‌زمینه ارسال هشدارهای تلگرام
+
+پایپ‌لاین فقط پیام را در صف می‌گذارد و یک نخ پس‌زمینه آن را ارسال می‌کند:
+    - محدودیت هر چت: حداقل ALERT_CHAT_MIN_INTERVAL ثانیه بین دو پیام و حداکثر
+      ALERT_CHAT_PER_MINUTE پیام در هر پنجره 60 ثانیه‌ای
+    - پاسخ 429: کل چت تا retry_after متوقف می‌شود (حداکثر ALERT_MAX_RETRY_AFTER)
+      و پیام حداکثر ALERT_MAX_RETRIES بار دوباره ارسال می‌شود؛ خطای شبکه و 5xx
+      با تأخیر نمایی تلاش می‌شوند
+    - در هر تلاش مجدد کل چت تا زمان تلاش متوقف می‌شود، پس ترتیب پیام‌های یک چت
+      حفظ می‌شود
+    - صف بر اساس زمان آماده بودن مرتب است، پس انتظار یک چت بقیه را معطل نمی‌کند
+
+هشدارهایی که داخل alert_batch() ثبت شوند (یک تیک) برای هر چت در یک پیام
+ادغام می‌شوند (تا سقف ALERT_MESSAGE_LIMIT کاراکتر).
+"""
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+from config import (
+    REQUEST_TIMEOUT,
+    RETRY_DELAY,
+    ALERT_CHAT_MIN_INTERVAL,
+    ALERT_CHAT_PER_MINUTE,
+    ALERT_MAX_RETRIES,
+    ALERT_MAX_RETRY_AFTER,
+    ALERT_MESSAGE_LIMIT,
+    ALERT_QUEUE_WAIT,
+)
+
+logger = logging.getLogger(__name__)
+
+ALERT_STATS = {"queued": 0, "sent": 0, "merged": 0, "retries": 0, "dropped": 0}
+
+MERGE_SEPARATOR = "\n\n➖➖➖➖➖➖➖➖\n\n"
+
+# ✅ صف زمان‌بندی: (زمان آماده بودن monotonic، ترتیب ثبت، پیام)
+_QUEUE = []
+_SEQ = itertools.count()
+_COND = threading.Condition()
+_IN_FLIGHT = 0
+_WORKER = None
+
+# ✅ فقط نخ ارسال به این دو دست می‌زند: زمان ارسال‌های اخیر و توقف 429 هر چت
+_CHAT_SENDS = {}
+_CHAT_BLOCKED_UNTIL = {}
+
+# ✅ هشدارهای تیک جاری: {(bot_token, chat_id): [caption, ...]} (None = خارج از دسته)
+_BATCH = None
+
+
+def _count(key, n=1):
+    """به‌روزرسانی ALERT_STATS (از نخ اصلی و نخ ارسال؛ زیر قفل صف)"""
+    with _COND:
+        ALERT_STATS[key] += n
+
+
+# ════════════════════════════════════════════════════════════════
+# ادغام پیام‌ها
+# ════════════════════════════════════════════════════════════════
+
+
+def merge_captions(captions, limit=ALERT_MESSAGE_LIMIT):
+    """
+    ادغام پیام‌های یک چت در کمترین تعداد پیام
+
+    اگر دو خط آخر همه پیام‌ها یکسان باشد (زمان + هندل کانال) فقط یک بار در
+    انتهای پیام ادغام‌شده می‌آید. هیچ پیامی از وسط نصف نمی‌شود.
+
+    Returns:
+        list: متن پیام‌های نهایی
+    """
+    if len(captions) < 2:
+        return list(captions)
+
+    footers = {"\n".join(caption.split("\n")[-2:]) for caption in captions}
+    if len(footers) == 1 and all(caption.count("\n") > 2 for caption in captions):
+        footer = footers.pop()
+        bodies = [caption[: -len(footer)].rstrip() for caption in captions]
+        tail = f"\n\n{footer}"
+    else:
+        bodies = list(captions)
+        tail = ""
+
+    messages = []
+    current = None
+    for body in bodies:
+        candidate = body if current is None else f"{current}{MERGE_SEPARATOR}{body}"
+        if current is not None and len(candidate) + len(tail) > limit:
+            messages.append(current + tail)
+            current = body
+        else:
+            current = candidate
+    messages.append(current + tail)
+    return messages
+
+
+@contextmanager
+def alert_batch():
+    """
+    هشدارهای ثبت‌شده داخل بلوک در پایان آن برای هر چت ادغام و یکجا در صف گذاشته می‌شوند
+    """
+    global _BATCH
+
+    if _BATCH is not None:
+        yield
+        return
+
+    _BATCH = {}
+    try:
+        yield
+    finally:
+        batch, _BATCH = _BATCH, None
+        for (bot_token, chat_id), captions in batch.items():
+            messages = merge_captions(captions)
+            _count("merged", len(captions) - len(messages))
+            if len(messages) < len(captions):
+                logger.info(f"🧩 {len(captions)} هشدار در {len(messages)} پیام ادغام شد")
+            for text in messages:
+                _enqueue(bot_token, chat_id, text)
+
+
+# ════════════════════════════════════════════════════════════════
+# صف و نخ ارسال
+# ════════════════════════════════════════════════════════════════
+
+
+def enqueue_alert(bot_token, chat_id, caption):
+    """افزودن یک هشدار به صف ارسال (داخل alert_batch تا پایان دسته نگه داشته می‌شود)"""
+    if _BATCH is not None:
+        _BATCH.setdefault((bot_token, chat_id), []).append(caption)
+        return
+    _enqueue(bot_token, chat_id, caption)
+
+
+def _enqueue(bot_token, chat_id, text):
+    message = {
+        "bot_token": bot_token,
+        "chat_id": chat_id,
+        "text": text,
+        "attempts": 0,
+        "seq": next(_SEQ),
+    }
+    _count("queued")
+    _schedule(message, time.monotonic())
+    _start_worker()
+
+
+def _schedule(message, ready_at):
+    with _COND:
+        heapq.heappush(_QUEUE, (ready_at, message["seq"], message))
+        _COND.notify_all()
+
+
+def _start_worker():
+    global _WORKER
+
+    with _COND:
+        if _WORKER is None:
+            _WORKER = threading.Thread(target=_worker, name="alert-sender", daemon=True)
+            _WORKER.start()
+
+
+def _worker():
+    global _IN_FLIGHT
+
+    while True:
+        with _COND:
+            while True:
+                if not _QUEUE:
+                    _COND.wait()
+                    continue
+                delay = _QUEUE[0][0] - time.monotonic()
+                if delay <= 0:
+                    break
+                _COND.wait(delay)
+            _, _, message = heapq.heappop(_QUEUE)
+            _IN_FLIGHT += 1
+
+        try:
+            _deliver(message)
+        except Exception as e:
+            _count("dropped")
+            logger.error(f"❌ خطا در صف ارسال هشدار: {e}", exc_info=True)
+        finally:
+            with _COND:
+                _IN_FLIGHT -= 1
+                _COND.notify_all()
+
+
+def _allowed_at(chat_id):
+    """
+    زمان مجاز شدن پیام بعدی این چت (monotonic)
+
+    برای همه پیام‌های منتظر یک چت دقیقاً یک مقدار است، پس ترتیب ثبت حفظ می‌شود.
+    """
+    allowed = _CHAT_BLOCKED_UNTIL.get(chat_id, 0)
+    sends = _CHAT_SENDS.get(chat_id)
+    if sends:
+        allowed = max(allowed, sends[-1] + ALERT_CHAT_MIN_INTERVAL)
+        if len(sends) == sends.maxlen:
+            allowed = max(allowed, sends[0] + 60)
+    return allowed
+
+
+def _retry(message, ready_at, reason):
+    """
+    زمان‌بندی دوباره پیام در ready_at
+
+    چت تا ready_at متوقف می‌شود تا پیام‌های بعدی همان چت (که زودتر آماده‌اند)
+    از پیام در حال تلاش جلو نزنند؛ در زمان برابر ترتیب ثبت تعیین‌کننده است.
+    """
+    message["attempts"] += 1
+    if message["attempts"] > ALERT_MAX_RETRIES:
+        _count("dropped")
+        logger.error(f"❌ هشدار پس از {ALERT_MAX_RETRIES} تلاش مجدد ارسال نشد ({reason})")
+        return
+    chat_id = message["chat_id"]
+    _CHAT_BLOCKED_UNTIL[chat_id] = max(_CHAT_BLOCKED_UNTIL.get(chat_id, 0), ready_at)
+    _count("retries")
+    logger.warning(
+        f"⚠️ ارسال هشدار ناموفق ({reason}) - تلاش {message['attempts']}/{ALERT_MAX_RETRIES} "
+        f"{max(ready_at - time.monotonic(), 0):.0f} ثانیه دیگر"
+    )
+    _schedule(message, ready_at)
+
+
+def _deliver(message):
+    chat_id = message["chat_id"]
+    now = time.monotonic()
+
+    allowed_at = _allowed_at(chat_id)
+    if allowed_at > now:
+        _schedule(message, allowed_at)
+        return
+
+    _CHAT_SENDS.setdefault(chat_id, deque(maxlen=ALERT_CHAT_PER_MINUTE)).append(now)
+    backoff = now + RETRY_DELAY * 2 ** message["attempts"]
+
+    try:
+        response = requests.post(
+            f"https://api.telegram.org/bot{message['bot_token']}/sendMessage",
+            data={"chat_id": chat_id, "text": message["text"], "parse_mode": "HTML"},
+            timeout=REQUEST_TIMEOUT,
+        )
+    except Exception as e:
+        _retry(message, backoff, str(e))
+        return
+
+    if response.status_code == 200:
+        _count("sent")
+        logger.info("✅ هشدار ارسال شد")
+    elif response.status_code == 429:
+        try:
+            retry_after = response.json().get("parameters", {}).get("retry_after", 5)
+        except ValueError:
+            retry_after = 5
+        if retry_after > ALERT_MAX_RETRY_AFTER:
+            _count("dropped")
+            logger.error(f"❌ Rate limit: retry_after={retry_after}s بیش از سقف - هشدار کنار گذاشته شد")
+            return
+        _retry(message, time.monotonic() + retry_after, f"429, retry_after={retry_after}s")
+    elif response.status_code >= 500:
+        _retry(message, backoff, f"HTTP {response.status_code}")
+    else:
+        _count("dropped")
+        logger.warning(f"⚠️ ارسال هشدار با خطا: {response.status_code}")
+
+
+# ════════════════════════════════════════════════════════════════
+# وضعیت صف
+# ════════════════════════════════════════════════════════════════
+
+
+def alert_queue_stats():
+    """
+    وضعیت صف هشدارها
+
+    Returns:
+        dict: depth (پیام‌های منتظر یا در حال ارسال) + queued/sent/merged/retries/dropped
+    """
+    with _COND:
+        return dict(ALERT_STATS, depth=len(_QUEUE) + _IN_FLIGHT)
+
+
+def wait_for_alerts(timeout=ALERT_QUEUE_WAIT):
+    """صبر تا خالی شدن صف هشدارها (قبل از پایان اجرای تک‌مرحله‌ای)"""
+    if _WORKER is None:
+        return True
+
+    deadline = time.monotonic() + timeout
+    with _COND:
+        while _QUEUE or _IN_FLIGHT:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(
+                    f"⚠️ صف هشدارها در {timeout} ثانیه خالی نشد "
+                    f"({len(_QUEUE) + _IN_FLIGHT} پیام ارسال نشد)"
+                )
+                return False
+            _COND.wait(remaining)
+    return True
@@ -0,0 +1,512 @@
+# utils/alert_rules.py
+"""
+موتور قواعد هشدار (declarative + برداری)
+
+هر قاعده فقط داده است:
+    name        نام یکتا
+    scope       "market" (مقادیر اسکالر بازار) یا "fund" (یک مقدار برای هر صندوق)
+    when        لیست شرط‌های (عبارت، مقایسه‌گر، آستانه) که با AND ترکیب می‌شوند
+    states      به جای when: {وضعیت: شرط} برای قواعد لبه‌ای (کراس صفر / عبور از آستانه)؛
+                اولین وضعیت برقرار انتخاب می‌شود و اگر هیچ‌کدام نباشد "normal" است
+    status_key  کلید alert_status برای قواعد states (فقط با تغییر وضعیت هشدار می‌دهد)
+    cooldown    None (هر تیک)، ثانیه (کلید TTL در state_store) یا "day" (صندوق‌ها، یک بار در روز)
+    alert_type  نوع هشدار صندوق برای cooldown روزانه (dedupe: انواعی که تکرار را می‌گیرند)
+    changed_only فقط صندوق‌هایی که از تیک قبل تغییر کرده‌اند
+    group       از قواعد بازار هم‌گروه فقط اولین قاعده فعال در هر تیک ارسال می‌شود
+                (cooldown بقیه هم ثبت می‌شود تا همان حرکت دوباره هشدار ندهد)
+    message     نام قالب پیام در alerts.py
+    params      پارامترهای ثابت قالب پیام
+
+عبارت‌ها یک بار کامپایل می‌شوند. در هر تیک هر عبارت یکتا یک بار ارزیابی می‌شود
+(برای صندوق‌ها روی کل ستون) و همه شرط‌ها با یک مقایسه برداری برای هر نوع
+مقایسه‌گر و یک logical_and.reduceat ترکیب می‌شوند؛ افزودن قاعده فقط یک ردیف به
+جدول شرط‌ها اضافه می‌کند و مسیر کد تازه‌ای نمی‌سازد.
+"""
+
+import logging
+import numpy as np
+
+from config import (
+    DOLLAR_HIGH,
+    DOLLAR_LOW,
+    SHAMS_HIGH,
+    SHAMS_LOW,
+    GOLD_HIGH,
+    GOLD_LOW,
+    EKHTELAF_THRESHOLD,
+    CHANGE_THRESHOLDS,
+    CHANGE_WINDOW_COOLDOWNS,
+    ZSCORE_THRESHOLD,
+    ZSCORE_COOLDOWN,
+)
+from utils.state_store import state_has, state_set_many, alerted_symbols, mark_fund_alerts
+from utils.change_detectors import CHANGE_METRICS
+from utils.data_processor import FUND_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+# همه انواع هشدار صندوق (هشدار سخت خرید برای صندوقی که امروز هر هشداری گرفته تکرار نمی‌شود)
+FUND_ALERT_TYPES = ("هشدار سخت خرید", "کراس مثبت", "کراس منفی")
+
+# نام‌های مجاز در عبارت‌های بازار (خروجی market_metrics در alerts.py)
+# + حرکت هر پنجره آشکارسازهای تغییر: dollar_5m، bubble_session، ...
+# + z-score آمار غلتان درون‌روزی: dollar_z، shams_z، gold_z
+MARKET_METRICS = (
+    "dollar",
+    "shams",
+    "gold",
+    "ekhtelaf",
+    "bubble",
+    "pol",
+    "sarane_kol",
+    "prev_dollar",
+    "prev_shams",
+    "prev_gold",
+    "prev_ekhtelaf",
+    "prev_bubble",
+    "prev_pol",
+    "dollar_z",
+    "shams_z",
+    "gold_z",
+) + CHANGE_METRICS
+
+# ستون‌های صندوق مجاز در عبارت‌های صندوق (ستون‌های Fund_df در data_processor)
+FUND_METRICS = tuple(FUND_SCHEMA)
+
+# قالب پیام حرکت‌های پنجره‌ای هر متریک
+CHANGE_MESSAGES = {
+    "dollar": ("price_change", {"asset": "دلار", "price": "dollar", "unit": "تومان"}),
+    "shams": ("price_change", {"asset": "شمش طلا", "price": "shams", "unit": "ریال"}),
+    "gold": ("price_change", {"asset": "اونس طلا", "price": "gold", "unit": "دلار", "is_gold": True}),
+    "bubble": ("bubble_sharp", {}),
+    "pol": ("pol_sharp", {}),
+}
+
+
+def pct(current, previous):
+    """درصد تغییر (قبلی نامعتبر یا صفر → nan)"""
+    previous = np.where(previous > 0, previous, np.nan)
+    return (current - previous) / previous * 100
+
+
+FUNCTIONS = {"pct": pct, "abs": np.abs, "where": np.where, "minimum": np.minimum, "maximum": np.maximum}
+
+def change_rules(metric):
+    """
+    قواعد حرکت پنجره‌ای یک متریک: برای هر پنجره یک قاعده افزایش و یک قاعده کاهش
+    با آستانه و cooldown همان پنجره (هم‌گروه، پس در هر تیک یک هشدار برای هر جهت)
+    """
+    message, params = CHANGE_MESSAGES[metric]
+    rules = []
+    for direction, op, sign in (("up", ">=", 1), ("down", "<=", -1)):
+        for window, threshold in CHANGE_THRESHOLDS[metric].items():
+            rules.append({
+                "name": f"{metric}_{window}_{direction}",
+                "scope": "market",
+                "when": [(f"{metric}_{window}", op, sign * threshold)],
+                "cooldown": CHANGE_WINDOW_COOLDOWNS[window] or None,
+                "group": f"{metric}_{direction}",
+                "message": message,
+                "params": dict(params, metric=metric, window=window),
+            })
+    return rules
+
+
+def zscore_rule(metric):
+    """قاعده فاصله غیرعادی قیمت از میانگین پنجره غلتان (utils/rolling_stats.py)"""
+    _, params = CHANGE_MESSAGES[metric]
+    return {
+        "name": f"{metric}_zscore",
+        "scope": "market",
+        "when": [(f"{metric}_z", "abs>=", ZSCORE_THRESHOLD)],
+        "cooldown": ZSCORE_COOLDOWN,
+        "message": "zscore",
+        "params": dict(params, metric=metric),
+    }
+
+
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+    "abs>=": lambda values, thresholds: np.abs(values) >= thresholds,
+}
+
+
+ALERT_RULES = [
+    # ─────────── حرکت پنجره‌ای قیمت‌ها (1، 5، 15، 60 دقیقه و جلسه) ───────────
+    *change_rules("dollar"),
+    *change_rules("shams"),
+    *change_rules("gold"),
+    # ─────────── فاصله از میانگین غلتان (z-score) ───────────
+    zscore_rule("dollar"),
+    zscore_rule("shams"),
+    zscore_rule("gold"),
+    # ─────────── اختلاف سرانه، حباب و پول حقیقی ───────────
+    {
+        "name": "ekhtelaf_fast",
+        "scope": "market",
+        "when": [("ekhtelaf - prev_ekhtelaf", "abs>=", EKHTELAF_THRESHOLD)],
+        "message": "ekhtelaf_fast",
+    },
+    {
+        "name": "bubble_cross",
+        "scope": "market",
+        "states": {"positive": [("bubble", ">", 0)], "negative": [("bubble", "<", 0)]},
+        "status_key": "bubble",
+        "message": "bubble_state",
+    },
+    *change_rules("bubble"),
+    {
+        "name": "pol_cross",
+        "scope": "market",
+        "states": {"positive": [("pol", ">", 0)], "negative": [("pol", "<", 0)]},
+        "status_key": "pol_hagigi",
+        "message": "pol_state",
+    },
+    *change_rules("pol"),
+    # ─────────── صندوق‌ها ───────────
+    {
+        "name": "active_funds",
+        "scope": "fund",
+        "when": [
+            ("value_to_avg_ratio", ">=", 150),
+            ("pol_to_value_ratio", ">=", 0.3),
+            ("ekhtelaf_sarane", ">", 0),
+            ("sarane_kharid - sarane_kol", ">=", 0),
+        ],
+        "cooldown": "day",
+        "alert_type": "هشدار سخت خرید",
+        "dedupe": FUND_ALERT_TYPES,
+        "message": "active_funds",
+    },
+    {
+        "name": "sarane_cross_positive",
+        "scope": "fund",
+        "when": [("sarane_kharid - sarane_forosh", ">", 0)],
+        "changed_only": True,
+        "cooldown": "day",
+        "alert_type": "کراس مثبت",
+        "message": "sarane_cross",
+        "params": {"positive": True},
+    },
+    {
+        "name": "sarane_cross_negative",
+        "scope": "fund",
+        "when": [("sarane_forosh - sarane_kharid", ">", 0)],
+        "changed_only": True,
+        "cooldown": "day",
+        "alert_type": "کراس منفی",
+        "message": "sarane_cross",
+        "params": {"positive": False},
+    },
+    # ─────────── آستانه‌های قیمتی ───────────
+    {
+        "name": "dollar_threshold",
+        "scope": "market",
+        "states": {"above": [("dollar", ">", DOLLAR_HIGH)], "below": [("dollar", "<", DOLLAR_LOW)]},
+        "status_key": "dollar",
+        "message": "price_threshold",
+        "params": {"asset": "دلار"},
+    },
+    {
+        "name": "shams_threshold",
+        "scope": "market",
+        "states": {"above": [("shams", ">", SHAMS_HIGH)], "below": [("shams", "<", SHAMS_LOW)]},
+        "status_key": "shams",
+        "message": "price_threshold",
+        "params": {"asset": "شمش طلا"},
+    },
+    {
+        "name": "gold_threshold",
+        "scope": "market",
+        "states": {"above": [("gold", ">", GOLD_HIGH)], "below": [("gold", "<", GOLD_LOW)]},
+        "status_key": "gold",
+        "message": "price_threshold",
+        "params": {"asset": "اونس طلا"},
+    },
+]
+
+# ✅ قواعد کامپایل‌شده پیش‌فرض (یک بار در هر پروسه)
+_COMPILED = None
+
+
+# ════════════════════════════════════════════════════════════════
+# کامپایل
+# ════════════════════════════════════════════════════════════════
+
+
+def _compile_scope(rules, scope):
+    """
+    جدول شرط‌های یک scope
+
+    هر قاعده یک یا چند شاخه دارد (when = یک شاخه، states = یک شاخه برای هر وضعیت)
+    و هر شاخه یک بازه پیوسته از ردیف‌های جدول شرط‌هاست.
+    """
+    expressions = {}
+    cond_expr, cond_op, cond_threshold = [], [], []
+    branch_starts, branches = [], []
+
+    for r, rule in enumerate(rules):
+        if rule.get("scope", "market") != scope:
+            continue
+
+        if "states" in rule:
+            if "status_key" not in rule or scope != "market":
+                raise ValueError(f"قاعده {rule['name']}: states فقط برای بازار و با status_key")
+            rule_branches = list(rule["states"].items())
+        else:
+            rule_branches = [(None, rule["when"])]
+
+        for state, conditions in rule_branches:
+            if not conditions:
+                raise ValueError(f"قاعده {rule['name']}: شاخه بدون شرط")
+            branch_starts.append(len(cond_expr))
+            branches.append((r, state))
+            for expr, op, threshold in conditions:
+                if op not in OPERATORS:
+                    raise ValueError(f"قاعده {rule['name']}: مقایسه‌گر ناشناخته {op}")
+                if expr not in expressions:
+                    code = compile(expr, f"<rule {rule['name']}>", "eval")
+                    names = set(code.co_names) - set(FUNCTIONS)
+                    unknown = names - set(MARKET_METRICS)
+                    # نام اشتباه در قاعده صندوق نباید تا زمان ارزیابی (و از کار افتادن
+                    # همه هشدارهای تیک) پنهان بماند
+                    invalid = unknown - set(FUND_METRICS) if scope == "fund" else unknown
+                    if invalid:
+                        raise ValueError(
+                            f"قاعده {rule['name']}: نام ناشناخته {', '.join(sorted(invalid))}"
+                        )
+                    expressions[expr] = (len(expressions), code, unknown)
+                cond_expr.append(expressions[expr][0])
+                cond_op.append(op)
+                cond_threshold.append(float(threshold))
+
+    cond_op = np.array(cond_op, dtype=object)
+    return {
+        "codes": [code for _, code, _ in expressions.values()],
+        "columns": sorted(set().union(*(unknown for _, _, unknown in expressions.values()))),
+        "cond_expr": np.array(cond_expr, dtype=np.intp),
+        "cond_threshold": np.array(cond_threshold, dtype=np.float64),
+        "op_rows": {op: np.flatnonzero(cond_op == op) for op in OPERATORS if (cond_op == op).any()},
+        "branch_starts": np.array(branch_starts, dtype=np.intp),
+        "branches": branches,
+    }
+
+
+def compile_rules(rules=None):
+    """
+    کامپایل قواعد (عبارت‌ها → bytecode، شرط‌ها → آرایه‌های NumPy)
+
+    Raises:
+        ValueError: نام تکراری، مقایسه‌گر ناشناخته یا نام ناشناخته در عبارت
+            (بازار: MARKET_METRICS، صندوق: MARKET_METRICS + FUND_METRICS)
+    """
+    rules = list(ALERT_RULES if rules is None else rules)
+    names = [rule["name"] for rule in rules]
+    if len(names) != len(set(names)):
+        raise ValueError("نام قواعد هشدار باید یکتا باشد")
+
+    return {
+        "rules": rules,
+        "market": _compile_scope(rules, "market"),
+        "fund": _compile_scope(rules, "fund"),
+    }
+
+
+def compiled_rules():
+    """قواعد پیش‌فرض کامپایل‌شده"""
+    global _COMPILED
+    if _COMPILED is None:
+        _COMPILED = compile_rules()
+    return _COMPILED
+
+
+# ════════════════════════════════════════════════════════════════
+# ارزیابی
+# ════════════════════════════════════════════════════════════════
+
+
+def _evaluate_scope(table, namespace, width=None):
+    """
+    ارزیابی برداری همه شاخه‌های یک scope
+
+    Returns:
+        tuple: (شاخه‌های برقرار bool، مقادیر عبارت‌ها) — برای بازار (شاخه‌ها,) و
+        برای صندوق‌ها (شاخه‌ها, صندوق‌ها)
+    """
+    n_branches = len(table["branches"])
+    shape = (n_branches,) if width is None else (n_branches, width)
+    if not n_branches:
+        return np.zeros(shape, dtype=bool), np.zeros((0,) + shape[1:])
+
+    scope = dict(FUNCTIONS, __builtins__={})
+    with np.errstate(all="ignore"):
+        values = [eval(code, scope, namespace) for code in table["codes"]]
+        if width is None:
+            values = np.array(values, dtype=np.float64)
+        else:
+            values = np.stack(
+                [np.broadcast_to(np.asarray(v, dtype=np.float64), (width,)) for v in values]
+            )
+
+        cond_values = values[table["cond_expr"]]
+        thresholds = table["cond_threshold"]
+        if width is not None:
+            thresholds = thresholds[:, None]
+
+        results = np.empty(cond_values.shape, dtype=bool)
+        for op, rows in table["op_rows"].items():
+            results[rows] = OPERATORS[op](cond_values[rows], thresholds[rows])
+
+    return np.logical_and.reduceat(results, table["branch_starts"], axis=0), values
+
+
+def evaluate_rules(compiled, market, data=None):
+    """
+    یک پاس برداری روی اسنپ‌شات
+
+    Args:
+        compiled: خروجی compile_rules
+        market: {نام: مقدار} برای همه MARKET_METRICS (None = nan)
+        data: MarketSnapshot (برای قواعد صندوق)
+
+    Returns:
+        tuple: (شاخه‌های بازار bool، مقادیر عبارت‌های بازار، شاخه‌های صندوق × صندوق‌ها bool)
+    """
+    namespace = {
+        name: np.float64(np.nan if market.get(name) is None else market[name])
+        for name in MARKET_METRICS
+    }
+    market_hits, market_values = _evaluate_scope(compiled["market"], namespace)
+
+    width = 0 if data is None else len(data.fund_symbols)
+    fund_table = compiled["fund"]
+    if width and fund_table["branches"]:
+        fund_namespace = dict(namespace)
+        for col in fund_table["columns"]:
+            fund_namespace[col] = data.fund_column(col)
+        fund_hits, _ = _evaluate_scope(fund_table, fund_namespace, width)
+    else:
+        fund_hits = np.zeros((len(fund_table["branches"]), width), dtype=bool)
+
+    return market_hits, market_values, fund_hits
+
+
+def _first_threshold(rule, state):
+    return (rule["states"][state] if state else rule["when"])[0][2]
+
+
+def _cooldown_key(rule, symbol=None):
+    return f"rule_cooldown:{rule['name']}" + (f":{symbol}" if symbol is not None else "")
+
+
+def fired_alerts(compiled, market, data, status, now):
+    """
+    هشدارهای قابل ارسال این تیک (به ترتیب قواعد)
+
+    قواعد states وضعیت خود را در status به‌روز می‌کنند؛ cooldownها و هشدارهای
+    روزانه صندوق همین‌جا ثبت می‌شوند.
+
+    Args:
+        status: دیکشنری alert_status (در جا تغییر می‌کند)
+        now: زمان فعلی (برای روز هشدارهای صندوق)
+
+    Returns:
+        tuple: (لیست {"rule", "state", "value", "threshold", "symbols"}، آیا status تغییر کرد)
+        value مقدار عبارت اولین شرط شاخه برقرار است (مثلاً درصد تغییر یا قیمت)
+    """
+    rules = compiled["rules"]
+    market_hits, market_values, fund_hits = evaluate_rules(compiled, market, data)
+    fired = {}
+    status_changed = False
+
+    # ─────────── بازار ───────────
+    table = compiled["market"]
+    groups = set()
+    active = {}
+    for b, ((r, state), hit) in enumerate(zip(table["branches"], market_hits)):
+        if hit and r not in active:
+            active[r] = (state, b)
+
+    for r, rule in enumerate(rules):
+        if rule.get("scope", "market") != "market":
+            continue
+
+        state, b = active.get(r, (None, None))
+        if "states" in rule:
+            new_state = state or "normal"
+            key = rule["status_key"]
+            if status.get(key) == new_state:
+                continue
+            logger.info(f"🔁 {rule['name']}: {status.get(key)} → {new_state}")
+            status[key] = new_state
+            status_changed = True
+            if new_state == "normal":
+                continue
+        elif r not in active:
+            continue
+
+        cooldown = rule.get("cooldown")
+        if isinstance(cooldown, (int, float)):
+            if state_has(_cooldown_key(rule)):
+                continue
+            state_set_many({_cooldown_key(rule): 1}, ttl=cooldown)
+
+        group = rule.get("group")
+        if group is not None:
+            if group in groups:
+                continue
+            groups.add(group)
+
+        value = market_values[table["cond_expr"][table["branch_starts"][b]]]
+        fired[r] = {
+            "rule": rule,
+            "state": state,
+            "value": float(value),
+            "threshold": _first_threshold(rule, state),
+            "symbols": None,
+        }
+
+    # ─────────── صندوق‌ها ───────────
+    table = compiled["fund"]
+    if fund_hits.size:
+        symbols = data.fund_symbols
+        changes = data.fund_changes
+        touched = None
+        if changes and not changes["full"]:
+            touched = np.isin(symbols, changes["added"] + changes["changed"])
+        today = now.strftime("%Y-%m-%d")
+
+        for (r, state), hits in zip(table["branches"], fund_hits):
+            rule = rules[r]
+            if rule.get("changed_only") and touched is not None:
+                hits = hits & touched
+            if not hits.any():
+                continue
+
+            candidates = symbols[hits].tolist()
+            cooldown = rule.get("cooldown")
+            if cooldown == "day":
+                for alert_type in rule.get("dedupe", (rule["alert_type"],)):
+                    alerted = alerted_symbols(today, alert_type)
+                    candidates = [s for s in candidates if s not in alerted]
+                if candidates:
+                    mark_fund_alerts(today, rule["alert_type"], candidates)
+            elif isinstance(cooldown, (int, float)):
+                candidates = [s for s in candidates if not state_has(_cooldown_key(rule, s))]
+                state_set_many({_cooldown_key(rule, s): 1 for s in candidates}, ttl=cooldown)
+
+            if candidates:
+                fired[r] = {
+                    "rule": rule,
+                    "state": state,
+                    "value": None,
+                    "threshold": _first_threshold(rule, state),
+                    "symbols": candidates,
+                }
+
+    return [fired[r] for r in sorted(fired)], status_changed
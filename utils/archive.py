@@ -0,0 +1,156 @@
+# utils/archive.py
+"""
+آرشیو ماهانه Parquet ردیف‌های منقضی‌شده Sheet
+
+هر ماه یک فایل market_YYYY-MM.parquet (فشرده با zstd، مرتب بر اساس زمان، با
+ستون‌های نوع‌دار) دارد. manifest.json برای هر ماه نام فایل، تعداد ردیف و بازه
+زمانی را نگه می‌دارد تا خواندن بدون لیست کردن پوشه فایل درست را پیدا کند.
+"""
+
+import os
+import json
+import logging
+import pandas as pd
+import pytz
+
+from config import ARCHIVE_DIR, ARCHIVE_MANIFEST_FILE, TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# ✅ نوع ستون‌ها در فایل‌های آرشیو (قیمت‌ها float64، درصدها و سرانه‌ها float32)
+ARCHIVE_SCHEMA = {
+    "gold_price_usd": "float64",
+    "dollar_price": "float64",
+    "shams_price": "float64",
+    "dollar_change_percent": "float32",
+    "shams_change_percent": "float32",
+    "fund_weighted_change_percent": "float32",
+    "fund_final_price_avg": "float32",
+    "fund_weighted_bubble_percent": "float32",
+    "sarane_kharid_weighted": "float32",
+    "sarane_forosh_weighted": "float32",
+    "ekhtelaf_sarane_weighted": "float32",
+    "pol_hagigi": "float32",
+}
+
+COMPRESSION = "zstd"
+
+
+def load_manifest():
+    """manifest آرشیو: {ماه YYYY-MM: {file، rows، first، last}}"""
+    if not os.path.exists(ARCHIVE_MANIFEST_FILE):
+        return {}
+    with open(ARCHIVE_MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp_path = ARCHIVE_MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(manifest.items())), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, ARCHIVE_MANIFEST_FILE)
+
+
+def archive_frame(df):
+    """
+    افزودن ردیف‌ها به فایل‌های ماهانه (ردیف تکراری با همان timestamp یک بار می‌ماند)
+
+    Args:
+        df: دیتافریم نوع‌دار ردیف‌های Sheet (خروجی sheets_storage.parse_sheet_rows)
+
+    Returns:
+        int: تعداد ردیف‌های آرشیوشده
+    """
+    df = df.dropna(subset=["timestamp"])
+    if df.empty:
+        return 0
+
+    df = df.astype(ARCHIVE_SCHEMA)
+    df["timestamp"] = df["timestamp"].dt.tz_localize(
+        pytz.timezone(TIMEZONE), ambiguous="NaT", nonexistent="NaT"
+    )
+    df = df.dropna(subset=["timestamp"])
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    manifest = load_manifest()
+
+    for month, part in df.groupby(df["timestamp"].dt.strftime("%Y-%m")):
+        file_name = f"market_{month}.parquet"
+        path = os.path.join(ARCHIVE_DIR, file_name)
+        if month in manifest and os.path.exists(path):
+            part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+
+        part = (
+            part.drop_duplicates(subset="timestamp", keep="last")
+            .sort_values("timestamp", kind="stable")
+            .reset_index(drop=True)
+        )
+
+        tmp_path = path + ".tmp"
+        part.to_parquet(tmp_path, engine="pyarrow", compression=COMPRESSION, index=False)
+        os.replace(tmp_path, path)
+
+        manifest[month] = {
+            "file": file_name,
+            "rows": int(len(part)),
+            "first": part["timestamp"].iloc[0].isoformat(),
+            "last": part["timestamp"].iloc[-1].isoformat(),
+        }
+        logger.info(f"📦 آرشیو {month}: {len(part)} ردیف")
+
+    _save_manifest(manifest)
+    return int(len(df))
+
+
+def read_archive(start=None, end=None, columns=None):
+    """
+    خواندن ردیف‌های آرشیوشده در یک بازه زمانی
+
+    فقط فایل ماه‌های هم‌پوشان (از روی manifest) و فقط ستون‌های خواسته‌شده خوانده می‌شوند.
+
+    Args:
+        start / end: ابتدا و انتهای بازه (رشته یا datetime؛ هر دو شامل)
+        columns: ستون‌های مورد نیاز (پیش‌فرض همه)
+
+    Returns:
+        DataFrame: ستون timestamp به همراه ستون‌های خواسته‌شده، مرتب بر اساس زمان
+    """
+    tz = pytz.timezone(TIMEZONE)
+    columns = ["timestamp"] + [c for c in (columns or ARCHIVE_SCHEMA) if c != "timestamp"]
+
+    def _as_time(value):
+        if value is None:
+            return None
+        value = pd.Timestamp(value)
+        return value.tz_localize(tz) if value.tzinfo is None else value.tz_convert(tz)
+
+    start, end = _as_time(start), _as_time(end)
+
+    filters = []
+    if start is not None:
+        filters.append(("timestamp", ">=", start))
+    if end is not None:
+        filters.append(("timestamp", "<=", end))
+
+    frames = []
+    for month, entry in sorted(load_manifest().items()):
+        if start is not None and pd.Timestamp(entry["last"]) < start:
+            continue
+        if end is not None and pd.Timestamp(entry["first"]) > end:
+            continue
+        frames.append(
+            pd.read_parquet(
+                os.path.join(ARCHIVE_DIR, entry["file"]),
+                columns=columns,
+                filters=filters or None,
+            )
+        )
+
+    if not frames:
+        empty = {col: pd.Series(dtype=ARCHIVE_SCHEMA.get(col)) for col in columns[1:]}
+        return pd.DataFrame(
+            {"timestamp": pd.Series(dtype=pd.DatetimeTZDtype(tz=TIMEZONE)), **empty}
+        )
+
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,204 @@
+# utils/change_detectors.py
+"""
+آشکارسازهای تغییر چندافقی با پنجره‌های لغزان زمانی
+
+برای هر متریک (دلار، شمش، اونس، حباب وزنی، پول حقیقی) و هر پنجره CHANGE_WINDOWS
+(1، 5، 15، 60 دقیقه و از ابتدای جلسه) کمینه و بیشینه پنجره با دو صف یکنوا
+(monotonic deque) نگه داشته می‌شود؛ هر نقطه یک بار وارد و یک بار خارج می‌شود پس
+هزینه هر تیک برای هر متریک و پنجره O(1) سرشکن است.
+
+«حرکت» یک پنجره فاصله مقدار فعلی از کف یا سقف پنجره است (هر کدام بزرگ‌تر)، پس
+رشد آرام چند دقیقه‌ای هم دیده می‌شود. پنجره همیشه نقطه مرجعی درست قبل از شروع
+خود را نگه می‌دارد؛ اگر تیکی از دست برود حرکت نسبت به نقطه قبلی سنجیده می‌شود
+(مگر آن نقطه بیش از CHANGE_MAX_GAP ثانیه از پنجره قدیمی‌تر باشد).
+
+وضعیت به صورت فقط-افزودنی ذخیره می‌شود: هر تیک یک خط JSONL (زمان + مقادیر) به
+فایل روز اضافه می‌شود (O(1) در هر تیک) و اجرای بعدی پنجره‌ها را با بازپخش همین
+خطوط می‌سازد. خط اول فایل تاریخ روز است و با شروع روز جدید فایل از نو نوشته می‌شود.
+"""
+
+import os
+import json
+import math
+import logging
+from collections import deque
+
+from config import (
+    CHANGE_DETECTORS_FILE,
+    CHANGE_WINDOWS,
+    CHANGE_THRESHOLDS,
+    CHANGE_MAX_GAP,
+)
+
+logger = logging.getLogger(__name__)
+
+# متریک‌هایی که حرکتشان به درصد سنجیده می‌شود (بقیه: اختلاف مطلق)
+PERCENT_METRICS = ("dollar", "shams", "gold")
+
+# نام‌هایی که در فضای نام قواعد هشدار قرار می‌گیرند: {متریک}_{پنجره}
+CHANGE_METRICS = tuple(
+    f"{metric}_{window}" for metric in CHANGE_THRESHOLDS for window in CHANGE_WINDOWS
+)
+
+# ✅ وضعیت در حافظه: {"date": ..., "metrics": {name: {window: state}}}
+DETECTOR_STATE = None
+
+
+def _new_window():
+    return {"points": deque(), "min": deque(), "max": deque()}
+
+
+def _replay(date):
+    """ساخت دوباره پنجره‌ها از تیک‌های ثبت‌شده امروز (یک بار در هر پروسه)"""
+    state = {"date": date, "metrics": {}}
+    try:
+        with open(CHANGE_DETECTORS_FILE, encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("date") != date:
+                return None
+            for line in f:
+                try:
+                    tick = json.loads(line)
+                except ValueError:
+                    # خط نیمه‌کاره (کرش وسط نوشتن)
+                    continue
+                _apply(state, tick["t"], tick["v"])
+    except Exception as e:
+        logger.warning(f"⚠️ خطا در خواندن وضعیت آشکارسازهای تغییر: {e}")
+        return None
+    return state
+
+
+def _load_state(date):
+    global DETECTOR_STATE
+
+    if DETECTOR_STATE is None and os.path.exists(CHANGE_DETECTORS_FILE):
+        DETECTOR_STATE = _replay(date)
+
+    if DETECTOR_STATE is None or DETECTOR_STATE.get("date") != date:
+        DETECTOR_STATE = {"date": date, "metrics": {}}
+        _write_line({"date": date}, mode="w")
+
+    return DETECTOR_STATE
+
+
+def _write_line(record, mode="a"):
+    try:
+        os.makedirs(os.path.dirname(CHANGE_DETECTORS_FILE) or ".", exist_ok=True)
+        with open(CHANGE_DETECTORS_FILE, mode, encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+    except Exception as e:
+        logger.warning(f"⚠️ خطا در ذخیره آشکارسازهای تغییر: {e}")
+
+
+def _update_window(state, t, value, span):
+    """
+    افزودن نقطه (t, value) به یک پنجره با هزینه O(1) سرشکن
+
+    Args:
+        span: طول پنجره به ثانیه (None = کل جلسه)
+    """
+    lows, highs = state["min"], state["max"]
+
+    if span is None:
+        # ✅ پنجره جلسه هیچ‌وقت نقطه‌ای را بیرون نمی‌کند: فقط کف و سقف کل روز لازم است
+        if not lows or value < lows[0][1]:
+            lows.clear()
+            lows.append((t, value))
+        if not highs or value > highs[0][1]:
+            highs.clear()
+            highs.append((t, value))
+        return
+
+    points = state["points"]
+    points.append((t, value))
+    while lows and lows[-1][1] >= value:
+        lows.pop()
+    lows.append((t, value))
+    while highs and highs[-1][1] <= value:
+        highs.pop()
+    highs.append((t, value))
+
+    # نقطه مرجع: آخرین نقطه در شروع پنجره یا قبل از آن (اگر خیلی قدیمی نباشد)
+    start = t - span
+    while len(points) > 1 and points[1][0] <= start:
+        points.popleft()
+    if len(points) > 1 and points[0][0] < start - CHANGE_MAX_GAP:
+        points.popleft()
+
+    first = points[0][0]
+    while lows[0][0] < first:
+        lows.popleft()
+    while highs[0][0] < first:
+        highs.popleft()
+
+
+def _move(state, value, percent):
+    """
+    حرکت پنجره: فاصله مقدار فعلی از کف یا سقف پنجره (هر کدام بزرگ‌تر)
+
+    Returns:
+        tuple: (حرکت علامت‌دار، مقدار مرجع یعنی کف یا سقف، زمان مرجع)
+    """
+    low_t, low = state["min"][0]
+    high_t, high = state["max"][0]
+    rise, drop = value - low, value - high
+    if percent:
+        rise = rise / low * 100 if low > 0 else 0.0
+        drop = drop / high * 100 if high > 0 else 0.0
+    if rise >= -drop:
+        return rise, low, low_t
+    return drop, high, high_t
+
+
+def _clean_values(values):
+    """مقادیر معتبر این تیک (None، NaN و قیمت غیرمثبت کنار گذاشته می‌شوند)"""
+    clean = {}
+    for name in CHANGE_THRESHOLDS:
+        value = values.get(name)
+        if value is None or not math.isfinite(float(value)):
+            continue
+        if name in PERCENT_METRICS and value <= 0:
+            continue
+        clean[name] = float(value)
+    return clean
+
+
+def _apply(state, t, values):
+    """افزودن مقادیر یک تیک به همه پنجره‌ها"""
+    metrics = state["metrics"]
+    for name, value in values.items():
+        windows = metrics.setdefault(name, {})
+        for window, minutes in CHANGE_WINDOWS.items():
+            window_state = windows.setdefault(window, _new_window())
+            _update_window(window_state, t, value, None if minutes is None else minutes * 60)
+
+
+def update_change_detectors(now, values):
+    """
+    به‌روزرسانی همه پنجره‌ها با مقادیر این تیک
+
+    Args:
+        now: زمان تیک (تهران)
+        values: {متریک: مقدار} برای کلیدهای CHANGE_THRESHOLDS (None یا نامعتبر = بدون نقطه)
+
+    Returns:
+        dict: {"{متریک}_{پنجره}": حرکت} برای قواعد هشدار و
+              {"{متریک}_{پنجره}_ref": (مقدار مرجع، زمان مرجع)} برای متن پیام
+    """
+    state = _load_state(now.strftime("%Y-%m-%d"))
+    t = now.timestamp()
+    values = _clean_values(values)
+
+    _apply(state, t, values)
+    _write_line({"t": t, "v": values})
+
+    result = {}
+    for name, value in values.items():
+        percent = name in PERCENT_METRICS
+        for window, window_state in state["metrics"][name].items():
+            move, ref, ref_t = _move(window_state, value, percent)
+            result[f"{name}_{window}"] = move
+            result[f"{name}_{window}_ref"] = (ref, ref_t)
+
+    return result
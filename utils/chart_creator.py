@@ -9,7 +9,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import io
 from PIL import Image, ImageDraw, ImageFont
-from utils.sheets_storage import read_from_sheets
+from utils.market_history import market_history_frame
 from persiantools.jdatetime import JalaliDateTime
 from config import (
     FONT_MEDIUM_PATH, FONT_REGULAR_PATH,
@@ -43,35 +43,15 @@ def calculate_y_range_with_steps(data_min, data_max, step=50):
 def create_market_charts():
     """ساخت نمودارهای بازار با 7 subplot (اضافه شدن پول حقیقی)"""
     try:
-        data_rows = read_from_sheets(limit=800)
-        if not data_rows:
-            logger.warning("⚠️ داده‌ای از Sheets دریافت نشد")
-            return None
-
-        # تعریف DataFrame با 13 ستون
-        df = pd.DataFrame(data_rows, columns=[
-            'timestamp', 'gold_price_usd', 'dollar_price', 'shams_price',
-            'dollar_change_percent', 'shams_change_percent',
-            'fund_weighted_change_percent', 'fund_final_price_avg',
-            'fund_weighted_bubble_percent', 'sarane_kharid_weighted',
-            'sarane_forosh_weighted', 'ekhtelaf_sarane_weighted',
-            'pol_hagigi' 
-        ])
-
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        numeric_cols = df.columns[1:]
-        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
-
-        # فیلتر کردن داده‌های امروز
+        # ✅ برش امروز از فایل ستونی memmap (بدون کپی و پارس؛ از قبل مرتب بر اساس زمان)
         tehran_tz = pytz.timezone(TIMEZONE)
-        today = datetime.now(tehran_tz).date()
-        df = df[df['timestamp'].dt.date == today].copy()
+        today = datetime.now(tehran_tz).strftime("%Y-%m-%d")
+        df = market_history_frame(f"{today} 00:00:00", f"{today} 23:59:59")
 
         if df.empty:
             logger.info("ℹ️ داده‌ای برای امروز پیدا نشد")
             return None
 
-        df = df.sort_values('timestamp')
         jalali_now = JalaliDateTime.now(tehran_tz)
         date_time_str = jalali_now.strftime("%Y/%m/%d - %H:%M")
 
@@ -386,8 +366,6 @@ def create_market_charts():
         # ═══════════════════════════════════════════════════════
         # تنظیمات محورها
         # ═══════════════════════════════════════════════════════
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-
         TICK_MINUTES = 30
         start_ts = df['timestamp'].iloc[0]
         end_ts = df['timestamp'].iloc[-1]
@@ -0,0 +1,184 @@
+# utils/daily_rollup.py
+"""
+خلاصه روزانه (OHLC) متریک‌های بازار
+
+برای هر روز کامل‌شده و هر ستون STANDARD_HEADER یک ردیف با open/high/low/close،
+میانگین و تعداد تیک‌ها ساخته می‌شود. جدول daily_rollup در پایگاه داده محلی و
+تب Rollup در Google Sheets برای نمودارهای هفتگی/ماهانه و آمار بلندمدت است
+(حدود 250 ردیف در سال به جای صدها هزار ردیف دقیقه‌ای).
+"""
+
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytz
+
+from config import STANDARD_HEADER, ROLLUP_SHEET_NAME, TIMEZONE
+from utils.local_store import connection, seed_from_sheets
+from utils.sheets_storage import append_rows_to_tab
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_METRICS = STANDARD_HEADER[1:]
+ROLLUP_FIELDS = ["open", "high", "low", "close", "avg", "count"]
+ROLLUP_HEADER = ["date", "metric"] + ROLLUP_FIELDS
+
+
+def _ensure_table(conn):
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS daily_rollup (
+            date TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            avg REAL,
+            count INTEGER NOT NULL,
+            mirrored INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, metric)
+        )"""
+    )
+
+    # روزهای پردازش‌شده (حتی روزی که همه متریک‌هایش خالی بوده و ردیف خلاصه ندارد)
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_days'"
+    ).fetchone()
+    if not exists:
+        conn.execute("CREATE TABLE rollup_days (date TEXT PRIMARY KEY)")
+        conn.execute("INSERT OR IGNORE INTO rollup_days SELECT DISTINCT date FROM daily_rollup")
+
+
+def _rollup_day(conn, day):
+    """ردیف‌های خلاصه یک روز (یک ردیف برای هر متریک)"""
+    columns = ", ".join(ROLLUP_METRICS)
+    rows = conn.execute(
+        f"SELECT {columns} FROM market_data "
+        f"WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp, id",
+        (day, day + "~"),
+    ).fetchall()
+    if not rows:
+        return []
+
+    values = np.array(rows, dtype=np.float64)  # None → nan
+    result = []
+    for i, metric in enumerate(ROLLUP_METRICS):
+        column = values[:, i]
+        valid = column[~np.isnan(column)]
+        if not len(valid):
+            continue
+        result.append((
+            day,
+            metric,
+            float(valid[0]),
+            float(valid.max()),
+            float(valid.min()),
+            float(valid[-1]),
+            round(float(valid.mean()), 4),
+            int(len(valid)),
+        ))
+    return result
+
+
+def build_daily_rollups(today=None):
+    """
+    ساخت خلاصه همه روزهای کامل‌شده‌ای که هنوز خلاصه ندارند و ارسال به تب Rollup
+
+    بار اول همه روزهای گذشته را پر می‌کند و بعد از آن در هر روز فقط روز قبل
+    را اضافه می‌کند؛ اگر اجرایی از دست برود، اجرای بعد جبران می‌کند.
+
+    Args:
+        today: تاریخ امروز YYYY-MM-DD (روزهای قبل از آن کامل‌شده حساب می‌شوند)
+
+    Returns:
+        int: تعداد روزهای خلاصه‌شده در این اجرا
+    """
+    if today is None:
+        today = datetime.now(pytz.timezone(TIMEZONE)).strftime("%Y-%m-%d")
+
+    try:
+        seed_from_sheets()
+        with connection() as conn:
+            _ensure_table(conn)
+            days = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT date FROM day_index WHERE date < ? "
+                    "AND date NOT IN (SELECT date FROM rollup_days) ORDER BY date",
+                    (today,),
+                )
+            ]
+
+            for day in days:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO daily_rollup (date, metric, {', '.join(ROLLUP_FIELDS)}) "
+                    f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    _rollup_day(conn, day),
+                )
+            conn.executemany(
+                "INSERT OR IGNORE INTO rollup_days (date) VALUES (?)", [(day,) for day in days]
+            )
+            conn.commit()
+
+        if days:
+            logger.info(f"📅 خلاصه روزانه ساخته شد: {len(days)} روز ({days[0]} تا {days[-1]})")
+
+        _mirror_rollups()
+        return len(days)
+
+    except Exception as e:
+        logger.error(f"❌ خطا در ساخت خلاصه روزانه: {e}", exc_info=True)
+        return 0
+
+
+def _mirror_rollups():
+    """ارسال ردیف‌های خلاصه‌ای که هنوز در Sheet نیستند (در صورت خطا، اجرای بعد)"""
+    with connection() as conn:
+        pending = conn.execute(
+            f"SELECT {', '.join(ROLLUP_HEADER)} FROM daily_rollup "
+            f"WHERE mirrored = 0 ORDER BY date, metric"
+        ).fetchall()
+    if not pending:
+        return
+
+    if append_rows_to_tab(ROLLUP_SHEET_NAME, ROLLUP_HEADER, [list(row) for row in pending]):
+        with connection() as conn:
+            conn.executemany(
+                "UPDATE daily_rollup SET mirrored = 1 WHERE date = ? AND metric = ?",
+                [(row[0], row[1]) for row in pending],
+            )
+            conn.commit()
+
+
+def read_rollup(metrics=None, start=None, end=None):
+    """
+    خواندن خلاصه روزانه
+
+    Args:
+        metrics: لیست متریک‌ها (پیش‌فرض همه)
+        start / end: بازه تاریخ YYYY-MM-DD (هر دو شامل)
+
+    Returns:
+        DataFrame: ستون‌های date، metric، open، high، low، close، avg، count
+    """
+    query = f"SELECT {', '.join(ROLLUP_HEADER)} FROM daily_rollup WHERE 1 = 1"
+    params = []
+    if metrics:
+        query += f" AND metric IN ({', '.join('?' for _ in metrics)})"
+        params.extend(metrics)
+    if start:
+        query += " AND date >= ?"
+        params.append(start)
+    if end:
+        query += " AND date <= ?"
+        params.append(end)
+    query += " ORDER BY date, metric"
+
+    with connection() as conn:
+        _ensure_table(conn)
+        rows = conn.execute(query, params).fetchall()
+
+    df = pd.DataFrame(rows, columns=ROLLUP_HEADER)
+    df["date"] = pd.to_datetime(df["date"])
+    return df
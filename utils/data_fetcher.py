@@ -8,6 +8,7 @@ from telethon import TelegramClient
 import requests
 from bs4 import BeautifulSoup
 from config import TELEGRAM_CHANNELS
+from utils.state_store import state_get, state_set
 
 logger = logging.getLogger(__name__)
 
@@ -61,13 +62,25 @@ def extract_gold_price(text):
 # توابع واکشی داده اصلی
 # ==============================================================================
 
+def _fetch_cursor(channel):
+    """آخرین پیام خوانده‌شده هر کانال و قیمت‌های استخراج‌شده از آن (ذخیره‌ساز محلی)"""
+    return state_get(f"fetch_cursor:{channel}")
+
+
+def _save_fetch_cursor(channel, message_id, values):
+    state_set(f"fetch_cursor:{channel}", {"message_id": message_id, "values": values})
+
+
 async def fetch_gold_price_today(client: TelegramClient):
     """دریافت قیمت لحظه‌ای اونس طلای امروز"""
     try:
         channel_username = GOLD_CHANNEL 
         tehran_tz = pytz.timezone("Asia/Tehran")
 
-        messages = await client.get_messages(channel_username, limit=5)
+        # ✅ فقط پیام‌های بعد از آخرین پیام خوانده‌شده
+        cursor = _fetch_cursor(channel_username)
+        min_id = cursor["message_id"] if cursor else 0
+        messages = await client.get_messages(channel_username, limit=5, min_id=min_id)
 
         for message in messages:
             if message.text and "XAUUSD" in message.text:
@@ -75,8 +88,16 @@ async def fetch_gold_price_today(client: TelegramClient):
 
                 if price:
                     msg_time_tehran = message.date.astimezone(tehran_tz)
+                    _save_fetch_cursor(channel_username, message.id, {
+                        "price": price, "time": msg_time_tehran.isoformat()
+                    })
                     return price, msg_time_tehran
 
+        if cursor:
+            logger.info("ℹ️ پیام جدیدی از طلا نیست → آخرین قیمت خوانده‌شده")
+            values = cursor["values"]
+            return values["price"], datetime.fromisoformat(values["time"])
+
         return None, None
     except Exception as e:
         logger.error(f"خطا در دریافت قیمت طلای امروز: {e}")
@@ -89,7 +110,10 @@ async def fetch_dollar_prices(client: TelegramClient):
         channel_username = DOLLAR_CHANNEL
         tehran_tz = pytz.timezone("Asia/Tehran")
 
-        messages = await client.get_messages(channel_username, limit=50)
+        # ✅ فقط پیام‌های بعد از آخرین پیام خوانده‌شده
+        cursor = _fetch_cursor(channel_username)
+        min_id = cursor["message_id"] if cursor else 0
+        messages = await client.get_messages(channel_username, limit=50, min_id=min_id)
 
         final_prices = {
             "last_trade": None, 
@@ -121,6 +145,23 @@ async def fetch_dollar_prices(client: TelegramClient):
                 if all([final_prices["last_trade"], final_prices["bid"], final_prices["ask"]]):
                     break
 
+        # قیمت‌هایی که در پیام‌های جدید نبودند از آخرین پیام خوانده‌شده
+        if cursor:
+            previous = cursor["values"]
+            for key in ("last_trade", "bid", "ask"):
+                if not final_prices[key] and previous.get(key):
+                    final_prices[key] = previous[key]
+                    previous_time = previous.get(f"{key}_time")
+                    final_prices[f"{key}_time"] = (
+                        datetime.fromisoformat(previous_time) if previous_time else None
+                    )
+
+        if messages and any([final_prices["last_trade"], final_prices["bid"], final_prices["ask"]]):
+            _save_fetch_cursor(channel_username, max(m.id for m in messages), {
+                key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in final_prices.items()
+            })
+
         # ✅ لاگ برای دیباگ
         if final_prices["last_trade"]:
             logger.info(f"✅ قیمت‌های دلار: معامله={final_prices['last_trade']:,}, خرید={final_prices['bid']:,}, فروش={final_prices['ask']:,}")
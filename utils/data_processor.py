@@ -5,16 +5,107 @@ import pandas as pd
 import numpy as np
 import logging
 from config import ASSET_ORDER
+from utils.fund_delta import apply_fund_delta, fund_metrics
+from utils.snapshot import MarketSnapshot
 
 pd.set_option("future.no_silent_downcasting", True)
 logger = logging.getLogger(__name__)
 
 pd.options.display.float_format = "{:,.2f}".format
 
+# ════════════════════════════════════════════════════════════════
+# اسکیمای ستون‌ها (کم‌حجم‌ترین نوعی که دقت لازم را حفظ می‌کند)
+# ════════════════════════════════════════════════════════════════
+
+# مقادیر صندوق‌ها حداکثر ۷ رقم معنادار دارند → float32 کافی است
+FUND_SCHEMA = {
+    "close_price": "float32",
+    "NAV": "float32",
+    "nominal_bubble": "float32",
+    "avg_monthly_bubble": "float32",
+    "NAV_change_percent": "float32",
+    "close_price_change_percent": "float32",
+    "final_price_change": "float32",
+    "weekly_return": "float32",
+    "monthly_return": "float32",
+    "3_month_return": "float32",
+    "net_asset": "float32",
+    "sarane_kharid": "float32",
+    "sarane_forosh": "float32",
+    "ekhtelaf_sarane": "float32",
+    "pol_hagigi": "float32",
+    "pol_to_value_ratio": "float32",
+    "value": "float32",
+    "avg_monthly_value": "float32",
+    "value_to_avg_ratio": "float32",
+}
+
+# قیمت سکه و شمش (ریال) از محدوده int32 بیرون می‌زند
+ASSET_SCHEMA = {
+    "close_price": "int64",
+    "Value": "int64",
+    "Bubble": "float32",
+    "close_price_change_percent": "float32",
+    "pricing_dollar": "int32",
+    "pricing_Gold": "int32",
+    "trade_date": "datetime64[ns]",
+    "last_trade_time": "timedelta64[ns]",
+}
+
+
+# ✅ دسته نمادها بین تیک‌ها مشترک است؛ هر تیک فقط کدهای عددی نگه می‌دارد
+SYMBOL_DTYPE = None
+
+
+def symbol_index(symbols, name="symbol"):
+    """ساخت CategoricalIndex نمادها با دسته مشترک بین تیک‌ها"""
+    global SYMBOL_DTYPE
+
+    if SYMBOL_DTYPE is None or not pd.Index(symbols).isin(SYMBOL_DTYPE.categories).all():
+        known = [] if SYMBOL_DTYPE is None else list(SYMBOL_DTYPE.categories)
+        SYMBOL_DTYPE = pd.CategoricalDtype(sorted(set(known) | set(symbols)))
+
+    return pd.CategoricalIndex(symbols, dtype=SYMBOL_DTYPE, name=name)
+
+
+ASSET_DTYPE = pd.CategoricalDtype(ASSET_ORDER)
+
+
+def apply_schema(df, schema):
+    """تبدیل ستون‌های عددی دیتافریم به نوع‌های تعریف‌شده در اسکیما"""
+    df = df.copy()
+    for col, dtype in schema.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype.startswith(("datetime", "timedelta")):
+            df[col] = df[col].astype(dtype)
+        elif dtype.startswith("int"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(dtype)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    return df
+
+
+def parse_trade_times(series):
+    """تبدیل رشته «YYYY-MM-DD HH:MM:SS» به (تاریخ، زمان از ابتدای روز)"""
+    timestamps = pd.to_datetime(
+        series.str[:10] + " " + series.str[11:19],
+        format="%Y-%m-%d %H:%M:%S",
+        errors="coerce",
+    )
+    dates = timestamps.dt.normalize()
+    return dates, timestamps - dates
+
 
 def process_market_data(
     market_data, gold_price, last_trade, yesterday_close=None, gold_yesterday=None
 ):
+    """
+    پردازش داده‌های خام بازار
+
+    Returns:
+        MarketSnapshot: اسنپ‌شات تیک فعلی (یا None در صورت خطا)
+    """
     try:
         rahavard_data = market_data["rahavard_data"]["data"]
         traders_data = market_data["traders_data"]
@@ -123,13 +214,14 @@ def process_market_data(
             ]
         ]
 
-        Fund_df = process_traders_data(traders_data)
+        Fund_df, fund_changes, fund_aggregates = process_traders_data(traders_data)
 
         dfp = pd.concat([warehouse_df, assets_df])
         dfp = dfp[~dfp.index.duplicated(keep="first")]
 
-        dfp["trade_date"] = dfp["last_trade_time"].str[:10]
-        dfp["last_trade_time"] = dfp["last_trade_time"].str[11:19]
+        dfp["trade_date"], dfp["last_trade_time"] = parse_trade_times(
+            dfp["last_trade_time"]
+        )
 
         dfp["close_price_change_percent"] = (
             pd.to_numeric(dfp["close_price_change_percent"], errors="coerce") * 100
@@ -142,14 +234,16 @@ def process_market_data(
 
         dfp = calculate_values(dfp, gold_price, last_trade)
 
-        return {
-            "dfp": dfp,
-            "Fund_df": Fund_df,
-            "gold_price": gold_price,
-            "last_trade": last_trade,
-            "yesterday_close": yesterday_close,
-            "gold_yesterday": gold_yesterday,
-        }
+        return MarketSnapshot.from_frames(
+            Fund_df,
+            dfp,
+            fund_metrics=fund_metrics(fund_aggregates),
+            fund_changes=fund_changes,
+            gold_price=gold_price,
+            last_trade=last_trade,
+            yesterday_close=yesterday_close,
+            gold_yesterday=gold_yesterday,
+        )
 
     except Exception as e:
         logger.error(f"خطا در پردازش داده‌ها: {e}", exc_info=True)
@@ -172,12 +266,14 @@ def flatten_entities(df, list_col="related_entities"):
 def process_traders_data(data):
     """پردازش داده‌های traders با mapping مستقیم index‌ها - بولت‌پروف"""
 
+    # ✅ داده خالی = جدول بدون صندوق (نه خطا) تا بقیه تیک (تصویر دارایی‌ها،
+    # ردیف Sheet، هشدارهای بازار) انجام شود
     if not data or len(data) == 0:
         logger.warning("⚠️ داده traders_data خالی است")
-        return pd.DataFrame()
-
-    actual_columns = len(data[0])
-    logger.info(f"📊 تعداد ستون‌های دریافتی: {actual_columns}")
+        data = []
+    else:
+        actual_columns = len(data[0])
+        logger.info(f"📊 تعداد ستون‌های دریافتی: {actual_columns}")
 
     # ✅ Mapping مستقیم: index -> نام ستون مورد نیاز
     column_mapping = {
@@ -238,8 +334,25 @@ def process_traders_data(data):
                 logger.warning(f"⚠️ ستون {idx} ({col_name}) در دیتا وجود ندارد")
         extracted_data.append(extracted_row)
 
-    Fund_df = pd.DataFrame(extracted_data)
-    Fund_df = Fund_df.set_index("symbol")
+    raw_df = pd.DataFrame(extracted_data, columns=list(column_mapping.values()))
+    raw_df = raw_df.set_index("symbol")
+
+    # ✅ فقط صندوق‌هایی که از تیک قبل تغییر کرده‌اند دوباره محاسبه می‌شوند
+    Fund_df, fund_changes, fund_aggregates = apply_fund_delta(
+        raw_df, derive_fund_columns
+    )
+    Fund_df = Fund_df.set_axis(symbol_index(Fund_df.index), axis=0)
+
+    logger.info(
+        f"✅ Fund_df پردازش شد - {len(Fund_df)} صندوق با {len(Fund_df.columns)} ستون"
+    )
+
+    return Fund_df, fund_changes, fund_aggregates
+
+
+def derive_fund_columns(raw_df):
+    """محاسبه ستون‌های عددی و مشتق برای یک زیرمجموعه از صندوق‌ها"""
+    Fund_df = raw_df.copy()
 
     # ✅ پردازش عددی ستون‌ها
     Fund_df["value"] = pd.to_numeric(Fund_df["value"], errors="coerce") / 10_000_000_000
@@ -295,8 +408,6 @@ def process_traders_data(data):
     Fund_df["avg_monthly_bubble"], errors="coerce"
     ).round(2)
 
-    Fund_df.sort_values(by="value", ascending=False, inplace=True)
-
     # ✅ انتخاب ستون‌های نهایی (فقط آنهایی که وجود دارند)
     final_columns = [
         "close_price",
@@ -321,13 +432,7 @@ def process_traders_data(data):
     ]
 
     existing_columns = [col for col in final_columns if col in Fund_df.columns]
-    Fund_df = Fund_df[existing_columns]
-
-    logger.info(
-        f"✅ Fund_df پردازش شد - {len(Fund_df)} صندوق با {len(Fund_df.columns)} ستون"
-    )
-
-    return Fund_df
+    return apply_schema(Fund_df[existing_columns], FUND_SCHEMA)
 
 
 def calculate_values(dfp, Gold, last_trade):
@@ -397,4 +502,7 @@ def calculate_values(dfp, Gold, last_trade):
         ]
     ]
 
+    dfp = apply_schema(dfp, ASSET_SCHEMA)
+    dfp.index = pd.CategoricalIndex(dfp.index, dtype=ASSET_DTYPE, name="slug")
+
     return dfp
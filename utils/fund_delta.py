@@ -0,0 +1,201 @@
+# utils/fund_delta.py
+"""پردازش افزایشی صندوق‌ها بین تیک‌ها - فقط صندوق‌های تغییرکرده دوباره محاسبه می‌شوند"""
+
+import os
+import pickle
+import logging
+from datetime import datetime
+import pytz
+import pandas as pd
+
+from config import FUND_STATE_FILE, TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# ✅ وضعیت تیک قبلی (در حافظه برای اجرای دائمی، روی دیسک برای اجرای تک‌مرحله‌ای)
+FUND_STATE = None
+
+# اگر بیش از این نسبت از صندوق‌ها تغییر کنند، تجمیع‌ها از صفر محاسبه می‌شوند
+FULL_RECOMPUTE_RATIO = 0.5
+
+# جمع‌های لازم برای میانگین‌های وزنی: نام → (ستون، ستون وزن)
+AGGREGATE_TERMS = {
+    "value": ("value", None),
+    "close_change_x_value": ("close_price_change_percent", "value"),
+    "bubble_x_value": ("nominal_bubble", "value"),
+    "sarane_kharid_x_value": ("sarane_kharid", "value"),
+    "sarane_forosh_x_value": ("sarane_forosh", "value"),
+    "ekhtelaf_x_value": ("ekhtelaf_sarane", "value"),
+    "final_price_sum": ("final_price_change", None),
+    "pol_hagigi": ("pol_hagigi", None),
+}
+
+
+def _today():
+    return datetime.now(pytz.timezone(TIMEZONE)).strftime("%Y-%m-%d")
+
+
+def _load_state():
+    """بارگذاری وضعیت تیک قبلی از حافظه یا دیسک"""
+    global FUND_STATE
+
+    if FUND_STATE is None and os.path.exists(FUND_STATE_FILE):
+        try:
+            with open(FUND_STATE_FILE, "rb") as f:
+                FUND_STATE = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ خطا در خواندن وضعیت قبلی صندوق‌ها: {e}")
+            FUND_STATE = None
+
+    # وضعیت روز قبل به درد مقایسه نمی‌خوره
+    if FUND_STATE is not None and FUND_STATE.get("date") != _today():
+        FUND_STATE = None
+
+    return FUND_STATE
+
+
+def _save_state(state):
+    global FUND_STATE
+    FUND_STATE = state
+
+    try:
+        os.makedirs(os.path.dirname(FUND_STATE_FILE) or ".", exist_ok=True)
+        tmp_path = FUND_STATE_FILE + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, FUND_STATE_FILE)
+    except Exception as e:
+        logger.warning(f"⚠️ خطا در ذخیره وضعیت صندوق‌ها: {e}")
+
+
+def _contributions(df):
+    """سهم هر ردیف در جمع‌های تجمیعی"""
+    contrib = {}
+    for name, (col, weight) in AGGREGATE_TERMS.items():
+        if col not in df.columns:
+            contrib[name] = 0.0
+            continue
+        values = df[col].astype("float64")
+        if weight is not None:
+            values = values * df[weight].astype("float64")
+        contrib[name] = float(values.sum())
+
+    contrib["final_price_count"] = (
+        int(df["final_price_change"].notna().sum())
+        if "final_price_change" in df.columns
+        else 0
+    )
+    return contrib
+
+
+def _changed_symbols(raw, prev_raw):
+    """تشخیص صندوق‌های جدید، تغییرکرده و حذف‌شده نسبت به تیک قبل"""
+    common = raw.index.intersection(prev_raw.index)
+    added = [s for s in raw.index if s not in prev_raw.index]
+    removed = [s for s in prev_raw.index if s not in raw.index]
+
+    curr = raw.loc[common]
+    prev = prev_raw.loc[common, raw.columns]
+    diff = curr.ne(prev) & ~(curr.isna() & prev.isna())
+    changed = common[diff.any(axis=1).to_numpy()].tolist()
+
+    return added, changed, removed
+
+
+def apply_fund_delta(raw, derive):
+    """
+    اعمال تغییرات تیک جدید روی جدول صندوق‌های تیک قبل
+
+    Args:
+        raw: دیتافریم خام صندوق‌ها (index = symbol) قبل از محاسبه ستون‌های مشتق
+        derive: تابعی که ستون‌های مشتق را برای یک زیرمجموعه از صندوق‌ها می‌سازد
+
+    Returns:
+        tuple: (Fund_df، مجموعه تغییرات، جمع‌های تجمیعی)
+    """
+    state = _load_state()
+    today = _today()
+
+    full = (
+        state is None
+        or list(state["raw"].columns) != list(raw.columns)
+        or raw.index.has_duplicates
+    )
+
+    if full:
+        Fund_df = derive(raw)
+        aggregates = _contributions(Fund_df)
+        changes = {
+            "added": raw.index.tolist(),
+            "changed": [],
+            "removed": [],
+            "unchanged_count": 0,
+            "full": True,
+        }
+    else:
+        prev_raw = state["raw"]
+        prev_derived = state["derived"]
+        added, changed, removed = _changed_symbols(raw, prev_raw)
+        touched = added + changed
+
+        touched_set = set(touched)
+        unchanged = [s for s in raw.index if s not in touched_set]
+        parts = [prev_derived.loc[unchanged]]
+        if touched:
+            parts.append(derive(raw.loc[touched]))
+        Fund_df = pd.concat(parts) if len(parts) > 1 else parts[0].copy()
+
+        if len(touched) + len(removed) > len(raw) * FULL_RECOMPUTE_RATIO:
+            aggregates = _contributions(Fund_df)
+        else:
+            aggregates = dict(state["aggregates"])
+            gone = _contributions(prev_derived.loc[changed + removed])
+            new = _contributions(Fund_df.loc[touched])
+            for key in aggregates:
+                aggregates[key] += new[key] - gone[key]
+
+        changes = {
+            "added": added,
+            "changed": changed,
+            "removed": removed,
+            "unchanged_count": len(unchanged),
+            "full": False,
+        }
+
+    Fund_df = Fund_df.sort_values(by="value", ascending=False)
+
+    _save_state(
+        {"date": today, "raw": raw, "derived": Fund_df, "aggregates": aggregates}
+    )
+
+    logger.info(
+        f"🔁 تغییرات صندوق‌ها: {len(changes['added'])} جدید، "
+        f"{len(changes['changed'])} تغییرکرده، {len(changes['removed'])} حذف‌شده، "
+        f"{changes['unchanged_count']} بدون تغییر"
+    )
+
+    return Fund_df, changes, aggregates
+
+
+def fund_metrics(aggregates):
+    """تبدیل جمع‌های تجمیعی به میانگین‌های وزنی صندوق‌ها"""
+    total_value = aggregates["value"]
+    divisor = total_value or 1
+    count = aggregates["final_price_count"]
+
+    sarane_kharid_w = aggregates["sarane_kharid_x_value"] / divisor
+    sarane_forosh_w = aggregates["sarane_forosh_x_value"] / divisor
+
+    return {
+        "total_value": total_value,
+        "fund_change_weighted": aggregates["close_change_x_value"] / divisor,
+        "fund_bubble_weighted": aggregates["bubble_x_value"] / divisor,
+        "fund_final_price_avg": (
+            aggregates["final_price_sum"] / count if count else float("nan")
+        ),
+        "sarane_kharid_w": sarane_kharid_w,
+        "sarane_forosh_w": sarane_forosh_w,
+        "ekhtelaf_sarane_w": sarane_kharid_w - sarane_forosh_w,
+        "ekhtelaf_weighted": aggregates["ekhtelaf_x_value"] / divisor,
+        "pol_hagigi": aggregates["pol_hagigi"],
+    }
@@ -0,0 +1,188 @@
+# utils/fund_history.py
+"""
+ذخیره‌ساز ستونی سری زمانی درون‌روزی صندوق‌ها
+
+ساختار هر روز (DATA_DIR/fund_history/YYYY-MM-DD):
+    symbols.json      نمادها به ترتیب کد (فقط اضافه می‌شود)
+    ticks.bin         برای هر تیک سه int64: (زمان یونیکس، ردیف شروع، تعداد ردیف)
+    symbol.bin        کد نماد هر ردیف (int16)
+    <column>.bin      مقدار هر ستون برای هر ردیف (float32)
+
+ردیف‌های هر تیک به ترتیب کد نماد نوشته می‌شوند، پس ستون نماد در همه تیک‌ها
+یک الگوی تکراری است و زمان فقط یک بار برای هر تیک ذخیره می‌شود.
+"""
+
+import os
+import json
+import shutil
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytz
+
+from config import FUND_HISTORY_DIR, FUND_HISTORY_COLUMNS, TIMEZONE, KEEP_DAYS
+
+logger = logging.getLogger(__name__)
+
+TICK_FIELDS = 3  # (timestamp, start_row, row_count)
+SYMBOL_DTYPE = np.int16
+VALUE_DTYPE = np.float32
+
+
+def _day_dir(day):
+    return os.path.join(FUND_HISTORY_DIR, day)
+
+
+def _read_symbols(day_dir):
+    path = os.path.join(day_dir, "symbols.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_symbols(day_dir, symbols):
+    path = os.path.join(day_dir, "symbols.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(symbols, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_ticks(day_dir):
+    """تیک‌های ثبت‌شده (فقط تیک‌های کامل)"""
+    path = os.path.join(day_dir, "ticks.bin")
+    if not os.path.exists(path):
+        return np.empty((0, TICK_FIELDS), dtype=np.int64)
+    ticks = np.fromfile(path, dtype=np.int64)
+    usable = len(ticks) - len(ticks) % TICK_FIELDS
+    return ticks[:usable].reshape(-1, TICK_FIELDS)
+
+
+def _truncate(path, size):
+    """حذف داده‌های نیمه‌کاره بعد از آخرین تیک ثبت‌شده (مثلاً بعد از کرش)"""
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        os.truncate(path, size)
+
+
+def append_fund_tick(snapshot, now):
+    """
+    افزودن مقادیر همه صندوق‌ها در این تیک به پارتیشن روز
+
+    Args:
+        snapshot: MarketSnapshot تیک فعلی
+        now: زمان تیک (datetime با منطقه زمانی تهران)
+    """
+    try:
+        day_dir = _day_dir(now.strftime("%Y-%m-%d"))
+        os.makedirs(day_dir, exist_ok=True)
+
+        symbols = _read_symbols(day_dir)
+        codes = {s: i for i, s in enumerate(symbols)}
+        new_symbols = [s for s in snapshot.fund_symbols if s not in codes]
+        if new_symbols:
+            for s in new_symbols:
+                codes[s] = len(symbols)
+                symbols.append(s)
+            _write_symbols(day_dir, symbols)
+
+        row_codes = np.fromiter(
+            (codes[s] for s in snapshot.fund_symbols),
+            dtype=SYMBOL_DTYPE,
+            count=len(snapshot.fund_symbols),
+        )
+        order = np.argsort(row_codes, kind="stable")
+
+        ticks = _read_ticks(day_dir)
+        start_row = int(ticks[-1, 1] + ticks[-1, 2]) if len(ticks) else 0
+
+        # ستون‌ها اول، جدول تیک آخر → تیک فقط وقتی دیده می‌شود که کامل نوشته شده باشد
+        _truncate(os.path.join(day_dir, "symbol.bin"), start_row * SYMBOL_DTYPE().itemsize)
+        with open(os.path.join(day_dir, "symbol.bin"), "ab") as f:
+            row_codes[order].tofile(f)
+
+        for col in FUND_HISTORY_COLUMNS:
+            path = os.path.join(day_dir, f"{col}.bin")
+            _truncate(path, start_row * VALUE_DTYPE().itemsize)
+            try:
+                values = snapshot.fund_column(col).astype(VALUE_DTYPE)[order]
+            except KeyError:
+                values = np.full(len(order), np.nan, dtype=VALUE_DTYPE)
+            with open(path, "ab") as f:
+                values.tofile(f)
+
+        _truncate(os.path.join(day_dir, "ticks.bin"), ticks.nbytes)
+        with open(os.path.join(day_dir, "ticks.bin"), "ab") as f:
+            np.array(
+                [int(now.timestamp()), start_row, len(order)], dtype=np.int64
+            ).tofile(f)
+
+        logger.debug(f"💾 تیک صندوق‌ها ذخیره شد: {len(order)} ردیف از ردیف {start_row}")
+
+    except Exception as e:
+        logger.error(f"❌ خطا در ذخیره سری زمانی صندوق‌ها: {e}", exc_info=True)
+
+
+def read_fund_day(symbol, day=None, columns=None):
+    """
+    خواندن سری زمانی یک صندوق در یک روز
+
+    Args:
+        symbol: نماد صندوق
+        day: تاریخ به فرمت YYYY-MM-DD (پیش‌فرض امروز)
+        columns: ستون‌های مورد نیاز (پیش‌فرض همه)
+
+    Returns:
+        DataFrame: index = زمان تیک (تهران)، یک ستون برای هر متریک
+    """
+    tz = pytz.timezone(TIMEZONE)
+    if day is None:
+        day = datetime.now(tz).strftime("%Y-%m-%d")
+    columns = columns or FUND_HISTORY_COLUMNS
+
+    day_dir = _day_dir(day)
+    symbols = _read_symbols(day_dir)
+    ticks = _read_ticks(day_dir)
+    if symbol not in symbols or not len(ticks):
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], tz=tz))
+
+    n_rows = int(ticks[-1, 1] + ticks[-1, 2])
+    code = symbols.index(symbol)
+    row_codes = np.memmap(
+        os.path.join(day_dir, "symbol.bin"), dtype=SYMBOL_DTYPE, mode="r", shape=(n_rows,)
+    )
+    rows = np.flatnonzero(row_codes == code)
+
+    tick_of_row = np.searchsorted(ticks[:, 1], rows, side="right") - 1
+    index = pd.to_datetime(ticks[tick_of_row, 0], unit="s", utc=True).tz_convert(tz)
+
+    data = {}
+    for col in columns:
+        values = np.memmap(
+            os.path.join(day_dir, f"{col}.bin"), dtype=VALUE_DTYPE, mode="r", shape=(n_rows,)
+        )
+        data[col] = np.asarray(values[rows])
+
+    return pd.DataFrame(data, index=index.rename("timestamp"))
+
+
+def list_fund_history_days():
+    """روزهایی که سری زمانی صندوق‌ها برایشان ذخیره شده"""
+    if not os.path.isdir(FUND_HISTORY_DIR):
+        return []
+    return sorted(d for d in os.listdir(FUND_HISTORY_DIR) if len(d) == 10)
+
+
+def prune_fund_history(keep_days=None):
+    """حذف پارتیشن‌های روزانه قدیمی‌تر از KEEP_DAYS"""
+    if keep_days is None:
+        keep_days = KEEP_DAYS
+
+    cutoff = (datetime.now(pytz.timezone(TIMEZONE)) - timedelta(days=keep_days)).strftime(
+        "%Y-%m-%d"
+    )
+    for day in list_fund_history_days():
+        if day < cutoff:
+            shutil.rmtree(_day_dir(day), ignore_errors=True)
+            logger.info(f"🗑️ سری زمانی صندوق‌های {day} حذف شد")
@@ -0,0 +1,225 @@
+# utils/gist_state.py
+"""
+مدیریت یکپارچه وضعیت ذخیره‌شده در GitHub Gist
+
+همه فایل‌ها (alert_status.json، fund_alerts.json، message_id.json) با یک GET
+شرطی (If-None-Match + ETag) خوانده می‌شوند و تغییرات در حافظه می‌مانند. در پایان
+تیک فقط فایل‌های تغییرکرده با یک PATCH نوشته می‌شوند.
+
+نسخه آخر فایل‌ها و ETag روی دیسک نگه داشته می‌شود تا اجرای بعدی در صورت
+تغییر نکردن Gist فقط پاسخ 304 (بدون بدنه) بگیرد.
+"""
+
+import os
+import json
+import copy
+import logging
+import threading
+import requests
+
+from config import GIST_ID, GIST_TOKEN, GIST_CACHE_FILE, REQUEST_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# ✅ وضعیت در حافظه: {"etag": ..., "files": {name: parsed}}
+_STATE = None
+_DIRTY = set()
+# ✅ آیا Gist در این پروسه واقعاً خوانده شد (200 یا 304)؟
+_CONFIRMED = False
+_LOCK = threading.RLock()
+
+
+def _gist_url():
+    return f"https://api.github.com/gists/{GIST_ID}"
+
+
+def _headers():
+    return {
+        "Authorization": f"token {GIST_TOKEN}",
+        "Accept": "application/vnd.github+json",
+    }
+
+
+def _read_cache():
+    """کش محلی (فایل‌هایی که در اجرای قبلی نوشته نشدند هم کثیف می‌مانند)"""
+    if not os.path.exists(GIST_CACHE_FILE):
+        return {"etag": None, "files": {}}
+    try:
+        with open(GIST_CACHE_FILE, encoding="utf-8") as f:
+            cached = json.load(f)
+        _DIRTY.update(cached.pop("dirty", []))
+        return cached
+    except Exception as e:
+        logger.warning(f"⚠️ خطا در خواندن کش Gist: {e}")
+        return {"etag": None, "files": {}}
+
+
+def _write_cache(state):
+    try:
+        os.makedirs(os.path.dirname(GIST_CACHE_FILE) or ".", exist_ok=True)
+        tmp_path = GIST_CACHE_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                dict(state, dirty=sorted(_DIRTY)),
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, GIST_CACHE_FILE)
+    except Exception as e:
+        logger.warning(f"⚠️ خطا در ذخیره کش Gist: {e}")
+
+
+def _file_content(meta):
+    """محتوای یک فایل Gist (فایل‌های بزرگ در پاسخ API کوتاه می‌شوند → raw_url)"""
+    if meta.get("truncated") and meta.get("raw_url"):
+        r = requests.get(meta["raw_url"], headers=_headers(), timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        return r.text
+    return meta["content"]
+
+
+def load_gist_state(force=False):
+    """
+    بارگذاری همه فایل‌های Gist با یک درخواست (یک بار در هر پروسه)
+
+    Args:
+        force: خواندن دوباره حتی اگر قبلاً بارگذاری شده باشد
+
+    Returns:
+        dict: {نام فایل: محتوای JSON}
+    """
+    global _STATE, _CONFIRMED
+
+    with _LOCK:
+        if _STATE is not None and not force:
+            return _STATE["files"]
+
+        cached = _read_cache()
+        _STATE = cached
+        _CONFIRMED = False
+
+        if not GIST_ID or not GIST_TOKEN:
+            logger.warning("GIST_ID یا GIST_TOKEN تنظیم نشده است")
+            return _STATE["files"]
+
+        try:
+            headers = _headers()
+            if cached.get("etag") and cached.get("files"):
+                headers["If-None-Match"] = cached["etag"]
+
+            r = requests.get(_gist_url(), headers=headers, timeout=REQUEST_TIMEOUT)
+
+            if r.status_code == 304:
+                logger.info("📦 Gist تغییری نکرده (304) → استفاده از کش محلی")
+                _CONFIRMED = True
+            elif r.status_code == 200:
+                payload = r.json()
+                files = {}
+                for name, meta in payload.get("files", {}).items():
+                    try:
+                        files[name] = json.loads(_file_content(meta))
+                    except ValueError:
+                        logger.warning(f"⚠️ محتوای {name} در Gist JSON معتبر نیست")
+                # تغییرات محلی ذخیره‌نشده روی نسخه Gist باقی می‌مانند
+                for name in _DIRTY:
+                    if name in cached["files"]:
+                        files[name] = cached["files"][name]
+                _STATE = {"etag": r.headers.get("ETag"), "files": files}
+                _CONFIRMED = True
+                _write_cache(_STATE)
+                logger.info(f"📦 وضعیت Gist خوانده شد ({len(files)} فایل)")
+            else:
+                logger.warning(f"⚠️ خواندن Gist ناموفق ({r.status_code}) → استفاده از کش محلی")
+
+        except Exception as e:
+            logger.error(f"خطا در خواندن Gist: {e}")
+
+        return _STATE["files"]
+
+
+def gist_state_confirmed():
+    """
+    آیا محتوای فعلی از خود Gist آمده (پاسخ 200/304)؟
+
+    False یعنی Gist تنظیم نشده یا خواندن ناموفق بود و فقط کش محلی (شاید خالی) در دست است.
+    """
+    with _LOCK:
+        load_gist_state()
+        return _CONFIRMED
+
+
+def get_gist_file(name, default=None):
+    """
+    محتوای یک فایل Gist (کپی مستقل؛ برای تغییر از set_gist_file استفاده شود)
+
+    Args:
+        name: نام فایل (مثلاً alert_status.json)
+        default: مقدار پیش‌فرض اگر فایل وجود نداشته باشد
+    """
+    with _LOCK:
+        files = load_gist_state()
+        if name not in files:
+            return copy.deepcopy(default)
+        return copy.deepcopy(files[name])
+
+
+def set_gist_file(name, value):
+    """تغییر محتوای یک فایل در حافظه (فقط اگر واقعاً تغییر کرده باشد کثیف می‌شود)"""
+    with _LOCK:
+        files = load_gist_state()
+        if files.get(name) == value and name in files:
+            return
+        files[name] = copy.deepcopy(value)
+        _DIRTY.add(name)
+
+
+def flush_gist_state():
+    """
+    نوشتن همه فایل‌های تغییرکرده با یک PATCH (پایان تیک)
+
+    Returns:
+        bool: True اگر چیزی برای نوشتن نبود یا نوشتن موفق بود
+    """
+    with _LOCK:
+        if not _DIRTY:
+            return True
+        if not GIST_ID or not GIST_TOKEN:
+            _DIRTY.clear()
+            _write_cache(_STATE)
+            return True
+
+        names = sorted(_DIRTY)
+        files = _STATE["files"]
+        try:
+            response = requests.patch(
+                _gist_url(),
+                headers=_headers(),
+                json={
+                    "files": {
+                        name: {
+                            "content": json.dumps(
+                                files[name], ensure_ascii=False, separators=(",", ":")
+                            )
+                        }
+                        for name in names
+                    }
+                },
+                timeout=REQUEST_TIMEOUT,
+            )
+
+            if response.status_code == 200:
+                _DIRTY.clear()
+                _STATE["etag"] = response.headers.get("ETag")
+                _write_cache(_STATE)
+                logger.info(f"💾 Gist به‌روز شد: {', '.join(names)}")
+                return True
+
+            logger.error(f"❌ ذخیره Gist ناموفق ({response.status_code})")
+
+        except Exception as e:
+            logger.error(f"❌ خطا در ذخیره Gist: {e}")
+
+        # نسخه محلی و فهرست فایل‌های کثیف نگه داشته می‌شود تا اجرای بعدی دوباره بنویسد
+        _write_cache(_STATE)
+        return False
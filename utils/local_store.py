@@ -0,0 +1,636 @@
+# utils/local_store.py
+"""
+ذخیره‌ساز محلی SQLite - منبع اصلی همه خواندن‌ها
+
+هر تیک اول در پایگاه داده محلی نوشته می‌شود و سپس در پس‌زمینه و به صورت
+دسته‌ای به Google Sheets ارسال می‌شود. اگر پایگاه داده خالی باشد (اولین اجرا یا cache از دست رفته)،
+یک بار از روی Sheet پر می‌شود.
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from itertools import takewhile
+from datetime import date, datetime, timedelta
+import pandas as pd
+import pytz
+
+from config import (
+    LOCAL_DB_FILE,
+    STANDARD_HEADER,
+    RECENT_ROWS_CAPACITY,
+    TIMEZONE,
+    SHEETS_BATCH_SIZE,
+    SHEETS_RETRY_BASE,
+    SHEETS_RETRY_MAX,
+)
+from utils.sheets_storage import build_row, append_rows_to_sheet, read_from_sheets, sheet_partition
+from utils.ring_buffer import RowRingBuffer
+from utils.market_history import (
+    append_market_rows,
+    last_market_timestamp,
+    market_history_cutoff,
+    market_history_frame,
+)
+from utils.archive import read_archive
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_COLUMNS = STANDARD_HEADER[1:]
+
+# ✅ یک اتصال برای کل پروسه (نخ آینه هم از همین استفاده می‌کند)
+_CONNECTION = None
+_LOCK = threading.RLock()
+_SEEDED = False
+
+# نخ صف نوشتن Sheet: WAKE = ردیف جدید، IDLE = صف خالی است
+_MIRROR_THREAD = None
+_MIRROR_WAKE = threading.Event()
+_MIRROR_IDLE = threading.Event()
+_MIRROR_IDLE.set()
+
+# کش «آخرین مقدار قبل از تاریخ»: (تاریخ، ستون) → (مقدار، تاریخ پیدا شده)
+# تا پایان روز معاملاتی ثابت است؛ فقط درج ردیف در روزهای گذشته آن را باطل می‌کند
+# (نسخه پایدار همین کش تا پایان روز در state_store می‌ماند تا اجرای تک‌مرحله‌ای هم از آن استفاده کند)
+_CLOSE_CACHE = {}
+_INSERTED_DAYS = set()
+
+# ✅ بافر حلقوی ردیف‌های اخیر (یک بار در هر اجرا بارگذاری، با هر ذخیره به‌روز می‌شود)
+_RECENT = None
+
+# فایل ستونی تاریخچه یک بار در هر پروسه با پایگاه داده هم‌گام می‌شود
+_HISTORY_SYNCED = False
+
+# ✅ متریک‌های صف نوشتن در این پروسه
+MIRROR_STATS = {"flushed": 0, "batches": 0, "failures": 0, "last_flush": None}
+
+
+def get_connection():
+    """اتصال SQLite (یک بار در هر پروسه ساخته می‌شود)"""
+    global _CONNECTION
+
+    with _LOCK:
+        if _CONNECTION is None:
+            os.makedirs(os.path.dirname(LOCAL_DB_FILE) or ".", exist_ok=True)
+            conn = sqlite3.connect(LOCAL_DB_FILE, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+
+            columns = ", ".join(f"{col} REAL" for col in NUMERIC_COLUMNS)
+            conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS market_data (
+                    id INTEGER PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    {columns},
+                    mirrored INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_market_data_timestamp "
+                "ON market_data(timestamp)"
+            )
+            # ✅ ایندکس روزها: اولین/آخرین timestamp هر تاریخ (با هر درج به‌روز می‌شود)
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS day_index (
+                    date TEXT PRIMARY KEY,
+                    first_timestamp TEXT NOT NULL,
+                    last_timestamp TEXT NOT NULL,
+                    row_count INTEGER NOT NULL
+                )"""
+            )
+            conn.commit()
+            _CONNECTION = conn
+
+            # خروج عادی یا با خطا: WAL در فایل اصلی ادغام می‌شود (اجرای بعدی فقط یک فایل لازم دارد)
+            atexit.register(checkpoint_local_store)
+
+            if (
+                conn.execute("SELECT 1 FROM day_index LIMIT 1").fetchone() is None
+                and conn.execute("SELECT 1 FROM market_data LIMIT 1").fetchone() is not None
+            ):
+                rebuild_day_index()
+
+        return _CONNECTION
+
+
+def checkpoint_local_store():
+    """
+    ادغام WAL در فایل اصلی پایگاه داده (snapshot)
+
+    هر تغییر (ردیف، وضعیت هشدار، message_id، cursor واکشی) اول در WAL نوشته و
+    commit می‌شود و بعد از کرش با باز شدن پایگاه داده بازیابی می‌شود؛ این تابع
+    فقط WAL را کوتاه می‌کند تا cache اجرا یک فایل کامل و کوچک ذخیره کند.
+    """
+    # در atexit نخ آینه ممکن است هنوز قفل را داشته باشد → بدون انتظار نامحدود
+    if not _LOCK.acquire(timeout=5):
+        return
+    try:
+        if _CONNECTION is None:
+            return
+        busy, log_pages, moved = _CONNECTION.execute(
+            "PRAGMA wal_checkpoint(TRUNCATE)"
+        ).fetchone()
+        logger.debug(f"🗜️ checkpoint پایگاه داده محلی: {moved}/{log_pages} صفحه (busy={busy})")
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ خطا در checkpoint پایگاه داده محلی: {e}")
+    finally:
+        _LOCK.release()
+
+
+@contextmanager
+def connection():
+    """اتصال پروسه همراه با قفل آن (برای جدول‌های جانبی مانند daily_rollup)"""
+    with _LOCK:
+        yield get_connection()
+
+
+def _to_float(value):
+    """تبدیل مقدار خوانده‌شده از Sheet به عدد (خانه خالی → None)"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _insert(conn, rows, mirrored):
+    placeholders = ", ".join("?" for _ in STANDARD_HEADER)
+    columns = ", ".join(STANDARD_HEADER)
+    conn.executemany(
+        f"INSERT INTO market_data ({columns}, mirrored) VALUES ({placeholders}, {int(mirrored)})",
+        [[row[0]] + [_to_float(v) for v in row[1:13]] for row in rows],
+    )
+
+    # به‌روزرسانی ایندکس روزها فقط برای تاریخ‌های همین ردیف‌ها
+    days = {}
+    for row in rows:
+        day = days.setdefault(row[0][:10], [row[0], row[0], 0])
+        day[0] = min(day[0], row[0])
+        day[1] = max(day[1], row[0])
+        day[2] += 1
+    conn.executemany(
+        """INSERT INTO day_index (date, first_timestamp, last_timestamp, row_count)
+           VALUES (?, ?, ?, ?)
+           ON CONFLICT(date) DO UPDATE SET
+               first_timestamp = MIN(first_timestamp, excluded.first_timestamp),
+               last_timestamp = MAX(last_timestamp, excluded.last_timestamp),
+               row_count = row_count + excluded.row_count""",
+        [(date, *day) for date, day in days.items()],
+    )
+
+    # ردیف امروز جواب «قبل از امروز» را عوض نمی‌کند
+    _INSERTED_DAYS.update(days)
+    oldest_day = min(days, default=None)
+    for key in [k for k in _CLOSE_CACHE if oldest_day is not None and k[0] > oldest_day]:
+        del _CLOSE_CACHE[key]
+
+
+def rebuild_day_index():
+    """ساخت دوباره ایندکس روزها از روی جدول market_data"""
+    with _LOCK:
+        conn = get_connection()
+        conn.execute("DELETE FROM day_index")
+        conn.execute(
+            """INSERT INTO day_index (date, first_timestamp, last_timestamp, row_count)
+               SELECT substr(timestamp, 1, 10), MIN(timestamp), MAX(timestamp), COUNT(*)
+               FROM market_data GROUP BY substr(timestamp, 1, 10)"""
+        )
+        conn.commit()
+        _CLOSE_CACHE.clear()
+
+
+def row_count():
+    with _LOCK:
+        return get_connection().execute("SELECT COUNT(*) FROM market_data").fetchone()[0]
+
+
+def seed_from_sheets():
+    """پر کردن پایگاه داده خالی از روی Google Sheets (فقط یک بار)"""
+    global _SEEDED
+
+    with _LOCK:
+        if _SEEDED:
+            return
+        _SEEDED = True
+
+        if row_count() > 0:
+            return
+
+        logger.info("📥 پایگاه داده محلی خالی است - بارگذاری از Google Sheets...")
+        df = read_from_sheets(limit=100_000).dropna(subset=["timestamp"])
+        if df.empty:
+            return
+
+        stamps = df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S").tolist()
+        values = df[NUMERIC_COLUMNS].astype(object).where(df[NUMERIC_COLUMNS].notna(), None)
+        rows = [[stamp] + list(row) for stamp, row in zip(stamps, values.itertuples(index=False))]
+
+        conn = get_connection()
+        _insert(conn, rows, mirrored=True)
+        conn.commit()
+        logger.info(f"✅ {len(rows)} ردیف از Sheet به پایگاه داده محلی منتقل شد")
+
+
+def read_rows(limit=1000):
+    """
+    خواندن آخرین ردیف‌ها از پایگاه داده محلی
+
+    Args:
+        limit: حداکثر تعداد ردیف‌های برگشتی
+
+    Returns:
+        list: ردیف‌های 13 عنصری از قدیمی به جدید (timestamp رشته، بقیه عدد یا None)
+    """
+    try:
+        seed_from_sheets()
+        columns = ", ".join(STANDARD_HEADER)
+        with _LOCK:
+            rows = get_connection().execute(
+                f"SELECT {columns} FROM market_data ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [list(row) for row in reversed(rows)]
+
+    except Exception as e:
+        logger.error(f"❌ خطا در خواندن از پایگاه داده محلی: {e}", exc_info=True)
+        return []
+
+
+def _seconds_to_end_of_day():
+    """ثانیه‌های باقی‌مانده تا پایان روز تهران (TTL کش بسته روز قبل)"""
+    now = datetime.now(pytz.timezone(TIMEZONE))
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max((midnight - now).total_seconds(), 1)
+
+
+def last_close_before(date, column):
+    """
+    آخرین مقدار ثبت‌شده یک ستون قبل از یک تاریخ (بسته شدن آخرین روز کاری)
+
+    با ایندکس روزها و ایندکس timestamp در O(log n) پیدا می‌شود و (اگر پیدا شد)
+    تا پایان روز در حافظه و در state_store می‌ماند، پس اجراهای بعدی همان روز
+    (حتی در حالت تک‌مرحله‌ای) پایگاه داده را نمی‌خوانند.
+
+    Args:
+        date: تاریخ به فرمت YYYY-MM-DD
+        column: نام ستون (از STANDARD_HEADER)
+
+    Returns:
+        tuple: (مقدار، تاریخ پیدا شده) یا (None, None)
+    """
+    # state_store خودش از اتصال این ماژول استفاده می‌کند
+    from utils.state_store import state_get, state_set
+
+    if column not in NUMERIC_COLUMNS:
+        raise ValueError(f"ستون نامعتبر: {column}")
+
+    key = (date, column)
+    if key in _CLOSE_CACHE:
+        return _CLOSE_CACHE[key]
+
+    state_key = f"last_close:{date}:{column}"
+    stored = state_get(state_key)
+    # ردیف درج‌شده در این پروسه بین روز پیدا شده و date جواب ذخیره‌شده را باطل می‌کند
+    if stored and not any(stored[1] < day < date for day in _INSERTED_DAYS):
+        _CLOSE_CACHE[key] = tuple(stored)
+        return _CLOSE_CACHE[key]
+
+    seed_from_sheets()
+    with _LOCK:
+        conn = get_connection()
+        result = (None, None)
+
+        day = conn.execute(
+            "SELECT last_timestamp FROM day_index WHERE date < ? ORDER BY date DESC LIMIT 1",
+            (date,),
+        ).fetchone()
+        if day:
+            # معمولاً آخرین ردیف همان روز مقدار دارد
+            row = conn.execute(
+                f"SELECT timestamp, {column} FROM market_data "
+                f"WHERE timestamp = ? AND {column} IS NOT NULL AND {column} != 0 "
+                f"ORDER BY id DESC LIMIT 1",
+                (day[0],),
+            ).fetchone()
+            if row is None:
+                logger.warning(f"⚠️ تاریخ {day[0][:10]} پیدا شد ولی {column} خالی است")
+                row = conn.execute(
+                    f"SELECT timestamp, {column} FROM market_data "
+                    f"WHERE timestamp < ? AND {column} IS NOT NULL AND {column} != 0 "
+                    f"ORDER BY timestamp DESC LIMIT 1",
+                    (date,),
+                ).fetchone()
+            if row:
+                result = (row[1], row[0][:10])
+
+    # نبودن مقدار کش نمی‌شود: ردیفی که بعداً در همین روز seed یا درج شود دیده شود
+    if result[0] is not None:
+        _CLOSE_CACHE[key] = result
+        state_set(state_key, list(result), ttl=_seconds_to_end_of_day())
+    return result
+
+
+def recent_rows():
+    """
+    بافر حلقوی مشترک ردیف‌های اخیر (RowRingBuffer)
+
+    بار اول از پایگاه داده بارگذاری می‌شود و بعد از آن save_row هر ردیف جدید را
+    به آن اضافه می‌کند، پس هشدارها بدون خواندن دوباره از آن استفاده می‌کنند.
+    (نمودار از market_history و بستهٔ روز قبل از last_close_before می‌خوانند)
+    """
+    global _RECENT
+
+    with _LOCK:
+        if _RECENT is None:
+            buffer = RowRingBuffer(RECENT_ROWS_CAPACITY)
+            buffer.extend(read_rows(limit=RECENT_ROWS_CAPACITY))
+            _RECENT = buffer
+        return _RECENT
+
+
+def _time_bound(value, is_end):
+    """حد بازه زمانی → رشته 'YYYY-MM-DD HH:MM:SS' (تاریخ تنها = کل آن روز)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if len(value) == 10:
+            return value + (" 23:59:59" if is_end else " 00:00:00")
+        return value[:19].replace("T", " ")
+
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_convert(TIMEZONE).tz_localize(None)
+    if isinstance(value, date) and not isinstance(value, datetime) and is_end:
+        stamp += pd.Timedelta(hours=23, minutes=59, seconds=59)
+    return stamp.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _archived_history(start, end, columns):
+    """ردیف‌های آرشیو Parquet با زمان محلی تهران (بدون منطقه زمانی) و مقادیر float64"""
+    df = read_archive(start, end, columns)
+    df["timestamp"] = df["timestamp"].dt.tz_convert(TIMEZONE).dt.tz_localize(None)
+    df[columns] = df[columns].astype("float64")
+    return df
+
+
+def history(start=None, end=None, columns=None):
+    """
+    ردیف‌های ذخیره‌شده در یک بازه زمانی
+
+    بازه‌های داخل KEEP_DAYS روز اخیر از فایل ستونی market_history (memmap)،
+    بقیه با ایندکس timestamp از SQLite و بخش قدیمی‌تر از اولین ردیف SQLite از
+    آرشیو Parquet خوانده می‌شوند.
+
+    Args:
+        start / end: ابتدا و انتهای بازه، هر دو شامل (رشته، date، datetime یا
+                     Timestamp؛ تاریخ تنها یعنی کل آن روز؛ None = بدون حد)
+        columns: ستون‌های مورد نیاز از STANDARD_HEADER (پیش‌فرض همه)
+
+    Returns:
+        DataFrame: ستون timestamp (datetime) + ستون‌های خواسته‌شده (float64)
+    """
+    columns = [col for col in (columns or NUMERIC_COLUMNS) if col != "timestamp"]
+    unknown = set(columns) - set(NUMERIC_COLUMNS)
+    if unknown:
+        raise ValueError(f"ستون نامعتبر: {sorted(unknown)}")
+
+    start, end = _time_bound(start, False), _time_bound(end, True)
+
+    seed_from_sheets()
+    with _LOCK:
+        if not _HISTORY_SYNCED:
+            sync_market_history()
+
+        # ✅ فایل ستونی همه ردیف‌های از market_history_cutoff به بعد را دارد
+        if start is not None and start >= market_history_cutoff():
+            frame = market_history_frame(start, end, columns)
+            return pd.DataFrame({
+                "timestamp": frame["timestamp"].to_numpy().astype("datetime64[ns]"),
+                **{col: frame[col].to_numpy(copy=True) for col in columns},
+            })
+
+        conn = get_connection()
+        query = f"SELECT timestamp, {', '.join(columns)} FROM market_data WHERE 1 = 1"
+        params = []
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND timestamp <= ?"
+            params.append(end)
+        rows = conn.execute(query + " ORDER BY timestamp, id", params).fetchall()
+        first = conn.execute("SELECT MIN(timestamp) FROM market_data").fetchone()[0]
+
+    df = pd.DataFrame(rows, columns=["timestamp"] + columns)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], format="%Y-%m-%d %H:%M:%S")
+    df[columns] = df[columns].astype("float64")
+
+    # 🗄️ بخش قبل از اولین ردیف SQLite فقط در آرشیو Parquet است
+    if first is None or start is None or start < first:
+        archive_end = end
+        if first is not None:
+            before_first = (pd.Timestamp(first) - pd.Timedelta(seconds=1)).strftime("%Y-%m-%d %H:%M:%S")
+            archive_end = before_first if end is None else min(end, before_first)
+        if start is None or archive_end is None or start <= archive_end:
+            archived = _archived_history(start, archive_end, columns)
+            if len(archived):
+                df = pd.concat([archived, df], ignore_index=True) if len(df) else archived
+
+    return df
+
+
+def sync_market_history():
+    """
+    افزودن ردیف‌های پایگاه داده که هنوز در فایل ستونی تاریخچه نیستند
+
+    بار اول تاریخچه KEEP_DAYS روز اخیر را می‌نویسد و بعد از آن فقط ردیف‌های
+    جاافتاده (مثلاً کرش بین درج و append) را اضافه می‌کند.
+    """
+    global _HISTORY_SYNCED
+
+    with _LOCK:
+        last = last_market_timestamp()
+        columns = ", ".join(STANDARD_HEADER)
+        query = f"SELECT {columns} FROM market_data WHERE timestamp "
+        if last is not None:
+            query += "> ?"
+            params = (last,)
+        else:
+            query += ">= ?"
+            params = (market_history_cutoff(),)
+        rows = get_connection().execute(query + " ORDER BY timestamp, id", params).fetchall()
+
+        written = append_market_rows(rows)
+        _HISTORY_SYNCED = True
+
+    if written > 1:
+        logger.info(f"🗂️ {written} ردیف به فایل ستونی تاریخچه اضافه شد")
+    return written
+
+
+def save_row(row_dict):
+    """
+    ذخیره ردیف تیک در پایگاه داده محلی و قرار دادن آن در صف نوشتن Sheet
+
+    بلافاصله برمی‌گردد؛ ارسال به Sheet در نخ پس‌زمینه و به صورت دسته‌ای انجام می‌شود.
+
+    Args:
+        row_dict: داده‌های ردیف (کلیدها مانند sheets_storage.build_row)
+    """
+    try:
+        seed_from_sheets()
+        row = build_row(row_dict)
+        with _LOCK:
+            conn = get_connection()
+            _insert(conn, [row], mirrored=False)
+            conn.commit()
+            if _RECENT is not None:
+                _RECENT.append(row)
+            if _HISTORY_SYNCED:
+                append_market_rows([row])
+            else:
+                sync_market_history()
+
+        logger.info(f"✅ داده در پایگاه داده محلی ذخیره شد: {row[0]}")
+        _start_mirror()
+
+    except Exception as e:
+        logger.error(f"❌ خطا در ذخیره‌سازی محلی: {e}", exc_info=True)
+
+
+# ════════════════════════════════════════════════════════════════
+# صف نوشتن پس‌زمینه به Google Sheets
+# ════════════════════════════════════════════════════════════════
+#
+# صف همان ردیف‌های mirrored = 0 در پایگاه داده است، پس ردیف‌ها تا تأیید
+# Sheet روی دیسک می‌مانند و قطعی Sheets هیچ تیکی را از بین نمی‌برد.
+
+
+def _pending_rows(limit):
+    columns = ", ".join(STANDARD_HEADER)
+    return get_connection().execute(
+        f"SELECT id, {columns} FROM market_data WHERE mirrored = 0 ORDER BY id LIMIT ?",
+        (limit,),
+    ).fetchall()
+
+
+def _flush_batch():
+    """
+    ارسال یک دسته از ردیف‌های صف در یک append
+
+    Returns:
+        int | None: تعداد ردیف‌های ارسال‌شده (0 = صف خالی)، None = خطا
+    """
+    with _LOCK:
+        pending = _pending_rows(SHEETS_BATCH_SIZE)
+        if not pending:
+            _MIRROR_IDLE.set()
+            return 0
+
+    # یک تب ماهانه در هر دسته: اگر append تب دوم شکست بخورد ردیف‌های تب اول دوباره ارسال نمی‌شوند
+    partition = sheet_partition(pending[0][1])
+    pending = list(takewhile(lambda record: sheet_partition(record[1]) == partition, pending))
+
+    # NaN در SQLite به NULL تبدیل شده؛ خانه خالی صریح ("") همان چیزی است که خواننده‌ها می‌پذیرند
+    rows = [["" if value is None else value for value in record[1:]] for record in pending]
+    if not append_rows_to_sheet(rows):
+        return None
+
+    with _LOCK:
+        conn = get_connection()
+        conn.executemany(
+            "UPDATE market_data SET mirrored = 1 WHERE id = ?",
+            [(record[0],) for record in pending],
+        )
+        conn.commit()
+    return len(pending)
+
+
+def _mirror_worker():
+    delay = SHEETS_RETRY_BASE
+    while True:
+        _MIRROR_WAKE.wait()
+        _MIRROR_WAKE.clear()
+
+        while True:
+            try:
+                flushed = _flush_batch()
+            except Exception as e:
+                logger.error(f"❌ خطا در صف نوشتن Sheet: {e}", exc_info=True)
+                flushed = None
+
+            if flushed is None:
+                MIRROR_STATS["failures"] += 1
+                logger.warning(
+                    f"⚠️ ارسال به Sheet ناموفق بود - تلاش مجدد {delay} ثانیه دیگر "
+                    f"(تلاش ناموفق پیاپی: {MIRROR_STATS['failures']})"
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, SHEETS_RETRY_MAX)
+                continue
+
+            delay = SHEETS_RETRY_BASE
+            if flushed == 0:
+                break
+            MIRROR_STATS["failures"] = 0
+            MIRROR_STATS["flushed"] += flushed
+            MIRROR_STATS["batches"] += 1
+            MIRROR_STATS["last_flush"] = time.time()
+
+
+def _start_mirror():
+    """راه‌اندازی نخ صف نوشتن (ردیف‌های مانده از اجراهای قبل هم ارسال می‌شوند)"""
+    global _MIRROR_THREAD
+
+    with _LOCK:
+        if _MIRROR_THREAD is None:
+            _MIRROR_THREAD = threading.Thread(
+                target=_mirror_worker, name="sheets-mirror", daemon=True
+            )
+            _MIRROR_THREAD.start()
+        _MIRROR_IDLE.clear()
+        _MIRROR_WAKE.set()
+
+
+def mirror_stats():
+    """
+    وضعیت صف نوشتن Sheet
+
+    Returns:
+        dict: depth (ردیف‌های منتظر)، oldest_age (ثانیه از قدیمی‌ترین ردیف منتظر)،
+              failures (خطای پیاپی)، flushed/batches (در این پروسه)، last_flush
+    """
+    with _LOCK:
+        depth, oldest = get_connection().execute(
+            "SELECT COUNT(*), MIN(timestamp) FROM market_data WHERE mirrored = 0"
+        ).fetchone()
+
+    oldest_age = None
+    if oldest:
+        tz = pytz.timezone(TIMEZONE)
+        oldest_time = tz.localize(datetime.strptime(oldest[:19], "%Y-%m-%d %H:%M:%S"))
+        oldest_age = (datetime.now(tz) - oldest_time).total_seconds()
+
+    return dict(MIRROR_STATS, depth=depth, oldest_age=oldest_age)
+
+
+def wait_for_mirror(timeout=60):
+    """صبر تا خالی شدن صف نوشتن (قبل از پایان اجرای تک‌مرحله‌ای)"""
+    if _MIRROR_THREAD is None:
+        return True
+
+    if _MIRROR_IDLE.wait(timeout):
+        return True
+
+    stats = mirror_stats()
+    logger.warning(
+        f"⚠️ صف نوشتن Sheet در {timeout} ثانیه خالی نشد ({stats['depth']} ردیف) "
+        f"- در اجرای بعد ادامه می‌یابد"
+    )
+    return False
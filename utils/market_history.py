@@ -0,0 +1,243 @@
+# utils/market_history.py
+"""
+فایل ستونی append-only تاریخچه بازار
+
+ساختار (DATA_DIR/market_history):
+    timestamp.bin     زمان هر ردیف (int64، ثانیه از 1970 به وقت محلی تهران)
+    <column>.bin      مقدار هر ستون STANDARD_HEADER برای هر ردیف (float64، خالی = nan)
+
+خواننده‌ها فایل‌ها را با memmap باز می‌کنند و بازه زمانی با جستجوی دودویی روی
+ستون زمان پیدا می‌شود، پس برش امروز (یا یک ماه) یک view بدون کپی است و
+هزینه آن فقط page fault است، نه پارس کردن ردیف‌ها.
+
+ستون‌ها اول و زمان آخر نوشته می‌شود؛ ردیف فقط وقتی دیده می‌شود که کامل نوشته
+شده باشد و داده نیمه‌کاره بعد از کرش در نوشتن بعدی بریده می‌شود.
+
+prune_market_history ردیف‌های قدیمی‌تر از KEEP_DAYS را حذف می‌کند: فایل‌های
+کوتاه‌شده در پوشه کناری ساخته و با rename جایگزین می‌شوند، پس ستون‌ها هیچ‌وقت
+نسبت به ستون زمان جابه‌جا نمی‌شوند.
+"""
+
+import os
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytz
+
+from config import STANDARD_HEADER, MARKET_HISTORY_DIR, KEEP_DAYS, TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_COLUMNS = STANDARD_HEADER[1:]
+TIME_DTYPE = np.int64
+VALUE_DTYPE = np.float64
+
+# ✅ memmapهای باز: {"rows": n, "times": ..., "columns": {name: memmap}}
+_MAPS = None
+_LOCK = threading.Lock()
+
+
+_NEW_DIR = MARKET_HISTORY_DIR + ".new"
+_OLD_DIR = MARKET_HISTORY_DIR + ".old"
+
+
+def _path(name, directory=MARKET_HISTORY_DIR):
+    return os.path.join(directory, f"{name}.bin")
+
+
+def _finish_swap():
+    """تکمیل جایگزینی نیمه‌کاره prune (کرش بین دو rename)"""
+    if not os.path.exists(MARKET_HISTORY_DIR) and os.path.exists(_NEW_DIR):
+        os.rename(_NEW_DIR, MARKET_HISTORY_DIR)
+    if os.path.exists(_OLD_DIR) and os.path.exists(MARKET_HISTORY_DIR):
+        shutil.rmtree(_OLD_DIR, ignore_errors=True)
+
+
+def market_history_length():
+    """تعداد ردیف‌های کامل ثبت‌شده"""
+    _finish_swap()
+    path = _path("timestamp")
+    if not os.path.exists(path):
+        return 0
+    return os.path.getsize(path) // TIME_DTYPE().itemsize
+
+
+def _to_seconds(timestamps):
+    """رشته‌های 'YYYY-MM-DD HH:MM:SS' → ثانیه (int64)"""
+    return np.array(timestamps, dtype="datetime64[s]").astype(TIME_DTYPE)
+
+
+def _truncate(path, size):
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        os.truncate(path, size)
+
+
+def last_market_timestamp():
+    """زمان آخرین ردیف ثبت‌شده ('YYYY-MM-DD HH:MM:SS' یا None)"""
+    n_rows = market_history_length()
+    if not n_rows:
+        return None
+    times = np.memmap(_path("timestamp"), dtype=TIME_DTYPE, mode="r", shape=(n_rows,))
+    return str(times[-1:].view("datetime64[s]")[0]).replace("T", " ")
+
+
+def append_market_rows(rows):
+    """
+    افزودن ردیف‌ها به انتهای فایل‌های ستونی
+
+    Args:
+        rows: لیست ردیف‌ها به فرمت build_row (timestamp + 12 مقدار)، به ترتیب زمان
+
+    Returns:
+        int: تعداد ردیف‌های نوشته‌شده (ردیف‌های قدیمی‌تر از آخرین ردیف رد می‌شوند)
+    """
+    if not rows:
+        return 0
+
+    with _LOCK:
+        os.makedirs(MARKET_HISTORY_DIR, exist_ok=True)
+        n_rows = market_history_length()
+
+        times = _to_seconds([row[0] for row in rows])
+        if n_rows:
+            last = np.fromfile(
+                _path("timestamp"), dtype=TIME_DTYPE, count=1,
+                offset=(n_rows - 1) * TIME_DTYPE().itemsize,
+            )[0]
+            keep = times >= last
+            if not keep.all():
+                logger.warning(f"⚠️ {int((~keep).sum())} ردیف قدیمی‌تر از آخرین ردیف تاریخچه رد شد")
+                rows = [row for row, k in zip(rows, keep) if k]
+                times = times[keep]
+        if not len(times) or (np.diff(times) < 0).any():
+            if len(times):
+                logger.warning("⚠️ ردیف‌های تاریخچه مرتب نیستند - نوشته نشد")
+            return 0
+
+        values = np.array(
+            [[np.nan if v is None or v == "" else v for v in row[1:13]] for row in rows],
+            dtype=VALUE_DTYPE,
+        )
+
+        for i, col in enumerate(NUMERIC_COLUMNS):
+            path = _path(col)
+            _truncate(path, n_rows * VALUE_DTYPE().itemsize)
+            with open(path, "ab") as f:
+                np.ascontiguousarray(values[:, i]).tofile(f)
+
+        with open(_path("timestamp"), "ab") as f:
+            times.tofile(f)
+
+        return len(times)
+
+
+def market_history_cutoff(keep_days=None):
+    """شروع بازه نگهداری ('YYYY-MM-DD 00:00:00' به وقت تهران، KEEP_DAYS روز قبل)"""
+    if keep_days is None:
+        keep_days = KEEP_DAYS
+    cutoff = datetime.now(pytz.timezone(TIMEZONE)) - timedelta(days=keep_days)
+    return cutoff.strftime("%Y-%m-%d 00:00:00")
+
+
+def prune_market_history(keep_days=None):
+    """
+    حذف ردیف‌های قدیمی‌تر از KEEP_DAYS روز (مثل prune_fund_history)
+
+    Returns:
+        int: تعداد ردیف‌های حذف‌شده
+    """
+    global _MAPS
+
+    with _LOCK:
+        n_rows = market_history_length()
+        if not n_rows:
+            return 0
+
+        times = np.fromfile(_path("timestamp"), dtype=TIME_DTYPE, count=n_rows)
+        drop = int(np.searchsorted(times, _to_seconds([market_history_cutoff(keep_days)])[0]))
+        if not drop:
+            return 0
+
+        shutil.rmtree(_NEW_DIR, ignore_errors=True)
+        os.makedirs(_NEW_DIR)
+        for col in NUMERIC_COLUMNS:
+            path = _path(col)
+            available = os.path.getsize(path) // VALUE_DTYPE().itemsize if os.path.exists(path) else 0
+            if available >= n_rows:
+                values = np.fromfile(path, dtype=VALUE_DTYPE, count=n_rows)[drop:]
+            else:
+                values = np.full(n_rows - drop, np.nan, dtype=VALUE_DTYPE)
+            values.tofile(_path(col, _NEW_DIR))
+        times[drop:].tofile(_path("timestamp", _NEW_DIR))
+
+        os.rename(MARKET_HISTORY_DIR, _OLD_DIR)
+        os.rename(_NEW_DIR, MARKET_HISTORY_DIR)
+        shutil.rmtree(_OLD_DIR, ignore_errors=True)
+        _MAPS = None
+
+    logger.info(f"🗑️ {drop} ردیف قدیمی از فایل ستونی تاریخچه حذف شد")
+    return drop
+
+
+def _open_maps():
+    """memmap فایل‌ها (فقط وقتی تعداد ردیف‌ها تغییر کرده باشد دوباره باز می‌شود)"""
+    global _MAPS
+
+    n_rows = market_history_length()
+    if _MAPS is not None and _MAPS["rows"] == n_rows:
+        return _MAPS
+
+    if not n_rows:
+        _MAPS = {
+            "rows": 0,
+            "times": np.empty(0, dtype="datetime64[s]"),
+            "columns": {col: np.empty(0, dtype=VALUE_DTYPE) for col in NUMERIC_COLUMNS},
+        }
+        return _MAPS
+
+    times = np.memmap(_path("timestamp"), dtype=TIME_DTYPE, mode="r", shape=(n_rows,))
+    columns = {}
+    for col in NUMERIC_COLUMNS:
+        path = _path(col)
+        available = os.path.getsize(path) // VALUE_DTYPE().itemsize if os.path.exists(path) else 0
+        if available >= n_rows:
+            columns[col] = np.memmap(path, dtype=VALUE_DTYPE, mode="r", shape=(n_rows,))
+        else:
+            columns[col] = np.full(n_rows, np.nan, dtype=VALUE_DTYPE)
+
+    _MAPS = {"rows": n_rows, "times": times.view("datetime64[s]"), "columns": columns}
+    return _MAPS
+
+
+def market_history_slice(start=None, end=None, columns=None):
+    """
+    برش بازه [start, end] بدون کپی
+
+    Args:
+        start / end: 'YYYY-MM-DD HH:MM:SS' (هر دو شامل؛ None = بدون حد)
+        columns: ستون‌های مورد نیاز (پیش‌فرض همه)
+
+    Returns:
+        tuple: (آرایه زمان datetime64[s]، {ستون: آرایه float64}) — viewهای فقط‌خواندنی
+    """
+    maps = _open_maps()
+    times = maps["times"]
+    lo = 0 if start is None else np.searchsorted(times, np.datetime64(start, "s"), side="left")
+    hi = len(times) if end is None else np.searchsorted(times, np.datetime64(end, "s"), side="right")
+    return times[lo:hi], {
+        col: maps["columns"][col][lo:hi] for col in (columns or NUMERIC_COLUMNS)
+    }
+
+
+def market_history_frame(start=None, end=None, columns=None):
+    """
+    دیتافریم بازه [start, end] که ستون‌هایش همان viewهای memmap هستند (بدون کپی)
+
+    Returns:
+        DataFrame: ستون timestamp (datetime64[s]) + ستون‌های خواسته‌شده (float64)
+    """
+    times, data = market_history_slice(start, end, columns)
+    return pd.DataFrame({"timestamp": times, **data}, copy=False)
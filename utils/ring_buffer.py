@@ -0,0 +1,68 @@
+# utils/ring_buffer.py
+"""
+بافر حلقوی ثابت‌ظرفیت ردیف‌های اخیر بازار (فقط برای مقایسه‌های هشدار)
+
+نمودار روز از market_history (memmap ستونی) و بستهٔ روز قبل از day_index پایگاه داده
+خوانده می‌شوند؛ این بافر فقط چند ردیف آخر را برای tail نگه می‌دارد.
+"""
+
+import numpy as np
+
+from config import STANDARD_HEADER
+
+NUMERIC_COLUMNS = STANDARD_HEADER[1:]
+
+
+def _to_datetime64(timestamp):
+    """رشته 'YYYY-MM-DD HH:MM:SS' → datetime64[s] (ساعت تهران، بدون منطقه زمانی)"""
+    return np.datetime64(str(timestamp)[:19].replace(" ", "T"), "s")
+
+
+class RowRingBuffer:
+    """
+    آخرین capacity ردیف بازار در آرایه‌های NumPy هم‌نوع
+
+    زمان‌ها datetime64[s] و مقادیر float64 (خانه خالی = nan) هستند و ردیف‌ها به
+    ترتیب زمان اضافه می‌شوند.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype="datetime64[s]")
+        self._values = np.full((capacity, len(NUMERIC_COLUMNS)), np.nan, dtype=np.float64)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, row):
+        """افزودن یک ردیف 13 ستونی (timestamp + مقادیر)"""
+        i = self._next
+        self._times[i] = _to_datetime64(row[0])
+        self._values[i] = [np.nan if v is None or v == "" else float(v) for v in row[1:13]]
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    # ────────────────── نماها ──────────────────
+
+    def _order(self, n=None):
+        """اندیس‌های n ردیف آخر به ترتیب زمان"""
+        n = self._size if n is None else min(n, self._size)
+        start = (self._next - n) % self.capacity
+        return (start + np.arange(n)) % self.capacity
+
+    def _rows(self, order):
+        stamps = np.datetime_as_string(self._times[order], unit="s")
+        return [
+            [stamp.replace("T", " ")] + [None if np.isnan(v) else float(v) for v in values]
+            for stamp, values in zip(stamps, self._values[order])
+        ]
+
+    def tail(self, n):
+        """n ردیف آخر به همان شکل read_rows (لیست‌های 13 عنصری، از قدیمی به جدید)"""
+        return self._rows(self._order(n))
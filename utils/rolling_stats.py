@@ -0,0 +1,184 @@
+# utils/rolling_stats.py
+"""
+موتور آمار افزایشی درون‌روزی
+
+برای هر متریک (دلار، شمش، اونس، حباب وزنی، پول حقیقی و قیمت هر صندوق) در هر تیک
+به‌روز می‌شود: EWMA، کمینه/بیشینه جلسه و VWAP جلسه با هزینه O(1) و میانگین،
+انحراف معیار و z-score غلتان با هزینه O(ROLLING_WINDOW): میانگین و واریانس هر بار
+با دو گذر روی پنجره حساب می‌شوند (نه جمع/جمع مربعات جاری که در مقیاس قیمت
+شمش دچار حذف فاجعه‌بار ارقام می‌شود). وضعیت در فایل JSON ذخیره می‌شود تا اجرای
+تک‌مرحله‌ای (GitHub Actions) آن را از دست ندهد و با شروع روز جدید صفر می‌شود.
+"""
+
+import os
+import json
+import math
+import logging
+from collections import deque
+from datetime import datetime
+import pytz
+
+from config import ROLLING_STATS_FILE, ROLLING_WINDOW, EWMA_ALPHA, TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# ✅ وضعیت در حافظه: {"date": ..., "metrics": {name: state}}
+ROLLING_STATE = None
+
+
+def _new_metric():
+    return {
+        "window": deque(maxlen=ROLLING_WINDOW),
+        "ewma": None,
+        "min": None,
+        "max": None,
+        "pv": 0.0,
+        "volume": 0.0,
+        "count": 0,
+        "last": None,
+        "cum_volume": None,
+    }
+
+
+def _load_state(date):
+    global ROLLING_STATE
+
+    if ROLLING_STATE is None and os.path.exists(ROLLING_STATS_FILE):
+        try:
+            with open(ROLLING_STATS_FILE, encoding="utf-8") as f:
+                raw = json.load(f)
+            for metric in raw["metrics"].values():
+                metric["window"] = deque(metric["window"], maxlen=ROLLING_WINDOW)
+            ROLLING_STATE = raw
+        except Exception as e:
+            logger.warning(f"⚠️ خطا در خواندن آمار غلتان: {e}")
+
+    if ROLLING_STATE is None or ROLLING_STATE.get("date") != date:
+        ROLLING_STATE = {"date": date, "metrics": {}}
+
+    return ROLLING_STATE
+
+
+def save_rolling_stats():
+    """ذخیره وضعیت روی دیسک"""
+    if ROLLING_STATE is None:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(ROLLING_STATS_FILE) or ".", exist_ok=True)
+        data = {
+            "date": ROLLING_STATE["date"],
+            "metrics": {
+                name: dict(state, window=list(state["window"]))
+                for name, state in ROLLING_STATE["metrics"].items()
+            },
+        }
+        tmp_path = ROLLING_STATS_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, ROLLING_STATS_FILE)
+    except Exception as e:
+        logger.warning(f"⚠️ خطا در ذخیره آمار غلتان: {e}")
+
+
+def _update_metric(state, value, volume=None):
+    """
+    افزودن یک مقدار با هزینه O(1) (آمار پنجره در describe با هزینه O(ROLLING_WINDOW) حساب می‌شود)
+
+    Args:
+        volume: حجم تجمعی روز (برای VWAP)؛ اگر None باشد وزن هر تیک 1 است
+    """
+    state["window"].append(value)
+
+    state["ewma"] = (
+        value
+        if state["ewma"] is None
+        else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * state["ewma"]
+    )
+    state["min"] = value if state["min"] is None else min(state["min"], value)
+    state["max"] = value if state["max"] is None else max(state["max"], value)
+
+    if volume is None:
+        weight = 1.0
+    else:
+        prev_volume = state["cum_volume"]
+        weight = volume - prev_volume if prev_volume is not None else volume
+        state["cum_volume"] = volume
+    if weight > 0:
+        state["pv"] += value * weight
+        state["volume"] += weight
+
+    state["count"] += 1
+    state["last"] = value
+
+
+def describe(state):
+    """خلاصه آماری یک متریک"""
+    window = state["window"]
+    n = len(window)
+    mean = math.fsum(window) / n if n else None
+    std = None
+    z = None
+    if n > 1:
+        variance = math.fsum((v - mean) ** 2 for v in window) / (n - 1)
+        std = math.sqrt(variance)
+        if std > 0:
+            z = (state["last"] - mean) / std
+
+    return {
+        "last": state["last"],
+        "ewma": state["ewma"],
+        "mean": mean,
+        "std": std,
+        "z": z,
+        "min": state["min"],
+        "max": state["max"],
+        "vwap": state["pv"] / state["volume"] if state["volume"] else None,
+        "count": state["count"],
+    }
+
+
+def update_rolling_stats(now, market_values, snapshot=None):
+    """
+    به‌روزرسانی آمار همه متریک‌ها با مقادیر این تیک
+
+    Args:
+        now: زمان تیک (تهران)
+        market_values: دیکشنری {نام متریک: مقدار} برای متریک‌های کل بازار
+        snapshot: MarketSnapshot برای آمار قیمت هر صندوق (وزن VWAP = ارزش معاملات)
+
+    Returns:
+        dict: {نام متریک: خلاصه آماری}
+    """
+    state = _load_state(now.strftime("%Y-%m-%d"))
+    metrics = state["metrics"]
+    updated = {}
+
+    for name, value in market_values.items():
+        if value is None or not math.isfinite(float(value)):
+            continue
+        metric = metrics.setdefault(name, _new_metric())
+        _update_metric(metric, float(value))
+        updated[name] = describe(metric)
+
+    if snapshot is not None:
+        prices = snapshot.fund_column("close_price")
+        values = snapshot.fund_column("value")
+        for symbol, price, value in zip(snapshot.fund_symbols, prices, values):
+            if not math.isfinite(price):
+                continue
+            name = f"fund:{symbol}"
+            metric = metrics.setdefault(name, _new_metric())
+            volume = float(value) if math.isfinite(value) else None
+            _update_metric(metric, float(price), volume)
+            updated[name] = describe(metric)
+
+    save_rolling_stats()
+    return updated
+
+
+def get_rolling_stats(name):
+    """خلاصه آماری آخرین وضعیت یک متریک (یا None)"""
+    today = datetime.now(pytz.timezone(TIMEZONE)).strftime("%Y-%m-%d")
+    state = _load_state(today)["metrics"].get(name)
+    return describe(state) if state else None
@@ -1,21 +1,45 @@
 # utils/sheets_storage.py
-"""ماژول مدیریت ذخیره‌سازی داده‌ها در Google Sheets - با پول حقیقی"""
+"""
+ماژول مدیریت ذخیره‌سازی داده‌ها در Google Sheets - با پول حقیقی
 
+ردیف‌ها در تب‌های ماهانه (ماه شمسی، مثلاً Data-1404-07) نوشته می‌شوند و تب
+Index فهرست پارتیشن‌ها و بازه تاریخ میلادی هر کدام را نگه می‌دارد. خواننده‌ها
+فقط تب‌های بازه خودشان را می‌خوانند و نگهداری با حذف کل تب انجام می‌شود.
+Sheet1 (ساختار قبلی، یک تب) فقط برای خواندن و پاکسازی ردیف‌های قدیمی باقی است.
+"""
+
+import re
 import json
 import logging
+import threading
+from collections import Counter
+from functools import lru_cache
 from datetime import datetime, timedelta
+import httplib2
+import jdatetime
+import pandas as pd
 import pytz
+import google_auth_httplib2
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-
-from config import SHEET_ID, SERVICE_ACCOUNT_JSON, TIMEZONE, KEEP_DAYS
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from config import (
+    SHEET_ID,
+    SERVICE_ACCOUNT_JSON,
+    TIMEZONE,
+    KEEP_DAYS,
+    SHEET_PARTITION_PREFIX,
+    SHEET_INDEX_NAME,
+    SHEETS_BACKEND,
+    SHEETS_STUB_LATENCY,
+    SHEETS_STUB_ERROR_RATE,
+)
+from utils.archive import archive_frame
 
 logger = logging.getLogger(__name__)
 
-# بررسی متغیرهای محیطی
-if not SHEET_ID or not SERVICE_ACCOUNT_JSON:
-    raise Exception("⚠️ SHEET_ID یا SHEETS_SERVICE_ACCOUNT در Secrets تنظیم نشده!")
-
 # ✅ هدر جدید با 13 ستون (اضافه شدن pol_hagigi)
 STANDARD_HEADER = [
     'timestamp',
@@ -33,80 +57,457 @@ STANDARD_HEADER = [
     'pol_hagigi'  # ✅ ستون جدید
 ]
 
+# ✅ ستون‌های الزامی هر ردیف: timestamp + سه قیمت (بقیه ممکن است خالی باشند)
+MIN_ROW_COLUMNS = 4
+
+# تب قدیمی تک‌جدولی (قبل از پارتیشن ماهانه)
+SHEET_NAME = 'Sheet1'
+
+INDEX_HEADER = ['tab', 'month', 'start_date', 'end_date', 'sheet_id']
+
+# مبدأ شماره سریال تاریخ در Google Sheets (همان مبدأ Lotus/Excel)
+SERIAL_EPOCH = pd.Timestamp('1899-12-30')
+
+# ✅ شماره آخرین ردیف داده هر تب (1-based، شامل هدر) - از پاسخ append به‌روز می‌شود
+_LAST_ROW = {}
+
+# ✅ پارتیشن‌های ثبت‌شده در تب Index (یک بار در هر پروسه خوانده می‌شود): عنوان → مشخصات
+_PARTITIONS = None
+
+# اندازه اولین پنجره جستجوی انتهای داده در ستون A (بعد از هر بار دو برابر می‌شود)
+TAIL_PROBE_ROWS = 500
+
+# تعداد ردیف در هر خواندن clear_invalid_rows
+CLEANUP_CHUNK_ROWS = 10_000
+
+
+# ✅ یک سرویس برای کل پروسه (نخ اصلی و نخ آینه Sheet)
+_SERVICE = None
+_CREDENTIALS = None
+_SERVICE_LOCK = threading.Lock()
+
+# httplib2 امن برای چند نخ نیست → هر نخ اتصال HTTP خودش را دارد
+_THREAD_HTTP = threading.local()
+
+# ✅ شمارنده فراخوانی‌های API (نام متد → تعداد) از آخرین reset
+API_CALLS = Counter()
+_API_CALLS_LOCK = threading.Lock()
+
+
+def _count_call(method_id):
+    with _API_CALLS_LOCK:
+        API_CALLS[method_id] += 1
+
+
+class _CountingRequest(HttpRequest):
+    """درخواست Sheets که هر اجرا را در API_CALLS ثبت می‌کند"""
+
+    def execute(self, *args, **kwargs):
+        _count_call(self.methodId)
+        return super().execute(*args, **kwargs)
+
+
+def _thread_http():
+    http = getattr(_THREAD_HTTP, 'http', None)
+    if http is None:
+        http = google_auth_httplib2.AuthorizedHttp(_CREDENTIALS, http=httplib2.Http())
+        _THREAD_HTTP.http = http
+    return http
+
+
+def _build_request(http, *args, **kwargs):
+    return _CountingRequest(_thread_http(), *args, **kwargs)
+
 
 def get_sheets_service():
-    """اتصال به Google Sheets API"""
-    try:
-        creds_info = json.loads(SERVICE_ACCOUNT_JSON)
-        credentials = service_account.Credentials.from_service_account_info(
-            creds_info,
-            scopes=['https://www.googleapis.com/auth/spreadsheets']
-        )
-        return build('sheets', 'v4', credentials=credentials, cache_discovery=False)
-    except Exception as e:
-        logger.error(f"❌ خطا در اتصال به Google Sheets: {e}")
-        raise
+    """اتصال به Google Sheets API (یک بار در هر پروسه ساخته می‌شود)"""
+    global _SERVICE, _CREDENTIALS
+
+    if _SERVICE is not None:
+        return _SERVICE
+
+    with _SERVICE_LOCK:
+        if _SERVICE is not None:
+            return _SERVICE
+
+        if SHEETS_BACKEND == "local":
+            from utils.sheets_stub import LocalSheetsService
+
+            _SERVICE = LocalSheetsService(
+                latency=SHEETS_STUB_LATENCY,
+                error_rate=SHEETS_STUB_ERROR_RATE,
+                on_call=_count_call,
+            )
+            logger.info("🧪 از جایگزین محلی Google Sheets استفاده می‌شود")
+            return _SERVICE
+
+        # بررسی متغیرهای محیطی (فقط وقتی واقعاً به Sheets وصل می‌شویم)
+        if not SHEET_ID or not SERVICE_ACCOUNT_JSON:
+            raise Exception("⚠️ SHEET_ID یا SHEETS_SERVICE_ACCOUNT در Secrets تنظیم نشده!")
+
+        try:
+            creds_info = json.loads(SERVICE_ACCOUNT_JSON)
+            _CREDENTIALS = service_account.Credentials.from_service_account_info(
+                creds_info,
+                scopes=['https://www.googleapis.com/auth/spreadsheets']
+            )
+            _SERVICE = build(
+                'sheets', 'v4',
+                http=google_auth_httplib2.AuthorizedHttp(_CREDENTIALS, http=httplib2.Http()),
+                requestBuilder=_build_request,
+                cache_discovery=False
+            )
+            logger.debug("🔌 سرویس Google Sheets ساخته شد")
+            return _SERVICE
+        except Exception as e:
+            logger.error(f"❌ خطا در اتصال به Google Sheets: {e}")
+            raise
+
+
+def get_api_call_stats(reset=False):
+    """
+    تعداد فراخوانی‌های Sheets API از آخرین reset
+
+    Returns:
+        dict: {نام متد: تعداد، 'total': جمع}
+    """
+    with _API_CALLS_LOCK:
+        stats = dict(API_CALLS)
+        if reset:
+            API_CALLS.clear()
+    stats['total'] = sum(stats.values())
+    return stats
+
 
+# تب‌هایی که در این پروسه وجودشان بررسی شده: عنوان → نسخه هدر
+_TABS_CHECKED = {}
+
+
+def ensure_sheet_tab(title, header):
+    """
+    ساخت تب (اگر وجود ندارد) و نوشتن هدر آن - یک بار در هر پروسه
+
+    Returns:
+        bool: موفقیت
+    """
+    header_version = tuple(header)
+    if _TABS_CHECKED.get(title) == header_version:
+        return True
 
-def ensure_header():
-    """بررسی و ایجاد/آپدیت خودکار هدر"""
     try:
         service = get_sheets_service()
-        result = service.spreadsheets().values().get(
+        meta = service.spreadsheets().get(
             spreadsheetId=SHEET_ID,
-            range='Sheet1!A1:M1'  # ✅ تغییر به 13 ستون
+            fields='sheets(properties(title))'
         ).execute()
+        titles = {sheet['properties']['title'] for sheet in meta.get('sheets', [])}
 
-        existing_values = result.get('values', [])
-        existing_header = existing_values[0] if existing_values else []
-
-        # اگر هدر وجود نداره، بساز
-        if not existing_header:
-            logger.info("📝 هدر وجود ندارد، در حال ساخت...")
-            service.spreadsheets().values().update(
+        if title not in titles:
+            service.spreadsheets().batchUpdate(
                 spreadsheetId=SHEET_ID,
-                range='Sheet1!A1:M1',
-                valueInputOption='RAW',
-                body={'values': [STANDARD_HEADER]}
+                body={'requests': [{'addSheet': {'properties': {'title': title}}}]}
             ).execute()
-            logger.info("✅ هدر جدید ساخته شد (13 ستون)")
-            return True
-
-        # اگر تعداد ستون‌ها درسته
-        if len(existing_header) == len(STANDARD_HEADER):
-            logger.debug("✓ هدر معتبر است (13 ستون)")
-            return True
+            logger.info(f"📝 تب {title} ساخته شد")
 
-        # اگر تعداد ستون‌ها اشتباهه، آپدیت کن
-        logger.warning(f"⚠️ هدر نامعتبر ({len(existing_header)} ستون)")
-        logger.info("🔄 در حال آپدیت هدر...")
         service.spreadsheets().values().update(
             spreadsheetId=SHEET_ID,
-            range='Sheet1!A1:M1',
+            range=f'{title}!A1',
+            valueInputOption='RAW',
+            body={'values': [list(header)]}
+        ).execute()
+
+        _TABS_CHECKED[title] = header_version
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ خطا در ساخت تب {title}: {e}", exc_info=True)
+        return False
+
+
+def append_rows_to_tab(title, header, rows):
+    """
+    افزودن ردیف‌ها به انتهای یک تب جانبی (مثلاً Rollup)
+
+    Returns:
+        bool: موفقیت
+    """
+    if not rows:
+        return True
+
+    try:
+        if not ensure_sheet_tab(title, header):
+            return False
+        get_sheets_service().spreadsheets().values().append(
+            spreadsheetId=SHEET_ID,
+            range=f'{title}!A1',
             valueInputOption='RAW',
-            body={'values': [STANDARD_HEADER]}
+            insertDataOption='INSERT_ROWS',
+            body={'values': rows}
         ).execute()
-        logger.info("✅ هدر آپدیت شد")
+        logger.info(f"✅ {len(rows)} ردیف در تب {title} ذخیره شد")
         return True
 
     except Exception as e:
-        logger.error(f"❌ خطا در بررسی/ساخت هدر: {e}", exc_info=True)
+        logger.error(f"❌ خطا در ذخیره‌سازی در تب {title}: {e}", exc_info=True)
         return False
 
 
+# ════════════════════════════════════════════════════════════════
+# پارتیشن‌های ماهانه
+# ════════════════════════════════════════════════════════════════
+
+
+def sheet_partition(timestamp):
+    """
+    تب ماهانه یک ردیف
+
+    Args:
+        timestamp: 'YYYY-MM-DD ...' (یا date/datetime)
+
+    Returns:
+        tuple: (عنوان تب، ماه شمسی 'YYYY-MM'، اولین و آخرین تاریخ میلادی ماه)
+    """
+    return _partition_of_day(str(timestamp)[:10])
+
+
+@lru_cache(maxsize=512)
+def _partition_of_day(day):
+    day = pd.Timestamp(day).date()
+    j = jdatetime.date.fromgregorian(date=day)
+    month = f"{j.year:04d}-{j.month:02d}"
+    first = jdatetime.date(j.year, j.month, 1).togregorian()
+    if j.month == 12:
+        following = jdatetime.date(j.year + 1, 1, 1).togregorian()
+    else:
+        following = jdatetime.date(j.year, j.month + 1, 1).togregorian()
+    last = following - timedelta(days=1)
+    return (
+        f"{SHEET_PARTITION_PREFIX}-{month}",
+        month,
+        first.strftime('%Y-%m-%d'),
+        last.strftime('%Y-%m-%d'),
+    )
+
+
+def _sheet_properties(service):
+    """عنوان تب → (sheetId، تعداد ردیف‌های grid) با یک درخواست متادیتا"""
+    meta = service.spreadsheets().get(
+        spreadsheetId=SHEET_ID,
+        fields='sheets(properties(sheetId,title,gridProperties(rowCount)))'
+    ).execute()
+    return {
+        sheet['properties']['title']: (
+            sheet['properties'].get('sheetId', 0),
+            sheet['properties'].get('gridProperties', {}).get('rowCount', 0),
+        )
+        for sheet in meta.get('sheets', [])
+    }
+
+
+def load_partitions(service=None, refresh=False):
+    """
+    پارتیشن‌های ثبت‌شده در تب Index (از قدیم به جدید)
+
+    Returns:
+        dict: عنوان تب → {'month', 'start_date', 'end_date', 'sheet_id'}
+    """
+    global _PARTITIONS
+
+    if _PARTITIONS is not None and not refresh:
+        return _PARTITIONS
+
+    service = service or get_sheets_service()
+    try:
+        rows = service.spreadsheets().values().get(
+            spreadsheetId=SHEET_ID,
+            range=f'{SHEET_INDEX_NAME}!A2:E',
+            valueRenderOption='UNFORMATTED_VALUE'
+        ).execute().get('values', [])
+    except HttpError as e:
+        # فقط «تب Index هنوز ساخته نشده» (Sheet قدیمی)؛ خطای شبکه/سهمیه بالا می‌رود
+        # تا یک خطای گذرا برای کل پروسه «بدون پارتیشن» کش نشود
+        if not _is_missing_range(e):
+            raise
+        logger.debug(f"تب {SHEET_INDEX_NAME} وجود ندارد: {e}")
+        rows = []
+
+    partitions = {}
+    for row in sorted((r for r in rows if len(r) >= 5), key=lambda r: str(r[1])):
+        partitions[str(row[0])] = {
+            'month': str(row[1]),
+            'start_date': str(row[2]),
+            'end_date': str(row[3]),
+            'sheet_id': int(row[4]),
+        }
+    _PARTITIONS = partitions
+    return _PARTITIONS
+
+
+def _is_missing_range(error):
+    """آیا خطا یعنی تب/محدوده وجود ندارد؟ (HTTP 400 «Unable to parse range»)"""
+    return error.resp.status == 400 and 'Unable to parse range' in str(error)
+
+
+def _write_index(service, partitions):
+    """
+    بازنویسی تب Index با یک values.batchUpdate (فقط هنگام حذف پارتیشن؛ چند ده ردیف)
+
+    ردیف‌های جدید روی ردیف‌های قبلی نوشته و فقط ردیف‌های اضافه خالی می‌شوند؛ اگر
+    درخواست شکست بخورد Index قبلی دست‌نخورده می‌ماند و هیچ تبی یتیم نمی‌شود.
+    """
+    values = service.spreadsheets().values()
+    existing = len(values.get(
+        spreadsheetId=SHEET_ID,
+        range=f'{SHEET_INDEX_NAME}!A2:A'
+    ).execute().get('values', []))
+
+    rows = [
+        [title, p['month'], p['start_date'], p['end_date'], p['sheet_id']]
+        for title, p in partitions.items()
+    ]
+    rows += [[''] * len(INDEX_HEADER) for _ in range(existing - len(rows))]
+    if not rows:
+        return
+
+    values.batchUpdate(
+        spreadsheetId=SHEET_ID,
+        body={
+            'valueInputOption': 'RAW',
+            'data': [{'range': f'{SHEET_INDEX_NAME}!A2', 'values': rows}],
+        }
+    ).execute()
+
+
+def ensure_partition(timestamp, service=None):
+    """
+    ساخت تب ماهانه یک ردیف (اگر وجود ندارد) و ثبت آن در Index
+
+    Returns:
+        str: عنوان تب
+    """
+    global _PARTITIONS
+
+    title, month, start_date, end_date = sheet_partition(timestamp)
+    service = service or get_sheets_service()
+    partitions = load_partitions(service)
+    if title in partitions:
+        return title
+
+    properties = _sheet_properties(service)
+    if title in properties:
+        # تب قبلاً ساخته شده ولی ثبت Index ناتمام مانده (مثلاً کرش)
+        sheet_id = properties[title][0]
+    else:
+        reply = service.spreadsheets().batchUpdate(
+            spreadsheetId=SHEET_ID,
+            body={'requests': [{'addSheet': {'properties': {'title': title}}}]}
+        ).execute()
+        sheet_id = reply['replies'][0]['addSheet']['properties']['sheetId']
+        _LAST_ROW[title] = 1
+        logger.info(f"📝 تب ماهانه {title} ساخته شد")
+
+    service.spreadsheets().values().update(
+        spreadsheetId=SHEET_ID,
+        range=f'{title}!A1',
+        valueInputOption='RAW',
+        body={'values': [STANDARD_HEADER]}
+    ).execute()
+
+    if not append_rows_to_tab(
+        SHEET_INDEX_NAME, INDEX_HEADER, [[title, month, start_date, end_date, sheet_id]]
+    ):
+        raise RuntimeError(f"ثبت {title} در {SHEET_INDEX_NAME} ناموفق بود")
+
+    partitions[title] = {
+        'month': month, 'start_date': start_date, 'end_date': end_date, 'sheet_id': sheet_id
+    }
+    _PARTITIONS = dict(sorted(partitions.items(), key=lambda item: item[1]['month']))
+    return title
+
+
+def partitions_between(start=None, end=None, service=None):
+    """
+    تب‌های ماهانه‌ای که با بازه [start, end] هم‌پوشانی دارند (از قدیم به جدید)
+
+    Args:
+        start / end: تاریخ 'YYYY-MM-DD...' (None = بدون حد)
+    """
+    start = str(start)[:10] if start is not None else None
+    end = str(end)[:10] if end is not None else None
+    return [
+        title
+        for title, p in load_partitions(service).items()
+        if (start is None or p['end_date'] >= start) and (end is None or p['start_date'] <= end)
+    ]
+
+
 def is_today(date_str):
-    """چک می‌کنه که تاریخ داده شده مال امروز هست یا نه"""
+    """چک می‌کنه که تاریخ داده شده (رشته، Timestamp یا datetime64) مال امروز هست یا نه"""
     try:
         tz = pytz.timezone(TIMEZONE)
         today = datetime.now(tz).strftime('%Y-%m-%d')
-        return date_str == today
+        return str(date_str)[:10] == today
     except:
         return False
 
 
-def save_to_sheets(row_dict):
+def _row_from_range(a1_range):
+    """شماره ردیف انتهای یک محدوده A1 (مثلاً 'Sheet1!A120:M120' → 120)"""
+    match = re.search(r'(\d+)$', a1_range or '')
+    return int(match.group(1)) if match else None
+
+
+def get_last_row(service=None, title=SHEET_NAME):
+    """
+    شماره آخرین ردیف پر در یک تب (هدر = ردیف 1؛ تب ناموجود = 0)
+
+    بار اول از روی متادیتا (تعداد ردیف‌های grid) و خواندن یک پنجره کوچک از
+    ستون A پیدا می‌شود و بعد از آن در حافظه نگه داشته می‌شود، پس هزینه‌اش به
+    تعداد ردیف‌های تب بستگی ندارد.
     """
-    ذخیره یک ردیف جدید در Google Sheet
+    if title in _LAST_ROW:
+        return _LAST_ROW[title]
+
+    service = service or get_sheets_service()
+    grid_rows = _sheet_properties(service).get(title, (None, 0))[1]
+
+    # INSERT_ROWS ردیف‌ها را بعد از داده اضافه می‌کند، پس فقط ردیف‌های خالی
+    # اولیه grid در انتها می‌مانند - از انتها به عقب با پنجره‌های بزرگ‌شونده
+    end = grid_rows
+    window = TAIL_PROBE_ROWS
+    last_row = 0
+    while end >= 1:
+        start = max(1, end - window + 1)
+        values = service.spreadsheets().values().get(
+            spreadsheetId=SHEET_ID,
+            range=f'{title}!A{start}:A{end}'
+        ).execute().get('values', [])
+        # API ردیف‌های خالی انتهایی را برنمی‌گرداند
+        if values:
+            last_row = start + len(values) - 1
+            break
+        end = start - 1
+        window *= 2
+
+    _LAST_ROW[title] = last_row
+    logger.debug(f"📏 آخرین ردیف {title}: {last_row} (grid: {grid_rows})")
+    return last_row
+
+
+def reset_last_row(title=None):
+    """فراموش کردن شماره آخرین ردیف یک تب یا همه تب‌ها (بعد از تغییر ساختار Sheet)"""
+    global _PARTITIONS
+
+    if title is None:
+        _LAST_ROW.clear()
+        _PARTITIONS = None
+    else:
+        _LAST_ROW.pop(title, None)
+
+
+def build_row(row_dict):
+    """
+    ساخت یک ردیف 13 ستونی از داده‌های تیک
     
     Args:
         row_dict: دیکشنری حاوی داده‌های یک ردیف با کلیدهای زیر:
@@ -123,199 +524,473 @@ def save_to_sheets(row_dict):
             - sarane_forosh_w: سرانه فروش
             - ekhtelaf_sarane_w: اختلاف سرانه
             - pol_hagigi: ✅ پول حقیقی (میلیارد تومان)
+
+    Returns:
+        list: ردیف 13 عنصری (timestamp رشته‌ای + مقادیر عددی)
+    """
+    tz = pytz.timezone(TIMEZONE)
+    timestamp = datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
+
+    # بررسی تاریخ شمش
+    shams_change = row_dict['shams_change']
+    shams_date = row_dict.get('shams_date', None)
+
+    if shams_date and not is_today(shams_date):
+        logger.warning(f"⚠️ داده شمش مال امروز نیست (تاریخ: {shams_date})")
+        shams_change = 0.0
+
+    # ✅ float() برای مقادیر NumPy (float32) که JSON نمی‌شوند
+    return [
+        timestamp,
+        round(float(row_dict['gold_price']), 2),
+        int(row_dict['dollar_price']),
+        int(row_dict['shams_price']),
+        round(float(row_dict['dollar_change']), 2),
+        round(float(shams_change), 2),
+        round(float(row_dict['fund_change_weighted']), 2),
+        round(float(row_dict.get('fund_final_price_avg', 0)), 2),
+        round(float(row_dict['fund_bubble_weighted']), 2),
+        round(float(row_dict['sarane_kharid_w']), 2),
+        round(float(row_dict['sarane_forosh_w']), 2),
+        round(float(row_dict['ekhtelaf_sarane_w']), 2),
+        round(float(row_dict.get('pol_hagigi', 0)), 2)  # ✅ پول حقیقی
+    ]
+
+
+def append_rows_to_sheet(rows):
     """
+    افزودن چند ردیف آماده به انتهای تب ماهانه خودشان (یک append برای هر تب)
+
+    Returns:
+        bool: موفقیت
+    """
+    if not rows:
+        return True
+
     try:
-        ensure_header()
         service = get_sheets_service()
-        tz = pytz.timezone(TIMEZONE)
-        timestamp = datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
-
-        # بررسی تاریخ شمش
-        shams_change = row_dict['shams_change']
-        shams_date = row_dict.get('shams_date', None)
-
-        if shams_date and not is_today(shams_date):
-            logger.warning(f"⚠️ داده شمش مال امروز نیست (تاریخ: {shams_date})")
-            shams_change = 0.0
-
-        # ساخت ردیف جدید (13 ستونی)
-        new_row = [
-            timestamp,
-            round(row_dict['gold_price'], 2),
-            int(row_dict['dollar_price']),
-            int(row_dict['shams_price']),
-            round(row_dict['dollar_change'], 2),
-            round(shams_change, 2),
-            round(row_dict['fund_change_weighted'], 2),
-            round(row_dict.get('fund_final_price_avg', 0), 2),
-            round(row_dict['fund_bubble_weighted'], 2),
-            round(row_dict['sarane_kharid_w'], 2),
-            round(row_dict['sarane_forosh_w'], 2),
-            round(row_dict['ekhtelaf_sarane_w'], 2),
-            round(row_dict.get('pol_hagigi', 0), 2)  # ✅ پول حقیقی
-        ]
 
-        # ذخیره در Sheet
-        service.spreadsheets().values().append(
-            spreadsheetId=SHEET_ID,
-            range='Sheet1!A:M',  # ✅ تغییر به 13 ستون
-            valueInputOption='RAW',
-            insertDataOption='INSERT_ROWS',
-            body={'values': [new_row]}
-        ).execute()
+        # ردیف‌ها به ترتیب زمان‌اند → گروه‌های متوالی هم‌ماه
+        groups = []
+        for row in rows:
+            title = sheet_partition(row[0])[0]
+            if groups and groups[-1][0] == title:
+                groups[-1][1].append(row)
+            else:
+                groups.append((title, [row]))
+
+        for title, group in groups:
+            ensure_partition(group[0][0], service)
+            result = service.spreadsheets().values().append(
+                spreadsheetId=SHEET_ID,
+                range=f'{title}!A:M',
+                valueInputOption='RAW',
+                insertDataOption='INSERT_ROWS',
+                body={'values': group}
+            ).execute()
+
+            # ✅ پاسخ append محدوده نوشته‌شده را برمی‌گرداند → انتهای تب بدون درخواست اضافه
+            last_row = _row_from_range(result.get('updates', {}).get('updatedRange'))
+            if last_row:
+                _LAST_ROW[title] = last_row
+
+            if len(group) == 1:
+                logger.info(f"✅ داده در {title} ذخیره شد: {group[0][0]}")
+            else:
+                logger.info(f"✅ {len(group)} ردیف در {title} ذخیره شد: {group[0][0]} تا {group[-1][0]}")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ خطا در ذخیره‌سازی در Google Sheet: {e}", exc_info=True)
+        return False
+
 
-        logger.info(f"✅ داده در Sheet ذخیره شد: {timestamp}")
+def append_row_to_sheet(row):
+    """افزودن یک ردیف آماده به انتهای Sheet"""
+    return append_rows_to_sheet([row])
 
+
+def save_to_sheets(row_dict):
+    """ذخیره یک ردیف جدید مستقیماً در Google Sheet (کلیدها مانند build_row)"""
+    try:
+        append_row_to_sheet(build_row(row_dict))
     except Exception as e:
         logger.error(f"❌ خطا در ذخیره‌سازی در Google Sheet: {e}", exc_info=True)
 
 
+def parse_sheet_timestamps(values):
+    """رشته‌های 'YYYY-MM-DD HH:MM:SS' یا شماره سریال Sheets → datetime64 (نامعتبر = NaT)"""
+    raw_time = pd.Series(values, dtype=object)
+    serial = pd.to_numeric(raw_time, errors='coerce')
+    parsed = pd.to_datetime(raw_time.where(serial.isna()), format='ISO8601', errors='coerce')
+    from_serial = (SERIAL_EPOCH + pd.to_timedelta(serial, unit='D')).dt.round('s')
+    return parsed.fillna(from_serial)
+
+
+def complete_row(row):
+    """
+    ردیف خوانده‌شده از Sheet با 13 ستون، یا None اگر نامعتبر باشد
+
+    API خانه‌های خالی انتهای ردیف را برنمی‌گرداند، پس ردیفی که مثلاً pol_hagigi
+    آن خالی (NaN) است کوتاه‌تر از 13 می‌رسد؛ این خانه‌ها با "" پر می‌شوند.
+    """
+    if not MIN_ROW_COLUMNS <= len(row) <= len(STANDARD_HEADER) or row[0] == '':
+        return None
+    return list(row) + [''] * (len(STANDARD_HEADER) - len(row))
+
+
+def _complete_rows(rows):
+    return [row for row in map(complete_row, rows) if row is not None]
+
+
+def parse_sheet_rows(rows):
+    """
+    تبدیل ردیف‌های خام Sheet به دیتافریم نوع‌دار (یک بار و برداری)
+
+    timestamp ممکن است رشته (ردیف‌های RAW) یا شماره سریال تاریخ Sheets باشد؛
+    هر دو با یک فراخوانی برداری به datetime64 تبدیل می‌شوند. بقیه ستون‌ها float64
+    (خانه خالی = NaN).
+
+    Args:
+        rows: ردیف‌های 13 ستونی (UNFORMATTED_VALUE)
+
+    Returns:
+        DataFrame: ستون‌های STANDARD_HEADER
+    """
+    df = pd.DataFrame([row[:13] for row in rows], columns=STANDARD_HEADER)
+    if df.empty:
+        return df.astype({col: 'float64' for col in STANDARD_HEADER[1:]}).astype(
+            {'timestamp': 'datetime64[ns]'}
+        )
+
+    df['timestamp'] = parse_sheet_timestamps(df['timestamp'])
+
+    numeric = df[STANDARD_HEADER[1:]].replace('', None)
+    df[STANDARD_HEADER[1:]] = numeric.apply(pd.to_numeric, errors='coerce').astype('float64')
+    return df
+
+
+def _read_tail(service, title, limit):
+    """
+    خواندن limit ردیف معتبر آخر یک تب
+
+    Returns:
+        tuple: (ردیف‌های معتبر از قدیم به جدید، تعداد ردیف‌های نامعتبر)
+    """
+    last_row = get_last_row(service, title)
+
+    # ✅ فقط limit ردیف آخر دانلود می‌شود (A{start}:M{end})؛ اگر ردیف نامعتبر
+    # بین آن‌ها بود، به اندازه کمبود به عقب‌تر می‌رویم
+    valid_rows = []
+    invalid_count = 0
+    end = last_row
+    while end >= 2 and len(valid_rows) < limit:
+        start = max(2, end - (limit - len(valid_rows)) + 1)
+        # ✅ مقادیر بدون فرمت: عدد به صورت عدد، تاریخ به صورت شماره سریال
+        result = service.spreadsheets().values().get(
+            spreadsheetId=SHEET_ID,
+            range=f'{title}!A{start}:M{end}',
+            valueRenderOption='UNFORMATTED_VALUE',
+            dateTimeRenderOption='SERIAL_NUMBER'
+        ).execute()
+        chunk = result.get('values', [])
+        # ردیف‌های خالی انتهایی در پاسخ نیستند
+        chunk += [[] for _ in range(end - start + 1 - len(chunk))]
+
+        # فقط ردیف‌های معتبر (خانه‌های خالی انتهایی تا 13 ستون پر می‌شوند)
+        valid_chunk = _complete_rows(chunk)
+        invalid_count += len(chunk) - len(valid_chunk)
+        valid_rows = valid_chunk + valid_rows
+        end = start - 1
+
+    return valid_rows, invalid_count
+
+
 def read_from_sheets(limit=1000):
     """
-    خواندن داده‌ها از Google Sheet
-    
+    خواندن آخرین ردیف‌ها از Google Sheet
+
+    از جدیدترین تب ماهانه شروع می‌کند و فقط اگر ردیف کم بود سراغ ماه‌های قبل
+    (و در آخر Sheet1 قدیمی) می‌رود.
+
     Args:
         limit: حداکثر تعداد ردیف‌های برگشتی (پیش‌فرض 1000)
     
     Returns:
-        list: لیستی از ردیف‌ها (هر ردیف یک لیست 13 عنصری)
+        DataFrame: ستون‌های STANDARD_HEADER؛ timestamp از نوع datetime و بقیه float64
     """
     try:
-        ensure_header()
         service = get_sheets_service()
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SHEET_ID,
-            range='Sheet1!A:M'  # ✅ تغییر به 13 ستون
-        ).execute()
+        titles = list(reversed(list(load_partitions(service)))) + [SHEET_NAME]
 
-        values = result.get('values', [])
-        if not values:
+        valid_rows = []
+        invalid_count = 0
+        for title in titles:
+            if len(valid_rows) >= limit:
+                break
+            rows, invalid = _read_tail(service, title, limit - len(valid_rows))
+            valid_rows = rows + valid_rows
+            invalid_count += invalid
+
+        if invalid_count:
+            logger.warning(f"⚠️ {invalid_count} ردیف نامعتبر نادیده گرفته شد")
+
+        if not valid_rows:
             logger.warning("⚠️ Sheet خالی است")
-            return []
+        else:
+            logger.info(f"✅ {len(valid_rows)} ردیف از Sheet خوانده شد")
+        return parse_sheet_rows(valid_rows)
 
-        # حذف هدر (ردیف اول)
-        data_rows = values[1:]
+    except Exception as e:
+        logger.error(f"❌ خطا در خواندن از Google Sheet: {e}", exc_info=True)
+        return parse_sheet_rows([])
 
-        # فقط ردیف‌های معتبر (13 ستونی)
-        valid_rows = [row for row in data_rows if len(row) == 13]
 
-        if len(valid_rows) < len(data_rows):
-            invalid_count = len(data_rows) - len(valid_rows)
-            logger.warning(f"⚠️ {invalid_count} ردیف نامعتبر نادیده گرفته شد")
+def _read_tab(service, title):
+    """همه ردیف‌های معتبر یک تب (UNFORMATTED_VALUE)"""
+    last_row = get_last_row(service, title)
+    if last_row <= 1:
+        return []
+    rows = service.spreadsheets().values().get(
+        spreadsheetId=SHEET_ID,
+        range=f'{title}!A2:M{last_row}',
+        valueRenderOption='UNFORMATTED_VALUE',
+        dateTimeRenderOption='SERIAL_NUMBER'
+    ).execute().get('values', [])
+    return _complete_rows(rows)
 
-        # محدود کردن به limit آخرین ردیف
-        if len(valid_rows) > limit:
-            valid_rows = valid_rows[-limit:]
 
-        logger.info(f"✅ {len(valid_rows)} ردیف از Sheet خوانده شد")
-        return valid_rows
+def read_sheet_range(start=None, end=None):
+    """
+    ردیف‌های بازه [start, end] از Google Sheet - فقط تب‌های ماهانه هم‌پوشان خوانده می‌شوند
+
+    Args:
+        start / end: 'YYYY-MM-DD' یا 'YYYY-MM-DD HH:MM:SS' (هر دو شامل؛ None = بدون حد)
+
+    Returns:
+        DataFrame: ستون‌های STANDARD_HEADER
+    """
+    try:
+        service = get_sheets_service()
+        partitions = load_partitions(service)
+        titles = partitions_between(start, end, service)
+
+        # ردیف‌های قبل از اولین پارتیشن فقط در Sheet1 قدیمی هستند
+        oldest = next(iter(partitions.values()), None)
+        if oldest is None or (start is None or str(start)[:10] < oldest['start_date']):
+            titles = [SHEET_NAME] + titles
+
+        rows = []
+        for title in titles:
+            rows.extend(_read_tab(service, title))
+
+        df = parse_sheet_rows(rows)
+        if start is not None:
+            df = df[df['timestamp'] >= pd.Timestamp(str(start))]
+        if end is not None:
+            end = str(end)
+            if len(end) == 10:  # تاریخ تنها = کل آن روز
+                df = df[df['timestamp'] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+            else:
+                df = df[df['timestamp'] <= pd.Timestamp(end)]
+        return df.reset_index(drop=True)
 
     except Exception as e:
-        logger.error(f"❌ خطا در خواندن از Google Sheet: {e}", exc_info=True)
-        return []
+        logger.error(f"❌ خطا در خواندن بازه از Google Sheet: {e}", exc_info=True)
+        return parse_sheet_rows([])
 
 
 def clear_old_data(keep_days=None):
-    """پاک کردن داده‌های قدیمی‌تر از X روز"""
+    """
+    آرشیو و سپس حذف داده‌های قدیمی‌تر از X روز
+
+    تب‌های ماهانه‌ای که کل ماهشان قبل از مرز است آرشیو و با یک deleteSheet حذف
+    می‌شوند (بدون حذف ردیف به ردیف). ردیف‌های Sheet1 قدیمی مثل قبل بریده می‌شوند.
+    """
     if keep_days is None:
         keep_days = KEEP_DAYS
 
     try:
         service = get_sheets_service()
         tz = pytz.timezone(TIMEZONE)
-        cutoff_date = datetime.now(tz) - timedelta(days=keep_days)
+        cutoff = (datetime.now(tz) - timedelta(days=keep_days)).replace(tzinfo=None)
 
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SHEET_ID,
-            range='Sheet1!A:M'
-        ).execute()
+        partitions = load_partitions(service, refresh=True)
+        expired = [
+            title for title, p in partitions.items()
+            if p['end_date'] < cutoff.strftime('%Y-%m-%d')
+        ]
 
-        values = result.get('values', [])
-        if len(values) <= 1:
-            logger.info("ℹ️ داده‌ای برای پاکسازی وجود ندارد")
-            return
+        if expired:
+            # ✅ اول آرشیو؛ اگر نوشتن فایل Parquet شکست بخورد چیزی حذف نمی‌شود
+            for title in expired:
+                archived = archive_frame(parse_sheet_rows(_read_tab(service, title)))
+                logger.info(f"📦 {archived} ردیف از {title} آرشیو شد")
 
-        first_valid_row = 2
-        for i, row in enumerate(values[1:], start=2):
-            if not row or len(row) < 1:
-                continue
-            try:
-                row_date = datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S')
-                row_date = tz.localize(row_date)
-                if row_date >= cutoff_date:
-                    first_valid_row = i
-                    break
-            except:
-                continue
-
-        if first_valid_row > 2:
-            rows_to_delete = first_valid_row - 2
+            properties = _sheet_properties(service)
             service.spreadsheets().batchUpdate(
                 spreadsheetId=SHEET_ID,
-                body={
-                    'requests': [{
-                        'deleteDimension': {
-                            'range': {
-                                'sheetId': 0,
-                                'dimension': 'ROWS',
-                                'startIndex': 1,
-                                'endIndex': first_valid_row - 1
-                            }
-                        }
-                    }]
-                }
+                body={'requests': [
+                    {'deleteSheet': {'sheetId': properties[title][0]}}
+                    for title in expired if title in properties
+                ]}
             ).execute()
-            logger.info(f"🗑️ {rows_to_delete} ردیف قدیمی پاک شد")
-        else:
-            logger.info("✅ داده قدیمی برای پاک کردن پیدا نشد")
+
+            remaining = {t: p for t, p in partitions.items() if t not in expired}
+            _write_index(service, remaining)
+            load_partitions(service, refresh=True)
+            for title in expired:
+                _LAST_ROW.pop(title, None)
+            logger.info(f"🗑️ {len(expired)} تب ماهانه قدیمی حذف شد: {', '.join(expired)}")
+
+        _trim_legacy_sheet(service, pd.Timestamp(cutoff))
 
     except Exception as e:
         logger.error(f"❌ خطا در پاک‌سازی: {e}", exc_info=True)
 
 
-def clear_invalid_rows():
-    """پاک کردن ردیف‌هایی که 13 ستون ندارن"""
+def _trim_legacy_sheet(service, cutoff):
+    """آرشیو و حذف ردیف‌های قدیمی Sheet1 (ساختار تک‌تب قبلی)"""
+    properties = _sheet_properties(service)
+    if SHEET_NAME not in properties or get_last_row(service, SHEET_NAME) <= 1:
+        return
+
+    # ✅ فقط ستون timestamp برای پیدا کردن مرز (تبدیل برداری، بدون strptime)
+    result = service.spreadsheets().values().get(
+        spreadsheetId=SHEET_ID,
+        range=f'{SHEET_NAME}!A:A',
+        valueRenderOption='UNFORMATTED_VALUE',
+        dateTimeRenderOption='SERIAL_NUMBER'
+    ).execute()
+
+    cells = result.get('values', [])
+    if len(cells) <= 1:
+        return
+
+    timestamps = parse_sheet_timestamps([cell[0] if cell else None for cell in cells[1:]])
+    recent = (timestamps >= cutoff).to_numpy()
+    first_valid_row = int(recent.argmax()) + 2 if recent.any() else len(cells) + 1
+
+    if first_valid_row <= 2:
+        logger.info(f"✅ داده قدیمی در {SHEET_NAME} برای پاک کردن پیدا نشد")
+        return
+
+    rows_to_delete = first_valid_row - 2
+
+    expired = service.spreadsheets().values().get(
+        spreadsheetId=SHEET_ID,
+        range=f'{SHEET_NAME}!A2:M{first_valid_row - 1}',
+        valueRenderOption='UNFORMATTED_VALUE',
+        dateTimeRenderOption='SERIAL_NUMBER'
+    ).execute().get('values', [])
+    archived = archive_frame(parse_sheet_rows(_complete_rows(expired)))
+    logger.info(f"📦 {archived} ردیف قدیمی {SHEET_NAME} آرشیو شد")
+
+    service.spreadsheets().batchUpdate(
+        spreadsheetId=SHEET_ID,
+        body={
+            'requests': [{
+                'deleteDimension': {
+                    'range': {
+                        'sheetId': properties[SHEET_NAME][0],
+                        'dimension': 'ROWS',
+                        'startIndex': 1,
+                        'endIndex': first_valid_row - 1
+                    }
+                }
+            }]
+        }
+    ).execute()
+    if SHEET_NAME in _LAST_ROW:
+        _LAST_ROW[SHEET_NAME] -= rows_to_delete
+    logger.info(f"🗑️ {rows_to_delete} ردیف قدیمی از {SHEET_NAME} پاک شد")
+
+
+def _merge_runs(indices):
+    """ادغام شماره ردیف‌های متوالی به بازه‌های [start, end)"""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+    return runs
+
+
+def clear_invalid_rows(chunk_rows=None, title=None):
+    """
+    پاک کردن ردیف‌های نامعتبر (complete_row: بدون timestamp و قیمت‌ها یا بیش از 13 ستون)
+
+    تب به صورت تکه‌ای خوانده می‌شود و فقط ردیف‌های نامعتبر (بازه‌های متوالی
+    ادغام‌شده) با یک batchUpdate حذف می‌شوند؛ ردیف‌های معتبر دست نمی‌خورند.
+
+    Args:
+        chunk_rows: تعداد ردیف در هر خواندن (پیش‌فرض CLEANUP_CHUNK_ROWS)
+        title: تب (پیش‌فرض جدیدترین تب ماهانه، یا Sheet1 اگر پارتیشنی نیست)
+    """
+    chunk_rows = chunk_rows or CLEANUP_CHUNK_ROWS
+
     try:
         service = get_sheets_service()
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SHEET_ID,
-            range='Sheet1!A:M'
-        ).execute()
+        partitions = load_partitions(service)
+        if title is None:
+            title = next(reversed(partitions), SHEET_NAME)
+        # ✅ sheetId واقعی تب (Sheet1 حذف‌شده ممکن است sheetId صفر نداشته باشد)
+        properties = _sheet_properties(service)
+        if title not in properties:
+            logger.warning(f"⚠️ تب {title} وجود ندارد")
+            return
+        sheet_id = properties[title][0]
 
-        values = result.get('values', [])
-        if len(values) <= 1:
+        last_row = get_last_row(service, title)
+        if last_row <= 1:
             logger.info("ℹ️ فقط هدر وجود دارد")
             return
 
-        header = values[0]
-        valid_rows = [header]
-        invalid_count = 0
-
-        for row in values[1:]:
-            if len(row) == 13:
-                valid_rows.append(row)
-            else:
-                invalid_count += 1
-
-        if invalid_count == 0:
+        # شماره ردیف‌های نامعتبر (0-based، همان اندیس deleteDimension)
+        invalid = []
+        for start in range(2, last_row + 1, chunk_rows):
+            end = min(start + chunk_rows - 1, last_row)
+            chunk = service.spreadsheets().values().get(
+                spreadsheetId=SHEET_ID,
+                range=f'{title}!A{start}:M{end}'
+            ).execute().get('values', [])
+            # ردیف‌های خالی انتهایی تکه در پاسخ نیستند
+            chunk += [[] for _ in range(end - start + 1 - len(chunk))]
+            invalid.extend(
+                start - 1 + offset for offset, row in enumerate(chunk) if complete_row(row) is None
+            )
+
+        if not invalid:
             logger.info("✅ همه ردیف‌ها معتبرند")
             return
 
-        logger.info(f"🧹 در حال پاکسازی {invalid_count} ردیف نامعتبر...")
+        runs = _merge_runs(invalid)
+        logger.info(f"🧹 در حال پاکسازی {len(invalid)} ردیف نامعتبر در {len(runs)} بازه...")
 
-        service.spreadsheets().values().clear(
-            spreadsheetId=SHEET_ID,
-            range='Sheet1!A:M'
-        ).execute()
-
-        service.spreadsheets().values().update(
+        # ✅ از پایین به بالا تا حذف هر بازه اندیس بازه‌های قبلی را جابجا نکند
+        service.spreadsheets().batchUpdate(
             spreadsheetId=SHEET_ID,
-            range='Sheet1!A:M',
-            valueInputOption='RAW',
-            body={'values': valid_rows}
+            body={
+                'requests': [
+                    {
+                        'deleteDimension': {
+                            'range': {
+                                'sheetId': sheet_id,
+                                'dimension': 'ROWS',
+                                'startIndex': run_start,
+                                'endIndex': run_end
+                            }
+                        }
+                    }
+                    for run_start, run_end in reversed(runs)
+                ]
+            }
         ).execute()
 
-        logger.info(f"✅ {invalid_count} ردیف نامعتبر پاک شد")
+        if title in _LAST_ROW:
+            _LAST_ROW[title] -= len(invalid)
+        logger.info(f"✅ {len(invalid)} ردیف نامعتبر از {title} پاک شد")
 
     except Exception as e:
         logger.error(f"❌ خطا در پاکسازی: {e}", exc_info=True)
@@ -324,16 +999,14 @@ def clear_invalid_rows():
 def get_sheet_stats():
     """دریافت آمار Sheet"""
     try:
-        rows = read_from_sheets(limit=10000)
-        if not rows:
+        df = read_from_sheets(limit=10000)
+        if df.empty:
             return {"total_rows": 0, "oldest": None, "newest": None}
 
-        timestamps = [row[0] for row in rows if len(row) > 0]
-
         return {
-            "total_rows": len(rows),
-            "oldest": timestamps[0] if timestamps else None,
-            "newest": timestamps[-1] if timestamps else None,
+            "total_rows": len(df),
+            "oldest": df['timestamp'].iloc[0].strftime('%Y-%m-%d %H:%M:%S'),
+            "newest": df['timestamp'].iloc[-1].strftime('%Y-%m-%d %H:%M:%S'),
         }
     except Exception as e:
         logger.error(f"❌ خطا در دریافت آمار: {e}")
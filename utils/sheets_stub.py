@@ -0,0 +1,402 @@
+# utils/sheets_stub.py
+"""
+جایگزین محلی Google Sheets API برای اجرای آفلاین، تست بار و بنچمارک
+
+همان زنجیره فراخوانی کتابخانه googleapiclient را پیاده می‌کند:
+    service.spreadsheets().get(...)
+    service.spreadsheets().batchUpdate(...)      (deleteDimension، addSheet، deleteSheet)
+    service.spreadsheets().values().get/append/update/batchUpdate/clear(...)
+و هر درخواست با .execute() اجرا می‌شود. داده‌ها در حافظه پروسه هستند.
+
+با SHEETS_BACKEND=local، get_sheets_service در sheets_storage همین سرویس را
+برمی‌گرداند. تأخیر و خطای مصنوعی برای سناریوهای قطعی قابل تنظیم است.
+"""
+
+import re
+import json
+import time
+import random
+import threading
+from collections import Counter
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+_A1_CELL = re.compile(r"^([A-Z]*)(\d*)$")
+
+DEFAULT_GRID_ROWS = 1000
+DEFAULT_GRID_COLUMNS = 26
+
+
+def _column_index(letters):
+    """'A' → 0، 'M' → 12، 'AA' → 26"""
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord("A") + 1)
+    return index - 1
+
+
+def _column_letters(index):
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def _format_value(value):
+    """نمایش FORMATTED_VALUE: اعداد به شکل رشته (مثل رابط Sheets)"""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def _trim(rows):
+    """حذف خانه‌های خالی انتهای هر ردیف و ردیف‌های خالی انتهایی (مثل پاسخ API)"""
+    trimmed = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] in ("", None):
+            row.pop()
+        trimmed.append(row)
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+
+class _Request:
+    """معادل HttpRequest: کار فقط با execute() انجام می‌شود"""
+
+    def __init__(self, service, method_id, fn):
+        self._service = service
+        self.methodId = method_id
+        self._fn = fn
+
+    def execute(self, *args, **kwargs):
+        return self._service._call(self.methodId, self._fn)
+
+
+class _Sheet:
+    def __init__(self, sheet_id, title, grid_rows=DEFAULT_GRID_ROWS):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.rows = []
+        self.grid_rows = grid_rows
+
+    @property
+    def last_row(self):
+        """تعداد ردیف‌ها تا آخرین ردیف غیرخالی"""
+        n = len(self.rows)
+        while n and not any(cell not in ("", None) for cell in self.rows[n - 1]):
+            n -= 1
+        return n
+
+
+class _Values:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId, range, valueRenderOption="FORMATTED_VALUE",
+            dateTimeRenderOption="SERIAL_NUMBER", majorDimension="ROWS"):
+        return _Request(
+            self._service,
+            "sheets.spreadsheets.values.get",
+            lambda: self._service._get_values(range, valueRenderOption),
+        )
+
+    def append(self, spreadsheetId, range, valueInputOption, body,
+               insertDataOption="OVERWRITE", **kwargs):
+        return _Request(
+            self._service,
+            "sheets.spreadsheets.values.append",
+            lambda: self._service._append(range, body.get("values", []), insertDataOption),
+        )
+
+    def update(self, spreadsheetId, range, valueInputOption, body, **kwargs):
+        return _Request(
+            self._service,
+            "sheets.spreadsheets.values.update",
+            lambda: self._service._update(range, body.get("values", [])),
+        )
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(
+            self._service,
+            "sheets.spreadsheets.values.batchUpdate",
+            lambda: [
+                self._service._update(item["range"], item.get("values", []))
+                for item in body.get("data", [])
+            ],
+        )
+
+    def clear(self, spreadsheetId, range, body=None):
+        return _Request(
+            self._service,
+            "sheets.spreadsheets.values.clear",
+            lambda: self._service._clear(range),
+        )
+
+
+class _Spreadsheets:
+    def __init__(self, service):
+        self._service = service
+
+    def values(self):
+        return _Values(self._service)
+
+    def get(self, spreadsheetId, fields=None, **kwargs):
+        return _Request(
+            self._service, "sheets.spreadsheets.get", self._service._metadata
+        )
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(
+            self._service,
+            "sheets.spreadsheets.batchUpdate",
+            lambda: self._service._batch_update(body.get("requests", [])),
+        )
+
+
+class LocalSheetsService:
+    """
+    یک spreadsheet در حافظه
+
+    Args:
+        latency: تأخیر ثابت هر درخواست (ثانیه)
+        jitter: تأخیر تصادفی اضافه (0 تا jitter ثانیه)
+        error_rate: احتمال شکست هر درخواست با HttpError
+        error_status: کد HTTP خطاهای تصادفی (مثلاً 429 یا 503)
+        seed: seed تولید عدد تصادفی (برای سناریوهای تکرارپذیر)
+        on_call: تابعی که با نام متد هر درخواست اجراشده صدا زده می‌شود
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 seed=None, on_call=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.on_call = on_call
+
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._sheets = [_Sheet(0, "Sheet1")]
+        self._forced_failures = []
+        self._fail_after = 0
+
+        self.calls = Counter()
+        self.cells_read = 0
+        self.cells_written = 0
+
+    # ────────────────── رابط googleapiclient ──────────────────
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    # ────────────────── ابزار سناریو ──────────────────
+
+    def load_rows(self, rows, title="Sheet1", trailing_empty=0):
+        """پر کردن مستقیم یک تب (بدون شمارش درخواست)؛ trailing_empty ردیف خالی grid"""
+        with self._lock:
+            sheet = self._sheet(title, create=True)
+            sheet.rows = [list(row) for row in rows]
+            sheet.grid_rows = len(sheet.rows) + trailing_empty
+
+    def rows(self, title="Sheet1"):
+        """کپی ردیف‌های یک تب (خانه‌های خالی انتهایی حذف‌شده)"""
+        with self._lock:
+            return _trim(self._sheet(title).rows)
+
+    def fail_next(self, count=1, status=503, after=0):
+        """شکست count درخواست با کد status، بعد از after درخواست موفق"""
+        with self._lock:
+            self._forced_failures.extend([status] * count)
+            self._fail_after = after
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.cells_read = 0
+            self.cells_written = 0
+
+    @property
+    def requests(self):
+        return sum(self.calls.values())
+
+    # ────────────────── داخلی ──────────────────
+
+    def _call(self, method_id, fn):
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        with self._lock:
+            self.calls[method_id] += 1
+            if self.on_call:
+                self.on_call(method_id)
+
+            status = None
+            if self._forced_failures and self._fail_after:
+                self._fail_after -= 1
+            elif self._forced_failures:
+                status = self._forced_failures.pop(0)
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status = self.error_status
+            if status is not None:
+                content = json.dumps(
+                    {"error": {"code": status, "message": "injected failure"}}
+                ).encode()
+                raise HttpError(httplib2.Response({"status": status}), content)
+
+            return fn()
+
+    def _sheet(self, title=None, sheet_id=None, create=False):
+        for sheet in self._sheets:
+            if (title is not None and sheet.title == title) or (
+                sheet_id is not None and sheet.sheet_id == sheet_id
+            ):
+                return sheet
+        if title is None and sheet_id is None:
+            return self._sheets[0]
+        if create and title is not None:
+            sheet = _Sheet(max(s.sheet_id for s in self._sheets) + 1, title)
+            self._sheets.append(sheet)
+            return sheet
+        raise self._error(400, f"Unable to parse range: {title or sheet_id}")
+
+    @staticmethod
+    def _error(status, message):
+        content = json.dumps({"error": {"code": status, "message": message}}).encode()
+        return HttpError(httplib2.Response({"status": status}), content)
+
+    def _parse_range(self, a1_range):
+        """'Sheet1!A2:M10' → (sheet، ردیف شروع، ردیف پایان یا None، ستون شروع، ستون پایان)"""
+        title, _, cells = a1_range.rpartition("!")
+        sheet = self._sheet(title.strip("'") or None)
+        first, _, last = cells.partition(":")
+        first_col, first_row = _A1_CELL.match(first).groups()
+        if last:
+            last_col, last_row = _A1_CELL.match(last).groups()
+        else:
+            last_col, last_row = first_col, first_row
+
+        start_row = int(first_row) if first_row else 1
+        end_row = int(last_row) if last_row else None
+        start_col = _column_index(first_col) if first_col else 0
+        end_col = _column_index(last_col) if last_col else DEFAULT_GRID_COLUMNS - 1
+        return sheet, start_row, end_row, start_col, end_col
+
+    def _get_values(self, a1_range, render):
+        sheet, start_row, end_row, start_col, end_col = self._parse_range(a1_range)
+        end_row = min(end_row or sheet.grid_rows, len(sheet.rows))
+        rows = _trim(
+            [row[start_col:end_col + 1] for row in sheet.rows[start_row - 1:end_row]]
+        )
+        if render == "FORMATTED_VALUE":
+            rows = [[_format_value(v) for v in row] for row in rows]
+
+        self.cells_read += sum(len(row) for row in rows)
+        result = {"range": a1_range, "majorDimension": "ROWS"}
+        if rows:
+            result["values"] = rows
+        return result
+
+    def _write(self, sheet, start_row, start_col, values):
+        needed = start_row - 1 + len(values)
+        while len(sheet.rows) < needed:
+            sheet.rows.append([])
+        sheet.grid_rows = max(sheet.grid_rows, needed)
+        for offset, row in enumerate(values):
+            target = sheet.rows[start_row - 1 + offset]
+            if len(target) < start_col + len(row):
+                target.extend([""] * (start_col + len(row) - len(target)))
+            target[start_col:start_col + len(row)] = list(row)
+        self.cells_written += sum(len(row) for row in values)
+
+    def _updated_range(self, sheet, start_row, start_col, values):
+        width = max((len(row) for row in values), default=1)
+        return (
+            f"{sheet.title}!{_column_letters(start_col)}{start_row}:"
+            f"{_column_letters(start_col + width - 1)}{start_row + len(values) - 1}"
+        )
+
+    def _append(self, a1_range, values, insert_option):
+        sheet, _, _, start_col, _ = self._parse_range(a1_range)
+        start_row = sheet.last_row + 1
+        del sheet.rows[start_row - 1:]
+        if insert_option == "INSERT_ROWS":
+            sheet.grid_rows += len(values)
+        self._write(sheet, start_row, start_col, values)
+        return {
+            "tableRange": f"{sheet.title}!A1:{_column_letters(start_col)}{start_row - 1}",
+            "updates": {
+                "updatedRange": self._updated_range(sheet, start_row, start_col, values),
+                "updatedRows": len(values),
+                "updatedCells": sum(len(row) for row in values),
+            },
+        }
+
+    def _update(self, a1_range, values):
+        sheet, start_row, _, start_col, _ = self._parse_range(a1_range)
+        self._write(sheet, start_row, start_col, values)
+        return {
+            "updatedRange": self._updated_range(sheet, start_row, start_col, values),
+            "updatedRows": len(values),
+            "updatedCells": sum(len(row) for row in values),
+        }
+
+    def _clear(self, a1_range):
+        sheet, start_row, end_row, start_col, end_col = self._parse_range(a1_range)
+        end_row = min(end_row or len(sheet.rows), len(sheet.rows))
+        for row in sheet.rows[start_row - 1:end_row]:
+            for col in range(start_col, min(end_col + 1, len(row))):
+                row[col] = ""
+        return {"clearedRange": a1_range}
+
+    def _metadata(self):
+        return {
+            "sheets": [
+                {
+                    "properties": {
+                        "sheetId": sheet.sheet_id,
+                        "title": sheet.title,
+                        "gridProperties": {
+                            "rowCount": sheet.grid_rows,
+                            "columnCount": DEFAULT_GRID_COLUMNS,
+                        },
+                    }
+                }
+                for sheet in self._sheets
+            ]
+        }
+
+    def _batch_update(self, requests):
+        replies = []
+        for request in requests:
+            if "deleteDimension" in request:
+                rng = request["deleteDimension"]["range"]
+                if rng.get("dimension", "ROWS") != "ROWS":
+                    raise self._error(400, "only ROWS deletion is supported")
+                sheet = self._sheet(sheet_id=rng.get("sheetId", 0))
+                start, end = rng["startIndex"], rng["endIndex"]
+                del sheet.rows[start:end]
+                sheet.grid_rows -= end - start
+                replies.append({})
+            elif "addSheet" in request:
+                title = request["addSheet"]["properties"]["title"]
+                if any(sheet.title == title for sheet in self._sheets):
+                    raise self._error(400, f"A sheet with the name \"{title}\" already exists")
+                sheet = self._sheet(title, create=True)
+                replies.append(
+                    {"addSheet": {"properties": {"sheetId": sheet.sheet_id, "title": title}}}
+                )
+            elif "deleteSheet" in request:
+                sheet = self._sheet(sheet_id=request["deleteSheet"]["sheetId"])
+                self._sheets.remove(sheet)
+                replies.append({})
+            else:
+                raise self._error(400, f"unsupported request: {list(request)}")
+        return {"replies": replies}
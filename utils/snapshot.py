@@ -0,0 +1,240 @@
+# utils/snapshot.py
+"""اسنپ‌شات فشرده و تغییرناپذیر بازار برای انتقال بین ماژول‌ها"""
+
+import pickle
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+
+
+def _to_blocks(df):
+    """تبدیل دیتافریم به بلوک‌های NumPy هم‌نوع (هر ستون یک ردیف پیوسته)"""
+    groups = {}
+    for col in df.columns:
+        groups.setdefault(df[col].dtype, []).append(col)
+
+    blocks = []
+    for dtype, cols in groups.items():
+        arr = np.ascontiguousarray(df[cols].to_numpy(dtype=dtype).T)
+        arr.flags.writeable = False
+        blocks.append((tuple(cols), arr))
+
+    return tuple(blocks)
+
+
+def _freeze(mapping):
+    """نمای فقط‌خواندنی دیکشنری (لیست‌ها → tuple)"""
+    return MappingProxyType({
+        key: tuple(value) if isinstance(value, list) else value
+        for key, value in mapping.items()
+    })
+
+
+def _to_frame(blocks, labels, index_name):
+    """ساخت دیتافریم بدون کپی از روی بلوک‌ها"""
+    frames = [
+        pd.DataFrame(arr.T, index=labels, columns=list(cols), copy=False)
+        for cols, arr in blocks
+    ]
+    if not frames:
+        df = pd.DataFrame(index=labels)
+    elif len(frames) == 1:
+        df = frames[0]
+    else:
+        df = pd.concat(frames, axis=1, copy=False)
+    df.index.name = index_name
+    return df
+
+
+class MarketSnapshot:
+    """
+    وضعیت یک تیک بازار: ستون‌های صندوق‌ها و دارایی‌ها به صورت آرایه NumPy،
+    نگاشت نماد به ردیف و میانگین‌های وزنی از پیش محاسبه‌شده
+
+    Attributes:
+        fund_symbols / asset_symbols: نمادها به ترتیب ردیف‌ها (نمای pandas دسته‌ای می‌ماند)
+        fund_index / asset_index: نگاشت نماد → شماره ردیف (MappingProxyType)
+        fund_metrics: میانگین‌های وزنی صندوق‌ها (خروجی fund_metrics، MappingProxyType)
+        fund_changes: مجموعه تغییرات صندوق‌ها نسبت به تیک قبل (MappingProxyType با
+            نمادهای added/changed/removed به صورت tuple) یا None
+    """
+
+    __slots__ = (
+        "fund_symbols",
+        "fund_index",
+        "asset_symbols",
+        "asset_index",
+        "fund_metrics",
+        "fund_changes",
+        "gold_price",
+        "last_trade",
+        "yesterday_close",
+        "gold_yesterday",
+        "_fund_blocks",
+        "_fund_locations",
+        "_asset_blocks",
+        "_asset_locations",
+        "_fund_labels",
+        "_asset_labels",
+    )
+
+    def __init__(
+        self,
+        fund_symbols,
+        fund_blocks,
+        asset_symbols,
+        asset_blocks,
+        fund_metrics,
+        fund_changes,
+        gold_price,
+        last_trade,
+        yesterday_close=None,
+        gold_yesterday=None,
+    ):
+        fund_labels = pd.Index(fund_symbols, name="symbol")
+        asset_labels = pd.Index(asset_symbols, name="slug")
+        fund_symbols = fund_labels.to_numpy(dtype=object)
+        asset_symbols = asset_labels.to_numpy(dtype=object)
+        fund_symbols.flags.writeable = False
+        asset_symbols.flags.writeable = False
+        for _, arr in tuple(fund_blocks) + tuple(asset_blocks):
+            arr.flags.writeable = False
+
+        values = {
+            "fund_symbols": fund_symbols,
+            "fund_index": MappingProxyType({s: i for i, s in enumerate(fund_symbols)}),
+            "asset_symbols": asset_symbols,
+            "asset_index": MappingProxyType({s: i for i, s in enumerate(asset_symbols)}),
+            "fund_metrics": _freeze(fund_metrics or {}),
+            "fund_changes": None if fund_changes is None else _freeze(fund_changes),
+            "gold_price": gold_price,
+            "last_trade": last_trade,
+            "yesterday_close": yesterday_close,
+            "gold_yesterday": gold_yesterday,
+            "_fund_blocks": tuple(fund_blocks),
+            "_fund_locations": {
+                col: (b, r)
+                for b, (cols, _) in enumerate(fund_blocks)
+                for r, col in enumerate(cols)
+            },
+            "_asset_blocks": tuple(asset_blocks),
+            "_asset_locations": {
+                col: (b, r)
+                for b, (cols, _) in enumerate(asset_blocks)
+                for r, col in enumerate(cols)
+            },
+            "_fund_labels": fund_labels,
+            "_asset_labels": asset_labels,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MarketSnapshot تغییرناپذیر است")
+
+    def __delattr__(self, name):
+        raise AttributeError("MarketSnapshot تغییرناپذیر است")
+
+    def __reduce__(self):
+        return (
+            MarketSnapshot,
+            (
+                self._fund_labels,
+                self._fund_blocks,
+                self._asset_labels,
+                self._asset_blocks,
+                # MappingProxyType قابل pickle نیست
+                dict(self.fund_metrics),
+                None if self.fund_changes is None else dict(self.fund_changes),
+                self.gold_price,
+                self.last_trade,
+                self.yesterday_close,
+                self.gold_yesterday,
+            ),
+        )
+
+    @classmethod
+    def from_frames(cls, Fund_df, dfp, fund_metrics, fund_changes=None, **prices):
+        """ساخت اسنپ‌شات از خروجی پردازشگر (Fund_df و dfp)"""
+        fund_blocks = _to_blocks(Fund_df)
+        asset_blocks = _to_blocks(dfp)
+        return cls(
+            Fund_df.index,
+            fund_blocks,
+            dfp.index,
+            asset_blocks,
+            fund_metrics,
+            fund_changes,
+            **prices,
+        )
+
+    # ────────────────── دسترسی ستونی ──────────────────
+
+    def fund_column(self, column):
+        """آرایه فقط‌خواندنی یک ستون صندوق‌ها (بدون کپی)"""
+        block, row = self._fund_locations[column]
+        return self._fund_blocks[block][1][row]
+
+    def asset_column(self, column):
+        """آرایه فقط‌خواندنی یک ستون دارایی‌ها (بدون کپی)"""
+        block, row = self._asset_locations[column]
+        return self._asset_blocks[block][1][row]
+
+    def fund(self, symbol, column, default=None):
+        """مقدار یک ستون برای یک صندوق"""
+        i = self.fund_index.get(symbol)
+        if i is None:
+            return default
+        return self.fund_column(column)[i]
+
+    def asset(self, symbol, column, default=None):
+        """مقدار یک ستون برای یک دارایی (مثلاً شمش-طلا)"""
+        i = self.asset_index.get(symbol)
+        if i is None:
+            return default
+        return self.asset_column(column)[i]
+
+    def asset_row(self, symbol):
+        """همه ستون‌های یک دارایی به صورت دیکشنری"""
+        i = self.asset_index[symbol]
+        return {
+            col: arr[row][i]
+            for cols, arr in self._asset_blocks
+            for row, col in enumerate(cols)
+        }
+
+    def has_asset(self, symbol):
+        return symbol in self.asset_index
+
+    # ────────────────── نمای pandas ──────────────────
+
+    def funds_frame(self):
+        """دیتافریم صندوق‌ها به صورت نما روی آرایه‌ها (بدون کپی)"""
+        return _to_frame(self._fund_blocks, self._fund_labels, "symbol")
+
+    def assets_frame(self):
+        """دیتافریم دارایی‌ها به صورت نما روی آرایه‌ها (بدون کپی)"""
+        return _to_frame(self._asset_blocks, self._asset_labels, "slug")
+
+    # ────────────────── سریال‌سازی ──────────────────
+
+    def to_bytes(self):
+        """سریال‌سازی برای آرشیو و بازپخش"""
+        return pickle.dumps(self, protocol=5)
+
+    @staticmethod
+    def from_bytes(data):
+        return pickle.loads(data)
+
+    @property
+    def nbytes(self):
+        """حجم آرایه‌های داده (بایت)"""
+        arrays = [arr for _, arr in self._fund_blocks + self._asset_blocks]
+        return sum(arr.nbytes for arr in arrays) + self.fund_symbols.nbytes
+
+    def __repr__(self):
+        return (
+            f"MarketSnapshot(funds={len(self.fund_symbols)}, "
+            f"assets={len(self.asset_symbols)}, gold={self.gold_price}, "
+            f"dollar={self.last_trade})"
+        )
@@ -0,0 +1,268 @@
+# utils/state_store.py
+"""
+ذخیره‌ساز کلید-مقدار محلی برای وضعیت هشدارها و پیام پین‌شده
+
+هر کلید می‌تواند زمان انقضا داشته باشد و کلیدهای منقضی در اولین خواندن
+(lazy) حذف می‌شوند. داده‌ها در جدول state پایگاه داده محلی نوشته و یک بار در
+هر پروسه در حافظه بارگذاری می‌شوند، پس بررسی عضویت O(1) و بدون شبکه است.
+Gist فقط نسخه پشتیبان است (state_backup.json) و وقتی پایگاه داده محلی خالی
+باشد (مثلاً cache اجرا از دست رفته) از آن بازیابی می‌شود.
+"""
+
+import copy
+import json
+import time
+import logging
+
+from config import (
+    ALERT_STATUS_FILE,
+    FUND_ALERTS_FILE,
+    MESSAGE_ID_FILE,
+    STATE_BACKUP_FILE,
+    FUND_ALERT_TTL_DAYS,
+)
+from utils.local_store import connection
+from utils.gist_state import get_gist_file, set_gist_file, gist_state_confirmed
+
+logger = logging.getLogger(__name__)
+
+# ✅ کپی درون‌حافظه جدول: {key: (value, expires_at یا None)}
+_STATE = None
+
+# ✅ نمادهای هشداردار هر (روز، نوع هشدار) برای فیلتر دسته‌ای صندوق‌ها
+_ALERTED = {}
+
+FUND_ALERT_TTL = FUND_ALERT_TTL_DAYS * 86400
+
+
+def _ensure_table(conn):
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL
+        )"""
+    )
+
+
+def _load():
+    global _STATE
+
+    if _STATE is not None:
+        return _STATE
+
+    with connection() as conn:
+        _ensure_table(conn)
+        now = time.time()
+        conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        conn.commit()
+        rows = conn.execute("SELECT key, value, expires_at FROM state").fetchall()
+
+    _STATE = {key: (json.loads(value), expires_at) for key, value, expires_at in rows}
+
+    # تا بازیابی از Gist واقعاً انجام نشده (نشانه restored_at) هر اجرا دوباره تلاش می‌کند
+    if "restored_at" not in _STATE:
+        restore_state_from_gist()
+
+    return _STATE
+
+
+def _write(entries):
+    """نوشتن مستقیم در جدول ({key: (value, expires_at)})"""
+    with connection() as conn:
+        _ensure_table(conn)
+        conn.executemany(
+            """INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET
+                   value = excluded.value,
+                   expires_at = excluded.expires_at""",
+            [
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+                for key, (value, expires_at) in entries.items()
+            ],
+        )
+        conn.commit()
+
+
+def _delete(keys):
+    with connection() as conn:
+        conn.executemany("DELETE FROM state WHERE key = ?", [(key,) for key in keys])
+        conn.commit()
+
+
+def state_get(key, default=None):
+    """
+    مقدار یک کلید (کپی مستقل؛ کلید منقضی‌شده همان لحظه حذف می‌شود)
+
+    Args:
+        key: نام کلید
+        default: مقدار پیش‌فرض اگر کلید وجود نداشته یا منقضی شده باشد
+    """
+    state = _load()
+    entry = state.get(key)
+    if entry is None:
+        return default
+
+    value, expires_at = entry
+    if expires_at is not None and expires_at <= time.time():
+        del state[key]
+        _delete([key])
+        return default
+    return copy.deepcopy(value)
+
+
+def state_has(key):
+    """آیا کلید وجود دارد و منقضی نشده؟ (بدون کپی مقدار)"""
+    entry = _load().get(key)
+    if entry is None:
+        return False
+    if entry[1] is not None and entry[1] <= time.time():
+        return state_get(key) is not None
+    return True
+
+
+def state_set(key, value, ttl=None):
+    """
+    ذخیره یک کلید
+
+    Args:
+        ttl: عمر کلید به ثانیه (None = بدون انقضا)
+    """
+    state_set_many({key: value}, ttl)
+
+
+def state_set_many(items, ttl=None):
+    """ذخیره چند کلید با یک تراکنش (همه با یک ttl)"""
+    if not items:
+        return
+    state = _load()
+    expires_at = time.time() + ttl if ttl is not None else None
+    entries = {key: (value, expires_at) for key, value in items.items()}
+    state.update(entries)
+    _write(entries)
+
+
+def purge_expired_state():
+    """حذف همه کلیدهای منقضی‌شده (برای پشتیبان‌گیری؛ مسیر خواندن lazy است)"""
+    state = _load()
+    now = time.time()
+    expired = [
+        key for key, (_, expires_at) in state.items()
+        if expires_at is not None and expires_at <= now
+    ]
+    for key in expired:
+        del state[key]
+    if expired:
+        _delete(expired)
+    return len(expired)
+
+
+# ════════════════════════════════════════════════════════════════
+# کلیدهای هشدار
+# ════════════════════════════════════════════════════════════════
+
+
+def fund_alert_key(day, alert_type, symbol):
+    return f"fund_alert:{day}:{alert_type}:{symbol}"
+
+
+def alerted_symbols(day, alert_type):
+    """
+    نمادهایی که در این روز این هشدار را گرفته‌اند
+
+    بار اول از روی کلیدهای fund_alert ساخته می‌شود و بعد mark_fund_alerts آن را
+    به‌روز نگه می‌دارد، پس فیلتر همه صندوق‌ها یک عملیات مجموعه‌ای است.
+    """
+    cache_key = (day, alert_type)
+    if cache_key not in _ALERTED:
+        prefix = fund_alert_key(day, alert_type, "")
+        _ALERTED[cache_key] = {
+            key[len(prefix):]
+            for key in list(_load())
+            if key.startswith(prefix) and state_has(key)
+        }
+    return _ALERTED[cache_key]
+
+
+def mark_fund_alerts(day, alert_type, symbols):
+    """ثبت هشدارهای ارسال‌شده صندوق‌ها (پس از FUND_ALERT_TTL_DAYS روز منقضی می‌شوند)"""
+    state_set_many(
+        {fund_alert_key(day, alert_type, symbol): 1 for symbol in symbols},
+        ttl=FUND_ALERT_TTL,
+    )
+    if (day, alert_type) in _ALERTED:
+        _ALERTED[(day, alert_type)].update(symbols)
+
+
+# ════════════════════════════════════════════════════════════════
+# پشتیبان Gist
+# ════════════════════════════════════════════════════════════════
+
+
+def backup_state_to_gist():
+    """
+    ثبت نسخه پشتیبان در Gist (فقط اگر تغییری رخ داده باشد با flush_gist_state نوشته می‌شود)
+
+    تا وقتی بازیابی از Gist موفق نشده، پشتیبان قبلی با جدول ناقص محلی بازنویسی نمی‌شود.
+    """
+    if _STATE is None:
+        return
+    if "restored_at" not in _STATE:
+        logger.warning("⚠️ وضعیت هنوز از Gist بازیابی نشده - پشتیبان‌گیری انجام نشد")
+        return
+    purge_expired_state()
+    set_gist_file(
+        STATE_BACKUP_FILE,
+        {key: [value, expires_at] for key, (value, expires_at) in sorted(_STATE.items())},
+    )
+
+
+def restore_state_from_gist():
+    """
+    بازیابی وضعیت از پشتیبان Gist (یا فایل‌های قدیمی alert_status/fund_alerts/message_id)
+
+    فقط پس از خواندن موفق Gist نشانه restored_at ثبت می‌شود؛ کلیدهایی که در همین
+    فاصله محلی نوشته شده‌اند (جدیدتر) بر نسخه Gist مقدم‌اند.
+
+    Returns:
+        bool: True اگر Gist خوانده و بازیابی انجام شد
+    """
+    now = time.time()
+    backup = get_gist_file(STATE_BACKUP_FILE)
+    if not gist_state_confirmed():
+        logger.warning("⚠️ Gist خوانده نشد - بازیابی وضعیت به اجرای بعدی موکول شد")
+        return False
+
+    entries = {}
+
+    if backup:
+        entries = {
+            key: (value, expires_at)
+            for key, (value, expires_at) in backup.items()
+            if expires_at is None or expires_at > now
+        }
+    else:
+        # مهاجرت از فایل‌های قبلی Gist
+        status = get_gist_file(ALERT_STATUS_FILE)
+        if status:
+            entries["alert_status"] = (status, None)
+
+        message = get_gist_file(MESSAGE_ID_FILE)
+        if message and message.get("message_id"):
+            entries["message_id"] = (message, now + 86400)
+
+        for day, items in (get_gist_file(FUND_ALERTS_FILE) or {}).items():
+            for item in items:
+                key = fund_alert_key(day, item.get("alert_type"), item["symbol"])
+                entries[key] = (1, now + FUND_ALERT_TTL)
+
+    entries = {key: entry for key, entry in entries.items() if key not in _STATE}
+    if entries:
+        logger.info(f"♻️ وضعیت محلی از Gist بازیابی شد ({len(entries)} کلید)")
+
+    # نشانه بازیابی: اجراهای بعدی سراغ Gist نمی‌روند و پشتیبان‌گیری مجاز می‌شود
+    entries["restored_at"] = (now, None)
+    _STATE.update(entries)
+    _ALERTED.clear()
+    _write(entries)
+    return True
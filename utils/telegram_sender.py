@@ -13,49 +13,26 @@ from persiantools.jdatetime import JalaliDateTime
 from PIL import Image, ImageDraw, ImageFont
 
 from config import (
-    GIST_ID, GIST_TOKEN, MESSAGE_ID_FILE,
     FONT_BOLD_PATH, FONT_MEDIUM_PATH, FONT_REGULAR_PATH,
     TREEMAP_WIDTH, TREEMAP_HEIGHT, TREEMAP_SCALE,
     TREEMAP_COLORSCALE, CHANNEL_HANDLE,
     REQUEST_TIMEOUT, TIMEZONE
 )
 from utils.chart_creator import create_market_charts
+from utils.state_store import state_get, state_set
 
 logger = logging.getLogger(__name__)
 
-# ────────────────── توابع Gist (message_id) ──────────────────
+# ────────────────── پیام پین‌شده (message_id) ──────────────────
 
-def get_gist_data():
-    """دریافت message_id از GitHub Gist"""
-    try:
-        if not GIST_ID or not GIST_TOKEN:
-            return {"message_id": None, "date": None}
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GIST_TOKEN}"}
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        if response.status_code == 200:
-            content = response.json()["files"][MESSAGE_ID_FILE]["content"]
-            return json.loads(content)
-    except Exception as e:
-        logger.error(f"خطا در خواندن Gist: {e}")
-        return {"message_id": None, "date": None}
+def get_pinned_message():
+    """message_id پیام پین‌شده امروز (از ذخیره‌ساز محلی)"""
+    return state_get("message_id", {"message_id": None, "date": None})
 
 
-def save_gist_data(message_id, date):
-    """ذخیره message_id در GitHub Gist"""
-    try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GIST_TOKEN}"}
-        data = {
-            "files": {
-                MESSAGE_ID_FILE: {
-                    "content": json.dumps({"message_id": message_id, "date": date})
-                }
-            }
-        }
-        requests.patch(url, headers=headers, json=data, timeout=REQUEST_TIMEOUT)
-    except Exception as e:
-        logger.error(f"خطا در ذخیره Gist: {e}")
+def save_pinned_message(message_id, date):
+    """ذخیره message_id (یک روزه؛ فردا خودبه‌خود منقضی می‌شود)"""
+    state_set("message_id", {"message_id": message_id, "date": date}, ttl=86400)
 
 
 def get_today_date():
@@ -77,11 +54,10 @@ def send_to_telegram(bot_token, chat_id, data, dollar_prices, gold_price,
     try:
         logger.info("🎨 در حال ساخت تصویر Treemap...")
         img1_bytes = create_combined_image(
-            data["Fund_df"],
+            data.funds_frame(),
             dollar_prices["last_trade"],
             gold_price,
             gold_yesterday,
-            data["dfp"],
             yesterday_close
         )
 
@@ -99,9 +75,9 @@ def send_to_telegram(bot_token, chat_id, data, dollar_prices, gold_price,
             dirham_price
         )
 
-        gist_data = get_gist_data()
-        saved_message_id = gist_data.get("message_id")
-        saved_date = gist_data.get("date")
+        pinned = get_pinned_message()
+        saved_message_id = pinned.get("message_id")
+        saved_date = pinned.get("date")
         today = get_today_date()
 
         if saved_date != today:
@@ -120,7 +96,7 @@ def send_to_telegram(bot_token, chat_id, data, dollar_prices, gold_price,
         logger.info("📤 ارسال پیام جدید...")
         new_message_id = send_media_group(bot_token, chat_id, img1_bytes, img2_bytes, caption)
         if new_message_id:
-            save_gist_data(new_message_id, today)
+            save_pinned_message(new_message_id, today)
             pin_message(bot_token, chat_id, new_message_id)
             logger.info(f"✅ پیام جدید ارسال و پین شد (ID: {new_message_id})")
             return True
@@ -306,6 +282,9 @@ def apply_gradient_colors(values, vmin=None, vmax=None, force_positive=False):
         except:
             numeric_values.append(0)
 
+    if not numeric_values:
+        return []
+
     if vmin is None:
         vmin = min(numeric_values)
     if vmax is None:
@@ -321,7 +300,7 @@ def apply_gradient_colors(values, vmin=None, vmax=None, force_positive=False):
 
 # ────────────────── ساخت تصویر ──────────────────
 
-def create_combined_image(Fund_df, last_trade, Gold, Gold_yesterday, dfp, yesterday_close):
+def create_combined_image(Fund_df, last_trade, Gold, Gold_yesterday, yesterday_close):
     tehran_tz = pytz.timezone(TIMEZONE)
     now_jalali = JalaliDateTime.now(tehran_tz)
     date_time_str = now_jalali.strftime("%Y/%m/%d - %H:%M")
@@ -333,9 +312,8 @@ def create_combined_image(Fund_df, last_trade, Gold, Gold_yesterday, dfp, yester
         specs=[[{"type": "treemap"}], [{"type": "table"}]],
     )
 
-    df_sorted = Fund_df.copy()
-    df_sorted["color_value"] = df_sorted["close_price_change_percent"]
-    df_sorted = df_sorted.sort_values("value", ascending=False)
+    # ✅ Fund_df از قبل بر اساس ارزش مرتب شده - نیازی به کپی نیست
+    df_sorted = Fund_df
 
     try:
         ImageFont.truetype(FONT_MEDIUM_PATH, 40)
@@ -354,7 +332,7 @@ def create_combined_image(Fund_df, last_trade, Gold, Gold_yesterday, dfp, yester
             textfont=dict(size=28, color="white", family=treemap_font_family),
             hoverinfo="skip",
             marker=dict(
-                colors=df_sorted["color_value"],
+                colors=df_sorted["close_price_change_percent"],
                 colorscale=TREEMAP_COLORSCALE,
                 cmid=0,
                 cmin=-10,
@@ -526,16 +504,16 @@ def create_simple_caption(data, dollar_prices, gold_price, gold_yesterday,
     now = JalaliDateTime.now(tehran_tz)
     current_time = now.strftime("%Y/%m/%d - %H:%M")
 
-    df_funds = data["Fund_df"]
-    total_value = df_funds["value"].sum()
-    total_pol = df_funds["pol_hagigi"].sum()
+    df_funds = data.funds_frame()
+    total_value = data.fund_metrics["total_value"]
+    total_pol = data.fund_metrics["pol_hagigi"]
     total_avg_monthly = df_funds["avg_monthly_value"].sum()
     total_net_asset = df_funds["net_asset"].sum()
 
     if total_net_asset > 0:
         avg_price_weighted = (df_funds["close_price"] * df_funds["value"]).sum() / total_value
-        avg_change_percent_weighted = (df_funds["close_price_change_percent"] * df_funds["value"]).sum() / total_value
-        avg_bubble_weighted = (df_funds["nominal_bubble"] * df_funds["value"]).sum() / total_value
+        avg_change_percent_weighted = data.fund_metrics["fund_change_weighted"]
+        avg_bubble_weighted = data.fund_metrics["fund_bubble_weighted"]
         avg_nav_weighted = (df_funds["NAV"] * df_funds["net_asset"]).sum() / total_net_asset
         avg_nav_change_weighted = (df_funds["NAV_change_percent"] * df_funds["net_asset"]).sum() / total_net_asset
     else:
@@ -560,11 +538,10 @@ def create_simple_caption(data, dollar_prices, gold_price, gold_yesterday,
 
     gold_change = ((gold_price - gold_yesterday) / gold_yesterday * 100) if gold_yesterday else 0
 
-    dfp = data["dfp"]
-    shams = dfp.loc["شمش-طلا"]
-    gold_24 = dfp.loc["طلا-گرم-24-عیار"]
-    gold_18 = dfp.loc["طلا-گرم-18-عیار"]
-    sekeh = dfp.loc["سطلا"]
+    shams = data.asset_row("شمش-طلا")
+    gold_24 = data.asset_row("طلا-گرم-24-عیار")
+    gold_18 = data.asset_row("طلا-گرم-18-عیار")
+    sekeh = data.asset_row("سطلا")
 
     def calc_diffs(row, d_cur, g_cur):
         d_calc = row.get("pricing_dollar", 0)